@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class AtivosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ativos'
+
+    def ready(self):
+        # Invalida o cache do dashboard do app quando os cadastros mudam
+        from core.cache import invalidar_ao_alterar
+        from .models import Ativo, Categoria, Marca, Modelo
+        invalidar_ao_alterar('ativos', Ativo, Categoria, Marca, Modelo)
+
+        # Gera a miniatura e a versão média das imagens enviadas
+        from core.imagens import otimizar_ao_salvar
+        otimizar_ao_salvar(Ativo, 'imagem_ativo')
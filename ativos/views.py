@@ -11,6 +11,7 @@ from django.http import HttpResponse
 
 from .models import Categoria, Marca, Modelo, Ativo
 from organizacao.models import SubSetor
+from core.cache import obter_ou_calcular
 
 
 # ============================================================================
@@ -20,16 +21,16 @@ from organizacao.models import SubSetor
 @login_required
 def dashboard_ativos(request):
     """Dashboard principal do módulo de ativos"""
-    context = {
+    context = obter_ou_calcular('ativos', 'dashboard', lambda: {
         'total_ativos': Ativo.objects.count(),
         'ativos_ativos': Ativo.objects.filter(ativo=True).count(),
         'total_categorias': Categoria.objects.count(),
         'total_marcas': Marca.objects.count(),
         'total_modelos': Modelo.objects.count(),
-        'ativos_recentes': Ativo.objects.select_related(
+        'ativos_recentes': list(Ativo.objects.select_related(
             'categoria', 'marca', 'modelo', 'estrutura_organizacional'
-        ).order_by('-data_cadastro')[:5],
-    }
+        ).order_by('-data_cadastro')[:5]),
+    })
     return render(request, 'ativos/dashboard.html', context)
 
 
@@ -7,7 +7,9 @@ from .models import (
     Norma,
     RequisitoNorma,
     FerramentaDigital,
+    ChaveIdempotencia,
     Checklist,
+    ChecklistSerializado,
     FerramentaCausaRaiz,
     ModeloAuditoria,
     Auditoria,
@@ -19,6 +21,11 @@ from .models import (
     Resposta,  # <-- ADICIONE ESTA LINHA
     AnexoResposta,  # <-- ADICIONE ESTA LINHA
     PlanoDeAcao,
+    RemocaoInstancia,
+    ResultadoAuditoria,
+    ResumoDiarioAuditoria,
+    UploadAnexo,
+    estrutura_em_lote,
 )
 
 # 1. Crie uma classe Inline para os Anexos
@@ -75,6 +82,9 @@ class CategoriaAuditoriaAdmin(admin.ModelAdmin):
         (None, {
             'fields': ('pilar', 'descricao', 'ativo')
         }),
+        ('Agendamento', {
+            'fields': ('dias_para_quarentena', 'semanas_horizonte')
+        }),
     )
 
 
@@ -183,15 +193,73 @@ class AuditoriaAdmin(admin.ModelAdmin):
         }),
     )
 
+    # As execuções excluídas em cascata precisam ser registradas para o app
+    def delete_model(self, request, obj):
+        obj.instancias.all().excluir()
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        AuditoriaInstancia.objects.filter(auditoria_agendada__in=queryset).excluir()
+        super().delete_queryset(request, queryset)
+
 
 @admin.register(AuditoriaInstancia)
 class AuditoriaInstanciaAdmin(admin.ModelAdmin):
-    list_display = ('auditoria_agendada', 'data_execucao', 'executada')
-    list_filter = ('executada', 'data_execucao')
+    list_display = ('auditoria_agendada', 'data_execucao', 'executada', 'status_execucao')
+    list_filter = ('executada', 'status_execucao', 'data_execucao')
     # Busca pelo ID da auditoria pai
     search_fields = ('auditoria_agendada__id',)
     inlines = [RespostaInline]
 
+    def delete_model(self, request, obj):
+        AuditoriaInstancia.objects.filter(pk=obj.pk).excluir()
+
+    def delete_queryset(self, request, queryset):
+        queryset.excluir()
+
+
+@admin.register(ResultadoAuditoria)
+class ResultadoAuditoriaAdmin(admin.ModelAdmin):
+    list_display = ('instancia', 'taxa_conformidade', 'pontuacao_final',
+                    'nao_conformes', 'data_conclusao')
+    search_fields = ('instancia__id',)
+
+
+@admin.register(RemocaoInstancia)
+class RemocaoInstanciaAdmin(admin.ModelAdmin):
+    list_display = ('id_instancia', 'usuario', 'motivo', 'data_remocao')
+    list_filter = ('motivo',)
+    search_fields = ('id_instancia',)
+
+
+@admin.register(ChecklistSerializado)
+class ChecklistSerializadoAdmin(admin.ModelAdmin):
+    list_display = ('checklist', 'hash_conteudo', 'data_geracao')
+    search_fields = ('checklist__nome', 'hash_conteudo')
+    readonly_fields = ('checklist', 'conteudo', 'hash_conteudo', 'data_geracao')
+
+
+@admin.register(ChaveIdempotencia)
+class ChaveIdempotenciaAdmin(admin.ModelAdmin):
+    list_display = ('chave', 'usuario', 'rota', 'status_resposta',
+                    'data_criacao', 'expira_em')
+    list_filter = ('status_resposta',)
+    search_fields = ('chave', 'rota')
+
+
+@admin.register(UploadAnexo)
+class UploadAnexoAdmin(admin.ModelAdmin):
+    list_display = ('token', 'usuario', 'nome_original', 'tamanho_recebido',
+                    'tamanho_total', 'data_criacao')
+    search_fields = ('token', 'nome_original')
+
+
+@admin.register(ResumoDiarioAuditoria)
+class ResumoDiarioAuditoriaAdmin(admin.ModelAdmin):
+    list_display = ('data', 'local_execucao', 'ferramenta', 'categoria',
+                    'responsavel', 'planejadas', 'executadas', 'nao_conformes')
+    list_filter = ('data',)
+
 
 class OpcaoRespostaInline(admin.TabularInline):
     model = OpcaoResposta
@@ -226,6 +294,11 @@ class TopicoAdmin(admin.ModelAdmin):
     search_fields = ('descricao',)
     inlines = [PerguntaInline]
 
+    def save_related(self, request, form, formsets, change):
+        # Perguntas do inline: contagens do checklist recalculadas uma vez
+        with estrutura_em_lote(form.instance.checklist):
+            super().save_related(request, form, formsets, change)
+
 
 class TopicoInline(admin.TabularInline):
     model = Topico
@@ -244,6 +317,11 @@ class ChecklistAdmin(admin.ModelAdmin):
     search_fields = ('nome',)
     inlines = [TopicoInline]
 
+    def save_related(self, request, form, formsets, change):
+        # Tópicos do inline: contagens recalculadas uma vez
+        with estrutura_em_lote(form.instance):
+            super().save_related(request, form, formsets, change)
+
 
 @admin.register(PlanoDeAcao)
 class PlanoDeAcaoAdmin(admin.ModelAdmin):
@@ -0,0 +1,196 @@
+# auditorias/agendamento.py
+
+"""
+Motor de recorrência dos agendamentos de auditoria.
+
+Calcula de uma só vez a série completa de datas de um agendamento a partir
+da frequência ou do intervalo, sem percorrer o calendário dia a dia.
+É a única fonte das datas usadas tanto na geração das instâncias quanto na
+pré-visualização do formulário de agendamento.
+"""
+
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.conf import settings
+
+# Limite de segurança (5 anos de execuções diárias), o mesmo do loop antigo
+LIMITE_OCORRENCIAS = 365 * 5
+
+# Frequências com passo fixo em dias e frequências com passo em meses
+PASSO_DIAS_FREQUENCIA = {
+    'DIARIO': 1,
+    'SEMANAL': 7,
+    'QUINZENAL': 14,
+}
+PASSO_MESES_FREQUENCIA = {
+    'MENSAL': 1,
+    'ANUAL': 12,
+}
+
+# Quantidade máxima de instâncias por INSERT na materialização do agendamento
+TAMANHO_LOTE_INSTANCIAS = 1000
+
+# Bitmask com todos os dias da semana (bit 0 = segunda ... bit 6 = domingo)
+TODOS_OS_DIAS = 0b1111111
+
+
+def _dia_semana_ordinal(ordinal):
+    """Dia da semana (0=Segunda) de um ordinal de data, sem criar o objeto date."""
+    return (ordinal - 1) % 7
+
+
+def _somar_meses(data_base, meses):
+    """Soma meses a uma data, limitando o dia ao último dia do mês de destino."""
+    total = data_base.month - 1 + meses
+    ano = data_base.year + total // 12
+    mes = total % 12 + 1
+    return date(ano, mes, min(data_base.day, monthrange(ano, mes)[1]))
+
+
+def calcular_datas(data_inicio, data_fim=None, frequencia=None, intervalo=None,
+                   pular_finais_semana=False, limite=LIMITE_OCORRENCIAS):
+    """
+    Retorna a lista ordenada de datas de execução de um agendamento.
+
+    - Sem data de fim, ou sem frequência/intervalo válidos, o agendamento é
+      de dia único (apenas a data de início).
+    - `intervalo` são os dias de folga entre execuções (passo de intervalo + 1).
+    - `limite` restringe a quantidade de datas candidatas antes do filtro de
+      finais de semana, como fazia o contador de voltas do loop antigo.
+    """
+    if not data_inicio:
+        return []
+    if data_fim and data_fim < data_inicio:
+        return []
+
+    passo_dias = None
+    passo_meses = None
+    if data_fim:
+        if intervalo and intervalo > 0:
+            passo_dias = intervalo + 1
+        elif frequencia in PASSO_DIAS_FREQUENCIA:
+            passo_dias = PASSO_DIAS_FREQUENCIA[frequencia]
+        elif frequencia in PASSO_MESES_FREQUENCIA:
+            passo_meses = PASSO_MESES_FREQUENCIA[frequencia]
+
+    if passo_dias:
+        # Série aritmética de ordinais: gerada e filtrada em uma única passada
+        ordinais = range(data_inicio.toordinal(),
+                         data_fim.toordinal() + 1, passo_dias)[:limite]
+        if pular_finais_semana:
+            return [date.fromordinal(o) for o in ordinais
+                    if _dia_semana_ordinal(o) < 5]
+        return [date.fromordinal(o) for o in ordinais]
+
+    if passo_meses:
+        # Cada ocorrência é calculada a partir da data de início (e não da
+        # anterior), evitando que o dia "escorregue" após um mês curto.
+        meses_totais = ((data_fim.year - data_inicio.year) * 12
+                        + data_fim.month - data_inicio.month)
+        quantidade = min(meses_totais // passo_meses + 1, limite)
+        datas = [_somar_meses(data_inicio, k * passo_meses)
+                 for k in range(quantidade)]
+        if datas and datas[-1] > data_fim:
+            datas.pop()
+    else:
+        # Dia único
+        datas = [data_inicio]
+
+    if pular_finais_semana:
+        return [d for d in datas if d.weekday() < 5]
+    return datas
+
+
+def datas_do_agendamento(auditoria):
+    """Calcula as datas de execução a partir dos campos de um objeto Auditoria."""
+    return calcular_datas(
+        auditoria.data_inicio,
+        auditoria.data_fim,
+        frequencia=auditoria.frequencia if auditoria.por_frequencia else None,
+        intervalo=auditoria.intervalo if auditoria.por_intervalo else None,
+        pular_finais_semana=auditoria.pular_finais_semana,
+    )
+
+
+def data_limite_da_execucao(data_execucao, auditoria):
+    """
+    Data a partir da qual uma execução não realizada passa a estar em atraso:
+    a data programada mais um ciclo do agendamento (1 dia para dia único).
+    """
+    if auditoria.por_frequencia and auditoria.frequencia:
+        if auditoria.frequencia in PASSO_DIAS_FREQUENCIA:
+            return data_execucao + timedelta(
+                days=PASSO_DIAS_FREQUENCIA[auditoria.frequencia])
+        if auditoria.frequencia in PASSO_MESES_FREQUENCIA:
+            return _somar_meses(
+                data_execucao, PASSO_MESES_FREQUENCIA[auditoria.frequencia])
+    elif auditoria.por_intervalo and auditoria.intervalo:
+        return data_execucao + timedelta(days=auditoria.intervalo + 1)
+    return data_execucao + timedelta(days=1)
+
+
+def status_da_execucao(executada, data_execucao, data_limite, hoje):
+    """Código do status de uma execução (ver STATUS_EXECUCAO em models.py)."""
+    if executada:
+        return 'CONCLUIDA'
+    if data_execucao > hoje:
+        return 'AGENDADA'
+    if data_limite and hoje >= data_limite:
+        return 'ATRASO'
+    return 'PENDENTE'
+
+
+def semanas_de_horizonte(categoria=None):
+    """
+    Semanas do horizonte rolante: a configurada na categoria ou, na falta
+    dela, o padrão global. None significa materializar tudo de uma vez.
+    """
+    if categoria is not None and categoria.semanas_horizonte:
+        return categoria.semanas_horizonte
+    return settings.AUDITORIAS_CONFIG.get('HORIZONTE_SEMANAS')
+
+
+def limite_do_horizonte(semanas, hoje):
+    """Última data que deve estar gravada no banco, ou None sem horizonte."""
+    if not semanas:
+        return None
+    return hoje + timedelta(weeks=semanas)
+
+
+def mascara_dias_semana(dias_semana):
+    """Converte uma coleção de dias da semana (0=Segunda) em bitmask."""
+    mascara = 0
+    for dia in dias_semana:
+        mascara |= 1 << dia
+    return mascara
+
+
+def expandir_ocorrencias(datas, locais, turnos, repeticoes=1):
+    """
+    Expande as datas em slots (data, local, turno, repetição), na mesma ordem
+    usada historicamente na criação das instâncias.
+
+    `turnos` é uma lista de pares (turno, mascara_dias_semana); o turno None
+    com TODOS_OS_DIAS representa agendamentos sem turno. Datas em que o turno
+    não trabalha são descartadas sem nenhuma consulta ao banco.
+    """
+    repeticoes = range(repeticoes if repeticoes and repeticoes > 0 else 1)
+
+    # Combinações (local, turno, repetição) pré-calculadas por dia da semana
+    combinacoes_por_dia = []
+    for dia in range(7):
+        bit_dia = 1 << dia
+        turnos_do_dia = [turno for turno, mascara in turnos if mascara & bit_dia]
+        combinacoes_por_dia.append([
+            (local, turno, repeticao)
+            for local in locais
+            for turno in turnos_do_dia
+            for repeticao in repeticoes
+        ])
+
+    slots = []
+    for dt in datas:
+        slots.extend([(dt, local, turno, repeticao) for local, turno, repeticao
+                      in combinacoes_por_dia[dt.weekday()]])
+    return slots
@@ -0,0 +1,200 @@
+# auditorias/anexos.py
+
+"""
+Upload dos anexos das respostas, separado da submissão.
+
+O app envia cada foto antes de submeter a execução, de uma vez (multipart)
+ou em partes retomáveis, e recebe um token; a submissão cita apenas os
+tokens. O corpo das requisições é lido em blocos e gravado direto em disco e
+no storage, de modo que a memória do worker não depende do tamanho das fotos.
+As variantes das fotos (core/imagens.py) são geradas ao concluir o upload.
+
+Cada parte é recebida sem transação aberta (o app pode demorar a enviá-la);
+só a confirmação, que confere o offset e anexa a parte ao arquivo parcial,
+bloqueia o upload, em uma transação curta.
+
+As partes de um upload em andamento ficam em FILE_UPLOAD_TEMP_DIR (ou no
+diretório temporário do sistema); com mais de um servidor, aponte essa
+configuração para um disco compartilhado.
+"""
+
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from core.imagens import excluir_variantes, gerar_apos_commit, gerar_variantes
+
+# Bytes lidos do corpo da requisição por vez
+TAMANHO_BLOCO = 64 * 1024
+
+# Assinaturas (bytes iniciais) aceitas e as extensões que cada uma pode ter.
+# doc/xls e docx/xlsx têm o mesmo contêiner: vale a extensão do nome enviado.
+ASSINATURAS = [
+    (b'\xff\xd8\xff', ('jpg', 'jpeg')),
+    (b'\x89PNG\r\n\x1a\n', ('png',)),
+    (b'%PDF', ('pdf',)),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', ('doc', 'xls')),
+    (b'PK\x03\x04', ('docx', 'xlsx')),
+]
+TAMANHO_CABECALHO = max(len(assinatura) for assinatura, _ in ASSINATURAS)
+
+# Sufixo dos arquivos em que cada requisição recebe a sua parte
+SUFIXO_RECEBENDO = '.recebendo'
+
+
+class AnexoInvalido(Exception):
+    """Arquivo recusado (tipo não permitido, tamanho excedido, parte fora de ordem)."""
+
+
+class OffsetDivergente(Exception):
+    """A parte não começa no total já recebido (ou o upload já terminou)."""
+
+    def __init__(self, upload):
+        super().__init__('Offset diferente do total já recebido.')
+        # Estado atual do upload, para o app retomar do offset certo
+        self.upload = upload
+
+
+def tamanho_maximo():
+    return settings.AUDITORIAS_CONFIG.get('MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+
+
+def identificar_extensao(cabecalho, nome=''):
+    """
+    Extensão do arquivo pelo seu conteúdo (assinatura dos primeiros bytes),
+    ou None quando não é um dos tipos de ALLOWED_FILE_TYPES.
+    """
+    permitidas = settings.AUDITORIAS_CONFIG.get('ALLOWED_FILE_TYPES', [])
+    extensao_do_nome = os.path.splitext(nome or '')[1].lower().lstrip('.')
+    for assinatura, extensoes in ASSINATURAS:
+        if cabecalho.startswith(assinatura):
+            extensao = extensao_do_nome if extensao_do_nome in extensoes else extensoes[0]
+            return extensao if extensao in permitidas else None
+    return None
+
+
+def nome_no_storage(extensao):
+    return f'{uuid.uuid4().hex[:12]}.{extensao}'
+
+
+def diretorio_parcial():
+    diretorio = os.path.join(
+        settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir(), 'anexos_parciais')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def caminho_parcial(upload):
+    return os.path.join(diretorio_parcial(), f'{upload.token}.part')
+
+
+def salvar_arquivo_enviado(upload, arquivo):
+    """
+    Grava no storage um arquivo recebido por multipart (o Django já o guardou
+    em disco se passou de FILE_UPLOAD_MAX_MEMORY_SIZE) e conclui o upload.
+    """
+    if arquivo.size > tamanho_maximo():
+        raise AnexoInvalido('Arquivo maior que o tamanho máximo permitido.')
+    extensao = identificar_extensao(arquivo.read(TAMANHO_CABECALHO), arquivo.name)
+    if extensao is None:
+        raise AnexoInvalido('Tipo de arquivo não permitido.')
+    arquivo.seek(0)
+    upload.tamanho_total = upload.tamanho_recebido = arquivo.size
+    upload.arquivo.save(nome_no_storage(extensao), arquivo, save=False)
+    upload.save()
+    gerar_variantes(upload.arquivo)
+
+
+def receber_parte(fluxo, limite):
+    """
+    Lê `fluxo` em blocos para um arquivo temporário próprio da requisição.
+    Devolve (caminho, bytes recebidos); recusa partes maiores que `limite`.
+    """
+    descritor, caminho = tempfile.mkstemp(dir=diretorio_parcial(), suffix=SUFIXO_RECEBENDO)
+    recebidos = 0
+    try:
+        with os.fdopen(descritor, 'wb') as destino:
+            while fluxo is not None:
+                bloco = fluxo.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                recebidos += len(bloco)
+                if recebidos > limite:
+                    raise AnexoInvalido('A parte ultrapassa o tamanho declarado do arquivo.')
+                destino.write(bloco)
+    except BaseException:
+        os.remove(caminho)
+        raise
+    return caminho, recebidos
+
+
+def gravar_parte(upload, fluxo, offset):
+    """
+    Acrescenta ao upload em partes os bytes de `fluxo`, que devem começar em
+    `offset` (o total já recebido). Ao completar o tamanho declarado, valida o
+    tipo e move o arquivo para o storage. Devolve o upload atualizado e
+    levanta OffsetDivergente se outra parte foi confirmada antes desta.
+    """
+    if upload.concluido or offset != upload.tamanho_recebido:
+        raise OffsetDivergente(upload)
+    recebido, tamanho = receber_parte(fluxo, upload.tamanho_total - offset)
+
+    recusa = None
+    try:
+        with transaction.atomic():
+            # Compare-and-set: só confirma se ninguém avançou o offset
+            upload = type(upload).objects.select_for_update().get(pk=upload.pk)
+            if upload.concluido or offset != upload.tamanho_recebido:
+                raise OffsetDivergente(upload)
+            caminho = caminho_parcial(upload)
+            with open(caminho, 'r+b' if os.path.exists(caminho) else 'wb') as destino, \
+                    open(recebido, 'rb') as origem:
+                # Descarta o que passou do último offset confirmado
+                destino.truncate(offset)
+                destino.seek(offset)
+                shutil.copyfileobj(origem, destino, TAMANHO_BLOCO)
+
+            upload.tamanho_recebido += tamanho
+            if upload.tamanho_recebido == upload.tamanho_total:
+                try:
+                    concluir_upload_em_partes(upload, caminho)
+                except AnexoInvalido as erro:
+                    # A exclusão do upload recusado deve ser confirmada
+                    recusa = erro
+            else:
+                upload.save(update_fields=['tamanho_recebido'])
+    finally:
+        os.remove(recebido)
+    if recusa:
+        raise recusa
+    return upload
+
+
+def concluir_upload_em_partes(upload, caminho):
+    """Valida o tipo do arquivo completo e o move para o storage (um upload recusado é excluído)."""
+    with open(caminho, 'rb') as parcial:
+        extensao = identificar_extensao(parcial.read(TAMANHO_CABECALHO), upload.nome_original)
+    if extensao is None:
+        descartar(upload)
+        upload.delete()
+        raise AnexoInvalido('Tipo de arquivo não permitido.')
+    with open(caminho, 'rb') as parcial:
+        upload.arquivo.save(nome_no_storage(extensao), File(parcial), save=False)
+    os.remove(caminho)
+    upload.save(update_fields=['tamanho_recebido', 'arquivo'])
+    gerar_apos_commit([upload.arquivo])
+
+
+def descartar(upload):
+    """Remove o arquivo parcial e o arquivo gravado de um upload não utilizado."""
+    caminho = caminho_parcial(upload)
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    if upload.arquivo:
+        excluir_variantes(upload.arquivo)
+        upload.arquivo.delete(save=False)
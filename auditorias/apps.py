@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AuditoriasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'auditorias'
+
+    def ready(self):
+        # Registra os sinais do app
+        from . import signals  # noqa: F401
@@ -0,0 +1,84 @@
+# auditorias/busca.py
+
+"""
+Busca textual nos planos de ação.
+
+O texto pesquisável de cada plano (título, causa raiz, ação proposta, ação
+realizada, observação de origem e mensagens do fórum) fica em BuscaPlano,
+atualizado a cada alteração, e é indexado pelo próprio banco:
+
+- PostgreSQL: coluna tsvector gerada com o dicionário 'portuguese' (busca
+  pelo radical: "vazamento" encontra "vazamentos") e índice GIN; o título
+  pesa mais no ts_rank.
+- SQLite (ambiente local): tabela virtual FTS5 mantida por triggers, com
+  ranking bm25. O FTS5 não tem radicalização em português: cada termo é
+  buscado como prefixo e sem acentos.
+
+Os índices são criados na migração 0063. Em outros bancos a busca cai para
+icontains, sem ranking. No SQLite, uma migração que altere BuscaPlano recria
+a tabela e descarta os triggers do FTS5: eles precisam ser criados de novo.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TABELA = 'auditorias_buscaplano'
+TABELA_FTS = 'auditorias_buscaplano_fts'
+
+# Termos considerados por busca (os excedentes são ignorados)
+MAX_TERMOS = 10
+
+
+def termos_da_busca(texto):
+    return re.findall(r'\w+', (texto or '').lower())[:MAX_TERMOS]
+
+
+def buscar_planos(queryset, texto):
+    """
+    Filtra o queryset de planos pelo texto e anota `relevancia` (maior é
+    melhor). Sem termos válidos, devolve o queryset sem filtro.
+    """
+    termos = termos_da_busca(texto)
+    if not termos:
+        return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    tabela_plano = queryset.model._meta.db_table
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        consulta = ' '.join(termos)
+        encontrados = RawSQL(
+            f"SELECT plano_id FROM {TABELA} "
+            f"WHERE vetor @@ plainto_tsquery('portuguese', %s)", [consulta])
+        relevancia = RawSQL(
+            f"SELECT ts_rank(vetor, plainto_tsquery('portuguese', %s)) FROM {TABELA} "
+            f'WHERE plano_id = "{tabela_plano}"."id"', [consulta],
+            output_field=FloatField())
+    elif vendor == 'sqlite':
+        # Cada termo entre aspas (sem operadores do FTS5) e como prefixo
+        consulta = ' '.join(f'"{termo}"*' for termo in termos)
+        encontrados = RawSQL(
+            f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s", [consulta])
+        # bm25 é negativo (mais relevante = menor); o título pesa 10x
+        relevancia = RawSQL(
+            f"SELECT -bm25({TABELA_FTS}, 10.0, 1.0) FROM {TABELA_FTS} "
+            f'WHERE {TABELA_FTS} MATCH %s AND rowid = "{tabela_plano}"."id"', [consulta],
+            output_field=FloatField())
+    else:
+        filtro = Q()
+        for termo in termos:
+            filtro &= Q(busca__titulo__icontains=termo) | Q(busca__conteudo__icontains=termo)
+        return queryset.filter(filtro).annotate(
+            relevancia=Value(0.0, output_field=FloatField()))
+
+    return queryset.filter(pk__in=encontrados).annotate(relevancia=relevancia)
+
+
+def reconstruir_indice(using='default'):
+    """Refaz o índice FTS5 a partir de BuscaPlano (no PostgreSQL a coluna é gerada)."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
@@ -0,0 +1,29 @@
+# auditorias/management/commands/calcular_resultados_auditorias.py
+
+from django.core.management.base import BaseCommand
+
+from auditorias.models import AuditoriaInstancia, ResultadoAuditoria
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula o resumo do resultado (ResultadoAuditoria) das execuções já "
+        "concluídas que ainda não o possuem. Use --recalcular para refazer todos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recalcular', action='store_true',
+                            help='Recalcula também os resultados já gravados.')
+
+    def handle(self, *args, **options):
+        instancias = AuditoriaInstancia.objects.filter(executada=True)
+        if not options['recalcular']:
+            instancias = instancias.filter(resultado__isnull=True)
+
+        total = 0
+        for instancia in instancias.only('id').iterator(chunk_size=500):
+            ResultadoAuditoria.calcular_para(instancia)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} resultado(s) de auditoria calculado(s).'))
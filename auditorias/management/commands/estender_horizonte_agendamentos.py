@@ -0,0 +1,47 @@
+# auditorias/management/commands/estender_horizonte_agendamentos.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from auditorias.models import Auditoria
+from auditorias.views import _estender_horizonte_da_auditoria
+
+
+class Command(BaseCommand):
+    help = (
+        "Avança o horizonte rolante dos agendamentos, gravando as execuções "
+        "que entraram na janela desde a última execução. Idempotente e seguro "
+        "para rodar pelo cron (cada agendamento é bloqueado durante a extensão)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--auditoria', type=int,
+                            help='Processa apenas o agendamento com este ID.')
+
+    def handle(self, *args, **options):
+        hoje = timezone.now().date()
+
+        pendentes = Auditoria.objects.filter(
+            materializado_ate__isnull=False,
+            data_fim__gt=F('materializado_ate'),
+        )
+        if options['auditoria']:
+            pendentes = pendentes.filter(pk=options['auditoria'])
+
+        total_agendamentos = 0
+        total_instancias = 0
+        for auditoria_id in pendentes.values_list('pk', flat=True):
+            with transaction.atomic():
+                # Bloqueia o agendamento e relê o horizonte: duas execuções
+                # simultâneas nunca gravam o mesmo intervalo.
+                auditoria = Auditoria.objects.select_for_update().get(pk=auditoria_id)
+                criadas = _estender_horizonte_da_auditoria(auditoria, hoje)
+            if criadas:
+                total_agendamentos += 1
+                total_instancias += criadas
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_instancias} execução(ões) gravada(s) em '
+            f'{total_agendamentos} agendamento(s).'))
@@ -0,0 +1,29 @@
+# auditorias/management/commands/gerar_checklists_serializados.py
+
+from django.core.management.base import BaseCommand
+
+from auditorias.models import Checklist, ChecklistSerializado
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera o JSON gravado (ChecklistSerializado) das versões de checklist "
+        "que ainda não o têm. Use --todos para regerar também as existentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true',
+                            help='Regera o JSON de todas as versões.')
+
+    def handle(self, *args, **options):
+        checklists = Checklist.objects.all()
+        if not options['todos']:
+            checklists = checklists.filter(serializado__isnull=True)
+
+        total = 0
+        for checklist in checklists.iterator():
+            ChecklistSerializado.gerar_para(checklist)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} versão(ões) de checklist serializada(s).'))
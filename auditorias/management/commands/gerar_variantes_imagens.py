@@ -0,0 +1,32 @@
+# auditorias/management/commands/gerar_variantes_imagens.py
+
+from django.core.management.base import BaseCommand
+
+from core.imagens import CAMPOS_REGISTRADOS, gerar_variantes
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as variantes (miniatura e média) que faltam para as imagens já "
+        "enviadas: anexos das respostas, evidências dos planos, imagens de "
+        "ativos e itens e logos de clientes. Use --todas para refazer também "
+        "as existentes (ex.: após mudar IMAGENS_VARIANTES)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Refaz as variantes já existentes.')
+
+    def handle(self, *args, **options):
+        total = 0
+        for modelo, campo in CAMPOS_REGISTRADOS:
+            registros = modelo._default_manager.exclude(
+                **{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            gravadas = 0
+            for registro in registros.only('pk', campo).iterator():
+                gravadas += gerar_variantes(getattr(registro, campo), forcar=options['todas'])
+            self.stdout.write(
+                f'{modelo._meta.verbose_name_plural} ({campo}): {gravadas} variante(s).')
+            total += gravadas
+
+        self.stdout.write(self.style.SUCCESS(f'{total} variante(s) de imagem gravada(s).'))
@@ -0,0 +1,19 @@
+# auditorias/management/commands/limpar_chaves_idempotencia.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auditorias.models import ChaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = (
+        "Exclui as chaves de idempotência vencidas (IDEMPOTENCIA_HORAS). "
+        "Agende junto com os demais comandos diários."
+    )
+
+    def handle(self, *args, **options):
+        excluidas, _ = ChaveIdempotencia.objects.filter(
+            expira_em__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'{excluidas} chave(s) de idempotência vencida(s) excluída(s).'))
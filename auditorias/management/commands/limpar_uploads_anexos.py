@@ -0,0 +1,38 @@
+# auditorias/management/commands/limpar_uploads_anexos.py
+
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auditorias.anexos import SUFIXO_RECEBENDO, descartar, diretorio_parcial
+from auditorias.models import UploadAnexo
+
+
+class Command(BaseCommand):
+    help = (
+        "Exclui os uploads de anexos (/api/anexos/) que não foram usados em "
+        "nenhuma submissão após ANEXOS_UPLOAD_HORAS, com seus arquivos, e as "
+        "partes de requisições interrompidas antes de serem confirmadas."
+    )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(
+            hours=settings.AUDITORIAS_CONFIG.get('ANEXOS_UPLOAD_HORAS', 48))
+        total = 0
+        for upload in UploadAnexo.objects.filter(data_criacao__lte=limite).iterator():
+            descartar(upload)
+            upload.delete()
+            total += 1
+
+        # Partes de workers encerrados no meio do recebimento
+        diretorio = diretorio_parcial()
+        for nome in os.listdir(diretorio):
+            caminho = os.path.join(diretorio, nome)
+            if nome.endswith(SUFIXO_RECEBENDO) and os.path.getmtime(caminho) < limite.timestamp():
+                os.remove(caminho)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} upload(s) de anexo abandonado(s) excluído(s).'))
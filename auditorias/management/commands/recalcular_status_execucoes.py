@@ -0,0 +1,42 @@
+# auditorias/management/commands/recalcular_status_execucoes.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auditorias.agendamento import TAMANHO_LOTE_INSTANCIAS, data_limite_da_execucao
+from auditorias.models import AuditoriaInstancia
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o status persistido das execuções (Agendada, Pendente, "
+        "Atraso, Concluída) para a data de hoje. Deve rodar diariamente, logo "
+        "após a meia-noite, pois a simples passagem do dia muda o status."
+    )
+
+    def handle(self, *args, **options):
+        hoje = timezone.now().date()
+
+        # Execuções gravadas sem passar pelo save() e ainda sem data limite
+        sem_prazo = AuditoriaInstancia.objects.filter(
+            data_limite__isnull=True
+        ).select_related('auditoria_agendada')
+        lote = []
+        preenchidas = 0
+        for instancia in sem_prazo.iterator(chunk_size=TAMANHO_LOTE_INSTANCIAS):
+            instancia.data_limite = data_limite_da_execucao(
+                instancia.data_execucao, instancia.auditoria_agendada)
+            lote.append(instancia)
+            if len(lote) >= TAMANHO_LOTE_INSTANCIAS:
+                AuditoriaInstancia.objects.bulk_update(lote, ['data_limite'])
+                preenchidas += len(lote)
+                lote = []
+        if lote:
+            AuditoriaInstancia.objects.bulk_update(lote, ['data_limite'])
+            preenchidas += len(lote)
+
+        alteradas = AuditoriaInstancia.objects.recalcular_status(hoje)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{alteradas} execução(ões) mudaram de status '
+            f'({preenchidas} data(s) limite preenchida(s)).'))
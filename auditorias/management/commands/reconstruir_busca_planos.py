@@ -0,0 +1,23 @@
+# auditorias/management/commands/reconstruir_busca_planos.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auditorias.busca import reconstruir_indice
+from auditorias.models import BuscaPlano, PlanoDeAcao
+
+
+class Command(BaseCommand):
+    help = (
+        "Regrava o texto pesquisável de todos os planos de ação e refaz o "
+        "índice de busca (use após alterações feitas fora do sistema, como "
+        "updates direto no banco)."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            gravados = BuscaPlano.atualizar(PlanoDeAcao.objects.all())
+            reconstruir_indice()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice de busca atualizado: {gravados} plano(s).'))
@@ -0,0 +1,38 @@
+# auditorias/management/commands/reconstruir_resumos_auditorias.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from auditorias.models import AuditoriaInstancia, ResumoDiarioAuditoria
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói os resumos diários do dashboard (ResumoDiarioAuditoria) a "
+        "partir das execuções, ano a ano. Rode após calcular_resultados_auditorias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ano', type=int,
+                            help='Reconstrói apenas os resumos deste ano.')
+
+    def handle(self, *args, **options):
+        if options['ano']:
+            anos = [options['ano']]
+        else:
+            limites = AuditoriaInstancia.objects.aggregate(
+                inicio=Min('data_execucao'), fim=Max('data_execucao'))
+            if not limites['inicio']:
+                self.stdout.write('Nenhuma execução encontrada.')
+                return
+            anos = range(limites['inicio'].year, limites['fim'].year + 1)
+
+        total = 0
+        for ano in anos:
+            total += ResumoDiarioAuditoria.recalcular_periodo(
+                date(ano, 1, 1), date(ano, 12, 31))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} resumo(s) diário(s) gravado(s).'))
@@ -0,0 +1,22 @@
+# auditorias/management/commands/reconstruir_visibilidade_planos.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auditorias.models import PlanoDeAcao, VisibilidadePlano
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o índice de visibilidade dos planos de ação a partir dos "
+        "responsáveis atuais (use após alterações feitas fora do sistema, "
+        "como updates direto no banco)."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            incluidos, removidos = VisibilidadePlano.atualizar(PlanoDeAcao.objects.all())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice de visibilidade atualizado: {incluidos} par(es) incluído(s), '
+            f'{removidos} removido(s).'))
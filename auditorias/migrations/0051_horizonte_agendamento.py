@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0050_popular_ferramentas_digitais'),
+        ('organizacao', '0002_area_usuario_responsavel_empresa_usuario_responsavel_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditoria',
+            name='materializado_ate',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Execuções Materializadas Até'),
+        ),
+        migrations.AddField(
+            model_name='auditoria',
+            name='subsetores_especificos',
+            field=models.ManyToManyField(blank=True, related_name='auditorias_especificas', to='organizacao.subsetor', verbose_name='Subsetores Específicos'),
+        ),
+        migrations.AddField(
+            model_name='categoriaauditoria',
+            name='semanas_horizonte',
+            field=models.PositiveIntegerField(blank=True, help_text='Quantas semanas de execuções futuras ficam gravadas. Em branco, usa o padrão global.', null=True, verbose_name='Horizonte de Agendamento (semanas)'),
+        ),
+    ]
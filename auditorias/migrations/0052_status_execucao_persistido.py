@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-18 09:23
+
+from django.db import migrations, models
+from django.utils import timezone
+
+from auditorias.agendamento import data_limite_da_execucao, status_da_execucao
+
+
+def preencher_status_execucao(apps, schema_editor):
+    """Calcula a data limite e o status das execuções já existentes."""
+    AuditoriaInstancia = apps.get_model('auditorias', 'AuditoriaInstancia')
+    hoje = timezone.now().date()
+
+    lote = []
+    for instancia in AuditoriaInstancia.objects.select_related(
+            'auditoria_agendada').iterator(chunk_size=1000):
+        instancia.data_limite = data_limite_da_execucao(
+            instancia.data_execucao, instancia.auditoria_agendada)
+        instancia.status_execucao = status_da_execucao(
+            instancia.executada, instancia.data_execucao, instancia.data_limite, hoje)
+        lote.append(instancia)
+        if len(lote) >= 1000:
+            AuditoriaInstancia.objects.bulk_update(
+                lote, ['data_limite', 'status_execucao'])
+            lote = []
+    if lote:
+        AuditoriaInstancia.objects.bulk_update(
+            lote, ['data_limite', 'status_execucao'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0051_horizonte_agendamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditoriainstancia',
+            name='data_limite',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='Data Limite'),
+        ),
+        migrations.AddField(
+            model_name='auditoriainstancia',
+            name='status_execucao',
+            field=models.CharField(choices=[('AGENDADA', 'Agendada'), ('PENDENTE', 'Pendente'), ('ATRASO', 'Atraso'), ('CONCLUIDA', 'Concluída')], db_index=True, default='AGENDADA', max_length=10, verbose_name='Status da Execução'),
+        ),
+        migrations.RunPython(preencher_status_execucao, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 09:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_contagens(apps, schema_editor):
+    """Grava as contagens de tópicos e perguntas dos checklists existentes."""
+    Checklist = apps.get_model('auditorias', 'Checklist')
+    Topico = apps.get_model('auditorias', 'Topico')
+    Pergunta = apps.get_model('auditorias', 'Pergunta')
+
+    def contagem(queryset, campo_checklist):
+        return Coalesce(Subquery(
+            queryset.filter(**{campo_checklist: OuterRef('pk')}).order_by()
+            .values(campo_checklist).annotate(total=Count('pk')).values('total')
+        ), Value(0))
+
+    Checklist.objects.update(
+        total_topicos=contagem(Topico.objects.all(), 'checklist'),
+        total_perguntas=contagem(Pergunta.objects.all(), 'topico__checklist'),
+        total_obrigatorias=contagem(
+            Pergunta.objects.filter(obrigatoria=True), 'topico__checklist'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0052_status_execucao_persistido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checklist',
+            name='total_obrigatorias',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total de Perguntas Obrigatórias'),
+        ),
+        migrations.AddField(
+            model_name='checklist',
+            name='total_perguntas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total de Perguntas'),
+        ),
+        migrations.AddField(
+            model_name='checklist',
+            name='total_topicos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total de Tópicos'),
+        ),
+        migrations.RunPython(preencher_contagens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 09:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0053_contagens_checklist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultadoAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_itens', models.PositiveIntegerField(default=0, verbose_name='Total de Itens Respondidos')),
+                ('total_conformidade', models.PositiveIntegerField(default=0, verbose_name='Itens de Conformidade')),
+                ('nao_conformes', models.PositiveIntegerField(default=0, verbose_name='Não Conformes')),
+                ('nao_conformidade_maior', models.PositiveIntegerField(default=0, verbose_name='NC Maior')),
+                ('nao_conformidade_menor', models.PositiveIntegerField(default=0, verbose_name='NC Menor')),
+                ('desvios_solucionados', models.PositiveIntegerField(default=0, verbose_name='Desvios Solucionados')),
+                ('oportunidades_melhoria', models.PositiveIntegerField(default=0, verbose_name='Oportunidades de Melhoria')),
+                ('nao_aplicaveis', models.PositiveIntegerField(default=0, verbose_name='Não Aplicáveis')),
+                ('taxa_conformidade', models.FloatField(blank=True, null=True, verbose_name='Taxa de Conformidade (%)')),
+                ('pontuacao_final', models.FloatField(blank=True, null=True, verbose_name='Pontuação Final')),
+                ('inicio_execucao', models.DateTimeField(blank=True, null=True, verbose_name='Primeira Resposta')),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True, verbose_name='Última Resposta')),
+                ('duracao_segundos', models.PositiveIntegerField(blank=True, null=True, verbose_name='Duração da Execução (s)')),
+                ('data_calculo', models.DateTimeField(auto_now=True, verbose_name='Data do Cálculo')),
+                ('instancia', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resultado', to='auditorias.auditoriainstancia', verbose_name='Instância da Auditoria')),
+            ],
+            options={
+                'verbose_name': 'Resultado da Auditoria',
+                'verbose_name_plural': 'Resultados das Auditorias',
+            },
+        ),
+    ]
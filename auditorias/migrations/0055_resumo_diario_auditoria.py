@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0054_resultado_auditoria'),
+        ('organizacao', '0002_area_usuario_responsavel_empresa_usuario_responsavel_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiarioAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(db_index=True, verbose_name='Data')),
+                ('planejadas', models.PositiveIntegerField(default=0, verbose_name='Planejadas')),
+                ('executadas', models.PositiveIntegerField(default=0, verbose_name='Executadas')),
+                ('respostas', models.PositiveIntegerField(default=0, verbose_name='Respostas')),
+                ('nao_conformes', models.PositiveIntegerField(default=0, verbose_name='Não Conformes')),
+                ('nao_aplicaveis', models.PositiveIntegerField(default=0, verbose_name='Não Aplicáveis')),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auditorias.categoriaauditoria', verbose_name='Categoria')),
+                ('ferramenta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auditorias.ferramentadigital', verbose_name='Ferramenta')),
+                ('local_execucao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='organizacao.subsetor', verbose_name='Local (Subsetor)')),
+                ('responsavel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Responsável')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de Auditorias',
+                'verbose_name_plural': 'Resumos Diários de Auditorias',
+                'ordering': ['data'],
+            },
+        ),
+    ]
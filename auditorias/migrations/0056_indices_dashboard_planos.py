@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0055_resumo_diario_auditoria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='planodeacao',
+            name='data_abertura',
+            field=models.DateTimeField(db_index=True, verbose_name='Data da Ocorrência'),
+        ),
+        migrations.AlterField(
+            model_name='planodeacao',
+            name='status_plano',
+            field=models.CharField(choices=[('ABERTO', 'Recebido'), ('AGUARDANDO_VALIDACAO', 'Aguardando Validação'), ('EM_IMPLEMENTACAO', 'Em Implementação'), ('AGUARDANDO_APROVACAO', 'Aguardando Aprovação'), ('VALIDACAO_EFICACIA', 'Validação de Eficácia'), ('CONCLUIDO', 'Concluído'), ('CANCELADO', 'Cancelado'), ('ARQUIVADO', 'Arquivado')], db_index=True, default='ABERTO', max_length=50, verbose_name='Status'),
+        ),
+    ]
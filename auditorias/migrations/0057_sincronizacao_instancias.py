@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 12:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0056_indices_dashboard_planos'),
+        ('cadastros_base', '0002_alter_turno_options_remove_turno_hora_fim_and_more'),
+        ('organizacao', '0002_area_usuario_responsavel_empresa_usuario_responsavel_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemocaoInstancia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_instancia', models.BigIntegerField(verbose_name='ID da Execução')),
+                ('motivo', models.CharField(choices=[('EXCLUIDA', 'Excluída'), ('REDIRECIONADA', 'Redirecionada')], max_length=15, verbose_name='Motivo')),
+                ('data_remocao', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data da Remoção')),
+            ],
+            options={
+                'verbose_name': 'Remoção de Execução',
+                'verbose_name_plural': 'Remoções de Execuções',
+                'ordering': ['data_remocao'],
+            },
+        ),
+        migrations.AddField(
+            model_name='auditoriainstancia',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, verbose_name='Data de Atualização'),
+        ),
+        migrations.AddIndex(
+            model_name='auditoriainstancia',
+            index=models.Index(fields=['responsavel', 'data_atualizacao'], name='instancia_sync_idx'),
+        ),
+        migrations.AddField(
+            model_name='remocaoinstancia',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Auditor'),
+        ),
+        migrations.AddIndex(
+            model_name='remocaoinstancia',
+            index=models.Index(fields=['usuario', 'data_remocao'], name='remocao_sync_idx'),
+        ),
+    ]
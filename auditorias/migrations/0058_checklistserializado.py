@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0057_sincronizacao_instancias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChecklistSerializado',
+            fields=[
+                ('checklist', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='serializado', serialize=False, to='auditorias.checklist', verbose_name='Checklist')),
+                ('conteudo', models.TextField(verbose_name='Conteúdo (JSON)')),
+                ('hash_conteudo', models.CharField(max_length=64, verbose_name='Hash do Conteúdo (SHA-256)')),
+                ('data_geracao', models.DateTimeField(auto_now=True, verbose_name='Data de Geração')),
+            ],
+            options={
+                'verbose_name': 'Checklist Serializado',
+                'verbose_name_plural': 'Checklists Serializados',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 13:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0058_checklistserializado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=255, verbose_name='Chave')),
+                ('rota', models.CharField(max_length=255, verbose_name='Rota')),
+                ('status_resposta', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Status da Resposta')),
+                ('corpo_resposta', models.JSONField(blank=True, null=True, verbose_name='Corpo da Resposta')),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data de Criação')),
+                ('expira_em', models.DateTimeField(db_index=True, verbose_name='Expira em')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Chave de Idempotência',
+                'verbose_name_plural': 'Chaves de Idempotência',
+                'unique_together': {('usuario', 'chave')},
+            },
+        ),
+    ]
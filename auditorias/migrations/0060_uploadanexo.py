@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 14:10
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0059_chaveidempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadAnexo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('nome_original', models.CharField(blank=True, max_length=255, verbose_name='Nome Original')),
+                ('tamanho_total', models.PositiveBigIntegerField(verbose_name='Tamanho (bytes)')),
+                ('tamanho_recebido', models.PositiveBigIntegerField(default=0, verbose_name='Bytes Recebidos')),
+                ('arquivo', models.FileField(blank=True, upload_to='anexos_respostas/', verbose_name='Arquivo')),
+                ('data_criacao', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Data de Criação')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Upload de Anexo',
+                'verbose_name_plural': 'Uploads de Anexos',
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+CAMINHOS_VISIBILIDADE_PLANO = (
+    'responsavel_acao',
+    'origem_resposta__auditoria_instancia__responsavel',
+    'local_execucao__usuario_responsavel',
+    'local_execucao__setor__usuario_responsavel',
+    'local_execucao__setor__area__usuario_responsavel',
+    'local_execucao__setor__area__empresa__usuario_responsavel',
+)
+
+
+def preencher_visibilidade(apps, schema_editor):
+    """Monta o índice de visibilidade dos planos existentes."""
+    PlanoDeAcao = apps.get_model('auditorias', 'PlanoDeAcao')
+    VisibilidadePlano = apps.get_model('auditorias', 'VisibilidadePlano')
+
+    pares = set()
+    for plano_id, *usuarios in PlanoDeAcao.objects.order_by().values_list(
+            'pk', *CAMINHOS_VISIBILIDADE_PLANO).iterator():
+        pares.update((usuario_id, plano_id) for usuario_id in usuarios if usuario_id)
+    VisibilidadePlano.objects.bulk_create(
+        [VisibilidadePlano(usuario_id=usuario_id, plano_id=plano_id)
+         for usuario_id, plano_id in pares],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0060_uploadanexo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisibilidadePlano',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plano', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibilidade', to='auditorias.planodeacao', verbose_name='Plano de Ação')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Visibilidade de Plano',
+                'verbose_name_plural': 'Visibilidade dos Planos',
+                'unique_together': {('usuario', 'plano')},
+            },
+        ),
+        migrations.RunPython(preencher_visibilidade, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0061_visibilidadeplano'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planodeacao',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última Atualização'),
+        ),
+    ]
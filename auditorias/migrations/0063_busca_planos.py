@@ -0,0 +1,110 @@
+# Generated by Django 6.0 on 2026-10-18 16:30
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CAMPOS_BUSCA_PLANO = (
+    'descricao_causa_raiz', 'descricao_acao', 'descricao_acao_realizada',
+    'observacao_origem',
+)
+
+# Índices de busca textual de cada banco (ver auditorias/busca.py)
+SQL_INDICE = {
+    'postgresql': (
+        [
+            "ALTER TABLE auditorias_buscaplano ADD COLUMN vetor tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('portuguese', titulo), 'A') || "
+            "setweight(to_tsvector('portuguese', conteudo), 'B')) STORED",
+            "CREATE INDEX auditorias_buscaplano_vetor_gin "
+            "ON auditorias_buscaplano USING GIN (vetor)",
+        ],
+        [
+            "DROP INDEX IF EXISTS auditorias_buscaplano_vetor_gin",
+            "ALTER TABLE auditorias_buscaplano DROP COLUMN IF EXISTS vetor",
+        ],
+    ),
+    'sqlite': (
+        [
+            "CREATE VIRTUAL TABLE auditorias_buscaplano_fts USING fts5("
+            "titulo, conteudo, content='auditorias_buscaplano', content_rowid='plano_id', "
+            "tokenize='unicode61 remove_diacritics 2')",
+            "CREATE TRIGGER auditorias_buscaplano_ai AFTER INSERT ON auditorias_buscaplano BEGIN "
+            "INSERT INTO auditorias_buscaplano_fts(rowid, titulo, conteudo) "
+            "VALUES (new.plano_id, new.titulo, new.conteudo); END",
+            "CREATE TRIGGER auditorias_buscaplano_ad AFTER DELETE ON auditorias_buscaplano BEGIN "
+            "INSERT INTO auditorias_buscaplano_fts(auditorias_buscaplano_fts, rowid, titulo, conteudo) "
+            "VALUES ('delete', old.plano_id, old.titulo, old.conteudo); END",
+            "CREATE TRIGGER auditorias_buscaplano_au AFTER UPDATE ON auditorias_buscaplano BEGIN "
+            "INSERT INTO auditorias_buscaplano_fts(auditorias_buscaplano_fts, rowid, titulo, conteudo) "
+            "VALUES ('delete', old.plano_id, old.titulo, old.conteudo); "
+            "INSERT INTO auditorias_buscaplano_fts(rowid, titulo, conteudo) "
+            "VALUES (new.plano_id, new.titulo, new.conteudo); END",
+        ],
+        [
+            "DROP TRIGGER IF EXISTS auditorias_buscaplano_au",
+            "DROP TRIGGER IF EXISTS auditorias_buscaplano_ad",
+            "DROP TRIGGER IF EXISTS auditorias_buscaplano_ai",
+            "DROP TABLE IF EXISTS auditorias_buscaplano_fts",
+        ],
+    ),
+}
+
+
+def criar_indice(apps, schema_editor):
+    criar, _ = SQL_INDICE.get(schema_editor.connection.vendor, ([], []))
+    for sql in criar:
+        schema_editor.execute(sql)
+
+
+def remover_indice(apps, schema_editor):
+    _, remover = SQL_INDICE.get(schema_editor.connection.vendor, ([], []))
+    for sql in remover:
+        schema_editor.execute(sql)
+
+
+def preencher_busca(apps, schema_editor):
+    """Grava o texto pesquisável dos planos existentes."""
+    PlanoDeAcao = apps.get_model('auditorias', 'PlanoDeAcao')
+    BuscaPlano = apps.get_model('auditorias', 'BuscaPlano')
+    MensagemForum = apps.get_model('planos_de_acao', 'MensagemForum')
+
+    mensagens = defaultdict(list)
+    for forum_id, conteudo in MensagemForum.objects.order_by(
+            'data_envio').values_list('forum_id', 'conteudo').iterator():
+        mensagens[forum_id].append(conteudo)
+
+    documentos = [
+        BuscaPlano(plano_id=plano_id, titulo=titulo or '',
+                   conteudo='\n'.join(filter(None, [*textos, *mensagens.get(forum_id, [])])))
+        for plano_id, forum_id, titulo, *textos in PlanoDeAcao.objects.values_list(
+            'pk', 'forum_id', 'titulo', *CAMPOS_BUSCA_PLANO).iterator()
+    ]
+    BuscaPlano.objects.bulk_create(documentos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0062_data_atualizacao_plano'),
+        ('planos_de_acao', '0003_alter_mensagemforum_options_mensagemforum_editado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuscaPlano',
+            fields=[
+                ('plano', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busca', serialize=False, to='auditorias.planodeacao', verbose_name='Plano de Ação')),
+                ('titulo', models.TextField(blank=True, default='')),
+                ('conteudo', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Texto de Busca do Plano',
+                'verbose_name_plural': 'Textos de Busca dos Planos',
+            },
+        ),
+        migrations.RunPython(criar_indice, remover_indice),
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 17:10
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+CHAVE = ('data', 'local_execucao_id', 'ferramenta_id', 'categoria_id', 'responsavel_id')
+
+
+def remover_duplicados(apps, schema_editor):
+    """Mantém a primeira linha de cada grupo (as cópias vinham de recálculos simultâneos)."""
+    ResumoDiarioAuditoria = apps.get_model('auditorias', 'ResumoDiarioAuditoria')
+    vistos, duplicados = set(), []
+    for pk, *chave in ResumoDiarioAuditoria.objects.order_by('pk').values_list(
+            'pk', *CHAVE).iterator():
+        chave = tuple(chave)
+        if chave in vistos:
+            duplicados.append(pk)
+        else:
+            vistos.add(chave)
+    for inicio in range(0, len(duplicados), 1000):
+        ResumoDiarioAuditoria.objects.filter(pk__in=duplicados[inicio:inicio + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditorias', '0063_busca_planos'),
+        ('organizacao', '0003_caminho_materializado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resumodiarioauditoria',
+            constraint=models.UniqueConstraint(models.F('data'), django.db.models.functions.comparison.Coalesce('local_execucao', models.Value(0)), django.db.models.functions.comparison.Coalesce('ferramenta', models.Value(0)), django.db.models.functions.comparison.Coalesce('categoria', models.Value(0)), django.db.models.functions.comparison.Coalesce('responsavel', models.Value(0)), name='resumo_diario_grupo_unico'),
+        ),
+    ]
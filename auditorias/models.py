@@ -1,17 +1,35 @@
 # auditorias/models.py
 
-from django.db import models
+import hashlib
+import json
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import IntegrityError, models, transaction
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from organizacao.models import Empresa, Area, Setor, SubSetor
 from ativos.models import Ativo
 from cadastros_base.models import Turno
+from planos_de_acao.models import MensagemForum
 from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
 
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
-from dateutil.relativedelta import relativedelta
 
-from django.db.models import Q
+from django.db.models import (
+    Q, F, Count, Max, Min, OuterRef, Subquery, Sum, Value, ExpressionWrapper
+)
+from django.db.models.functions import Coalesce
+
+from core.cache import invalidar_regiao
+
+from .agendamento import data_limite_da_execucao, status_da_execucao
+from .busca import buscar_planos
 
 
 class Pilar(models.Model):
@@ -55,6 +73,12 @@ class CategoriaAuditoria(models.Model):
         help_text="Quantos dias de atraso são permitidos antes de entrar em quarentena."
     )
 
+    semanas_horizonte = models.PositiveIntegerField(
+        null=True, blank=True,
+        verbose_name="Horizonte de Agendamento (semanas)",
+        help_text="Quantas semanas de execuções futuras ficam gravadas. Em branco, usa o padrão global."
+    )
+
     class Meta:
         verbose_name = "Categoria de Auditoria"
         verbose_name_plural = "Categorias de Auditorias"
@@ -161,6 +185,17 @@ class Checklist(models.Model):
         verbose_name="Checklist Original"
     )
     # --- FIM DOS NOVOS CAMPOS ---
+
+    # Contagens desnormalizadas da estrutura desta versão. Gravadas uma única
+    # vez ao final da criação da versão (estrutura_em_lote) e mantidas pelos
+    # sinais de Topico/Pergunta nas edições avulsas (ver signals.py).
+    total_topicos = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Total de Tópicos")
+    total_perguntas = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Total de Perguntas")
+    total_obrigatorias = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Total de Perguntas Obrigatórias")
+
     data_cadastro = models.DateTimeField(
         auto_now_add=True, verbose_name="Data de Cadastro")
     data_atualizacao = models.DateTimeField(
@@ -174,6 +209,67 @@ class Checklist(models.Model):
     def __str__(self):
         return f"{self.nome} (V{self.version})"
 
+    def atualizar_contagens(self):
+        """Recalcula as contagens de tópicos e perguntas em um único UPDATE."""
+        atualizar_contagens_checklists(Checklist.objects.filter(pk=self.pk))
+        self.refresh_from_db(
+            fields=['total_topicos', 'total_perguntas', 'total_obrigatorias'])
+
+
+def atualizar_contagens_checklists(checklists):
+    """Recalcula as contagens desnormalizadas dos checklists do queryset."""
+    def contagem(queryset, campo_checklist):
+        return Coalesce(Subquery(
+            queryset.filter(**{campo_checklist: OuterRef('pk')}).order_by()
+            .values(campo_checklist).annotate(total=Count('pk')).values('total')
+        ), Value(0))
+
+    perguntas = Pergunta.objects.all()
+    return checklists.update(
+        total_topicos=contagem(Topico.objects.all(), 'checklist'),
+        total_perguntas=contagem(perguntas, 'topico__checklist'),
+        total_obrigatorias=contagem(
+            perguntas.filter(obrigatoria=True), 'topico__checklist'),
+    )
+
+
+# Checklists cuja estrutura está sendo gravada em lote neste thread
+_estrutura_em_lote = threading.local()
+
+
+def estrutura_em_lote_ativa():
+    """Se há uma `estrutura_em_lote` aberta neste thread."""
+    return getattr(_estrutura_em_lote, 'checklists', None) is not None
+
+
+@contextmanager
+def estrutura_em_lote(*checklists):
+    """
+    Bloco atômico que grava em lote a estrutura (tópicos, perguntas e opções)
+    dos `checklists`. Dentro dele os sinais deixam de recalcular as contagens
+    e de descartar o JSON serializado a cada registro salvo; os dois são
+    feitos uma única vez ao final. Só a estrutura desses checklists deve ser
+    alterada dentro do bloco.
+    """
+    pendentes = getattr(_estrutura_em_lote, 'checklists', None)
+    if pendentes is not None:
+        # Bloco aninhado: o mais externo recalcula tudo ao final
+        pendentes.update(checklist.pk for checklist in checklists)
+        yield
+        return
+
+    _estrutura_em_lote.checklists = pendentes = {
+        checklist.pk for checklist in checklists}
+    try:
+        with transaction.atomic():
+            yield
+            atualizar_contagens_checklists(
+                Checklist.objects.filter(pk__in=pendentes))
+            ChecklistSerializado.objects.filter(
+                checklist_id__in=pendentes).delete()
+    finally:
+        _estrutura_em_lote.checklists = None
+
 
 class Topico(models.Model):
     checklist = models.ForeignKey(
@@ -279,6 +375,62 @@ class OpcaoPorcentagem(models.Model):
         return f"{self.descricao} - {self.peso}%"
 
 
+class ChecklistSerializado(models.Model):
+    """
+    Estrutura completa de uma versão de checklist (tópicos, perguntas e
+    opções) já serializada em JSON, pronta para o app.
+
+    Gerada na criação da versão e descartada pelos sinais quando a estrutura
+    é alterada (ver signals.py); `hash_conteudo` identifica o conteúdo e é o
+    ETag da resposta, de modo que o app só baixa uma versão uma única vez.
+    """
+    checklist = models.OneToOneField(
+        Checklist,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='serializado',
+        verbose_name="Checklist")
+    conteudo = models.TextField(verbose_name="Conteúdo (JSON)")
+    hash_conteudo = models.CharField(
+        max_length=64, verbose_name="Hash do Conteúdo (SHA-256)")
+    data_geracao = models.DateTimeField(
+        auto_now=True, verbose_name="Data de Geração")
+
+    class Meta:
+        verbose_name = "Checklist Serializado"
+        verbose_name_plural = "Checklists Serializados"
+
+    def __str__(self):
+        return f"{self.checklist_id} ({self.hash_conteudo[:12]})"
+
+    @classmethod
+    def gerar_para(cls, checklist):
+        """Serializa a versão do checklist (4 consultas) e grava o resultado."""
+        from .serializers import ChecklistSerializer
+
+        checklist = Checklist.objects.prefetch_related(
+            'topicos__perguntas__opcoes_resposta',
+            'topicos__perguntas__opcoes_porcentagem',
+        ).get(pk=checklist.pk)
+        conteudo = json.dumps(ChecklistSerializer(checklist).data,
+                              ensure_ascii=False, separators=(',', ':'))
+        serializado, _ = cls.objects.update_or_create(
+            checklist=checklist,
+            defaults={
+                'conteudo': conteudo,
+                'hash_conteudo': hashlib.sha256(conteudo.encode('utf-8')).hexdigest(),
+            })
+        return serializado
+
+    @classmethod
+    def obter_para(cls, checklist):
+        """Versão serializada gravada ou, na falta dela, gerada agora."""
+        try:
+            return checklist.serializado
+        except cls.DoesNotExist:
+            return cls.gerar_para(checklist)
+
+
 class FerramentaCausaRaiz(models.Model):
     nome = models.CharField(max_length=100, unique=True,
                             verbose_name="Nome da Ferramenta")
@@ -456,6 +608,19 @@ class Auditoria(models.Model):
         default=False, verbose_name="Pular Finais de Semana")
     contem_turnos = models.BooleanField(
         default=False, verbose_name="Contém Turnos")
+    # Subsetores escolhidos no agendamento específico (necessários para
+    # estender o horizonte depois da criação)
+    subsetores_especificos = models.ManyToManyField(
+        SubSetor,
+        blank=True,
+        verbose_name="Subsetores Específicos",
+        related_name='auditorias_especificas'
+    )
+    # Última data com instâncias gravadas no modo de horizonte rolante.
+    # Nulo quando todas as execuções foram materializadas de uma vez.
+    materializado_ate = models.DateField(
+        null=True, blank=True, editable=False,
+        verbose_name="Execuções Materializadas Até")
     data_criacao = models.DateTimeField(
         auto_now_add=True, verbose_name="Data de Criação")
     data_atualizacao = models.DateTimeField(
@@ -489,6 +654,106 @@ class Auditoria(models.Model):
         super().save(*args, **kwargs)
 
 
+STATUS_EXECUCAO = [
+    ('AGENDADA', 'Agendada'),
+    ('PENDENTE', 'Pendente'),
+    ('ATRASO', 'Atraso'),
+    ('CONCLUIDA', 'Concluída'),
+]
+
+
+class AuditoriaInstanciaQuerySet(models.QuerySet):
+
+    def com_tolerancia_quarentena(self):
+        """
+        Anota `dias_tolerancia` (dias de atraso permitidos pela categoria do
+        primeiro modelo do agendamento, 7 por padrão) e `inicio_quarentena`
+        (data_execucao + tolerância), calculados no banco.
+        """
+        tolerancia_categoria = ModeloAuditoria.objects.filter(
+            auditoria=OuterRef('auditoria_agendada')
+        ).order_by('descricao').values('categoria__dias_para_quarentena')[:1]
+        return self.annotate(
+            dias_tolerancia=Coalesce(
+                Subquery(tolerancia_categoria), Value(7),
+                output_field=models.IntegerField()),
+        ).annotate(
+            # Aritmética de datas pelo ORM: funciona no SQLite e no Postgres
+            inicio_quarentena=ExpressionWrapper(
+                F('data_execucao') + ExpressionWrapper(
+                    F('dias_tolerancia') * Value(timedelta(days=1)),
+                    output_field=models.DurationField()),
+                output_field=models.DateField()),
+        )
+
+    def em_quarentena(self, hoje=None):
+        """Execuções não realizadas com atraso maior que a tolerância da categoria."""
+        hoje = hoje or timezone.now().date()
+        return self.com_tolerancia_quarentena().filter(
+            executada=False, data_execucao__lt=hoje, inicio_quarentena__lt=hoje)
+
+    def fora_de_quarentena(self, hoje=None):
+        """Execuções não realizadas que ainda estão dentro da tolerância."""
+        hoje = hoje or timezone.now().date()
+        return self.com_tolerancia_quarentena().filter(
+            executada=False, inicio_quarentena__gte=hoje)
+
+    def recalcular_status(self, hoje=None):
+        """
+        Atualiza o status persistido com base na data de hoje, em um UPDATE por
+        status (só as linhas que mudaram). Retorna a quantidade de linhas alteradas.
+        """
+        hoje = hoje or timezone.now().date()
+        abertas = self.filter(executada=False)
+        transicoes = [
+            ('CONCLUIDA', self.filter(executada=True)),
+            ('AGENDADA', abertas.filter(data_execucao__gt=hoje)),
+            ('PENDENTE', abertas.filter(data_execucao__lte=hoje, data_limite__gt=hoje)),
+            ('ATRASO', abertas.filter(data_execucao__lte=hoje, data_limite__lte=hoje)),
+        ]
+        agora = timezone.now()
+        return sum(
+            queryset.exclude(status_execucao=status).update(
+                status_execucao=status, data_atualizacao=agora)
+            for status, queryset in transicoes
+        )
+
+    def marcar_alteradas(self):
+        """
+        Marca as execuções como alteradas para a sincronização do app (usar
+        em alterações que não passam pelo save(), como update()).
+        """
+        return self.update(data_atualizacao=timezone.now())
+
+    def redirecionar(self, novo_responsavel_id):
+        """
+        Troca o responsável das execuções em um único UPDATE, registrando a
+        remoção para os auditores anteriores (sincronização do app).
+        """
+        ids = list(self.values_list('id', flat=True))
+        RemocaoInstancia.registrar(
+            self.exclude(responsavel_id=novo_responsavel_id).filter(
+                responsavel__isnull=False).values_list('id', 'responsavel_id'),
+            'REDIRECIONADA')
+        total = self.update(responsavel_id=novo_responsavel_id,
+                            data_atualizacao=timezone.now())
+        # update() não dispara sinais: o auditor também enxerga os planos gerados
+        VisibilidadePlano.atualizar(PlanoDeAcao.objects.filter(
+            origem_resposta__auditoria_instancia__in=ids))
+        return total
+
+    def excluir(self):
+        """
+        Exclui as execuções registrando a remoção para os seus auditores
+        (sincronização do app) com um único INSERT em lote. Toda exclusão de
+        execuções deve passar por aqui: não há sinal que registre a remoção.
+        """
+        RemocaoInstancia.registrar(
+            self.filter(responsavel__isnull=False).values_list('id', 'responsavel_id'),
+            'EXCLUIDA')
+        return self.delete()
+
+
 class AuditoriaInstancia(models.Model):
     auditoria_agendada = models.ForeignKey(
         Auditoria,
@@ -528,6 +793,34 @@ class AuditoriaInstancia(models.Model):
     data_execucao = models.DateField(verbose_name="Data de Execução")
     executada = models.BooleanField(default=False, verbose_name="Executada?")
 
+    # Status e prazo persistidos para permitir filtrar e contar no banco.
+    # Atualizados no save() e recalculados diariamente pelo comando
+    # recalcular_status_execucoes (a passagem dos dias muda o status).
+    data_limite = models.DateField(
+        null=True, blank=True, db_index=True,
+        verbose_name="Data Limite")
+    status_execucao = models.CharField(
+        max_length=10,
+        choices=STATUS_EXECUCAO,
+        default='AGENDADA',
+        db_index=True,
+        verbose_name="Status da Execução"
+    )
+
+    # Cursor da sincronização incremental do app (/api/sync/). Alterações
+    # feitas com update()/bulk_update() precisam atualizá-lo explicitamente.
+    data_atualizacao = models.DateTimeField(
+        auto_now=True, verbose_name="Data de Atualização")
+
+    objects = AuditoriaInstanciaQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Guarda o responsável carregado para detectar redirecionamentos no save()
+        instancia._responsavel_carregado_id = instancia.__dict__.get('responsavel_id')
+        return instancia
+
     @property
     def status(self):
         """Calcula o status desta instância específica."""
@@ -540,56 +833,43 @@ class AuditoriaInstancia(models.Model):
         return "Pendente"
     # --- FIM DA ADIÇÃO ---
 
-    @property
-    def status_execucao(self):
-        """ Retorna o status específico para a tela de execuções, considerando a frequência. """
-        today = timezone.now().date()
+    def calcular_status_execucao(self, hoje=None):
+        """ Calcula o status da tela de execuções, considerando a frequência. """
+        hoje = hoje or timezone.now().date()
+        data_limite = self.data_limite or data_limite_da_execucao(
+            self.data_execucao, self.auditoria_agendada)
+        return status_da_execucao(
+            self.executada, self.data_execucao, data_limite, hoje)
 
-        if self.executada:
-            return "Concluída"
+    def save(self, *args, **kwargs):
+        """
+        Mantém a data limite e o status persistidos em dia sempre que a
+        execução é gravada (ex.: ao ser submetida pelo app).
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'executada', 'data_execucao'}.intersection(update_fields):
+            self.data_limite = data_limite_da_execucao(
+                self.data_execucao, self.auditoria_agendada)
+            self.status_execucao = self.calcular_status_execucao()
+            if update_fields is not None:
+                update_fields = set(update_fields) | {'data_limite', 'status_execucao'}
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'data_atualizacao'}
+        super().save(*args, **kwargs)
 
-        # Se a data de execução ainda está no futuro, está 'Agendada'
-        if self.data_execucao > today:
-            return "Agendada"
-
-        # Se a data de execução é hoje, está 'Pendente'
-        if self.data_execucao == today:
-            return "Pendente"
-
-        # Se a data de execução já passou, verificamos se está em atraso real
-        if self.data_execucao < today:
-            agendamento = self.auditoria_agendada
-            # Padrão de 1 dia para auditorias únicas
-            grace_period = timedelta(days=1)
-
-            if agendamento.por_frequencia and agendamento.frequencia:
-                if agendamento.frequencia == 'DIARIO':
-                    grace_period = timedelta(days=1)
-                elif agendamento.frequencia == 'SEMANAL':
-                    grace_period = timedelta(weeks=1)
-                elif agendamento.frequencia == 'QUINZENAL':
-                    grace_period = timedelta(weeks=2)
-                elif agendamento.frequencia == 'MENSAL':
-                    grace_period = relativedelta(months=1)
-                elif agendamento.frequencia == 'ANUAL':
-                    grace_period = relativedelta(years=1)
-
-            elif agendamento.por_intervalo and agendamento.intervalo:
-                grace_period = timedelta(days=agendamento.intervalo + 1)
-
-            # A data limite é a data programada + o período de carência
-            data_limite = self.data_execucao + grace_period
-
-            if today >= data_limite:
-                return "Atraso"
-            else:
-                # Se a data de hoje ainda está dentro do período de carência, continua pendente
-                return "Pendente"
-
-        return "Pendente"  # Fallback para o dia de hoje
+        # Redirecionada: sai da lista do auditor anterior no app
+        anterior_id = getattr(self, '_responsavel_carregado_id', None)
+        if anterior_id and anterior_id != self.responsavel_id:
+            RemocaoInstancia.registrar([(self.pk, anterior_id)], 'REDIRECIONADA')
+        self._responsavel_carregado_id = self.responsavel_id
 
     def get_data_conclusao(self):
         """Retorna a data e hora da última resposta enviada para esta instância."""
+        # Execuções submetidas já têm a data gravada no resultado
+        try:
+            return self.resultado.data_conclusao
+        except ObjectDoesNotExist:
+            pass
         ultima_resposta = self.respostas.order_by('-data_resposta').first()
         if ultima_resposta:
             return ultima_resposta.data_resposta
@@ -604,7 +884,8 @@ class AuditoriaInstancia(models.Model):
         # A lógica antiga olhava para o agendamento pai, que sempre tem a última versão.
         # A nova lógica olha para o checklist exato que foi salvo nesta instância.
         if self.checklist_usado:
-            return Pergunta.objects.filter(topico__checklist=self.checklist_usado).count()
+            # Contagem gravada na versão do checklist (sem consulta extra)
+            return self.checklist_usado.total_perguntas
 
         # Se por algum motivo não houver um checklist vinculado, retorna 0 para evitar erros.
         return 0
@@ -612,7 +893,10 @@ class AuditoriaInstancia(models.Model):
     def get_percentual_conclusao(self):
         """Calcula e formata o percentual de respostas concluídas."""
         total_perguntas = self.get_total_perguntas()
-        respostas_dadas = self.respostas.count()
+        try:
+            respostas_dadas = self.resultado.total_itens
+        except ObjectDoesNotExist:
+            respostas_dadas = self.respostas.count()
 
         if total_perguntas == 0:
             return 0.0  # Evita divisão por zero se não houver perguntas
@@ -626,11 +910,123 @@ class AuditoriaInstancia(models.Model):
         verbose_name = "Instância de Auditoria"
         verbose_name_plural = "Instâncias de Auditoria"
         ordering = ['data_execucao']
+        indexes = [
+            # Sincronização: alterações de um auditor desde o último cursor
+            models.Index(fields=['responsavel', 'data_atualizacao'],
+                         name='instancia_sync_idx'),
+        ]
 
     def __str__(self):
         return f"Execução em {self.data_execucao} de {self.auditoria_agendada}"
 
 
+class RemocaoInstancia(models.Model):
+    """
+    Marca ("tombstone") de uma execução que saiu da lista de um auditor, por
+    exclusão ou redirecionamento. Lida pela sincronização incremental do app
+    para que ele apague a execução localmente.
+    """
+    MOTIVOS = (
+        ('EXCLUIDA', 'Excluída'),
+        ('REDIRECIONADA', 'Redirecionada'),
+    )
+
+    id_instancia = models.BigIntegerField(verbose_name="ID da Execução")
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Auditor")
+    motivo = models.CharField(
+        max_length=15, choices=MOTIVOS, verbose_name="Motivo")
+    data_remocao = models.DateTimeField(
+        default=timezone.now, verbose_name="Data da Remoção")
+
+    class Meta:
+        verbose_name = "Remoção de Execução"
+        verbose_name_plural = "Remoções de Execuções"
+        ordering = ['data_remocao']
+        indexes = [
+            models.Index(fields=['usuario', 'data_remocao'],
+                         name='remocao_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"Execução #{self.id_instancia} ({self.get_motivo_display()})"
+
+    @classmethod
+    def registrar(cls, pares, motivo):
+        """Grava as remoções de uma sequência de pares (id da execução, id do auditor)."""
+        agora = timezone.now()
+        remocoes = [
+            cls(id_instancia=id_instancia, usuario_id=usuario_id,
+                motivo=motivo, data_remocao=agora)
+            for id_instancia, usuario_id in pares if usuario_id
+        ]
+        cls.objects.bulk_create(remocoes, batch_size=1000)
+        return len(remocoes)
+
+
+class ChaveIdempotencia(models.Model):
+    """
+    Resultado de uma requisição do app enviada com o cabeçalho Idempotency-Key.
+    Uma nova tentativa com a mesma chave recebe o resultado gravado, sem que a
+    requisição seja processada (nem lida) de novo. Sem `status_resposta`, a
+    requisição original ainda está em processamento.
+    """
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Usuário")
+    chave = models.CharField(max_length=255, verbose_name="Chave")
+    rota = models.CharField(max_length=255, verbose_name="Rota")
+    status_resposta = models.PositiveSmallIntegerField(
+        null=True, blank=True, verbose_name="Status da Resposta")
+    corpo_resposta = models.JSONField(
+        null=True, blank=True, verbose_name="Corpo da Resposta")
+    data_criacao = models.DateTimeField(
+        default=timezone.now, verbose_name="Data de Criação")
+    expira_em = models.DateTimeField(db_index=True, verbose_name="Expira em")
+
+    class Meta:
+        verbose_name = "Chave de Idempotência"
+        verbose_name_plural = "Chaves de Idempotência"
+        unique_together = ('usuario', 'chave')
+
+    def __str__(self):
+        return f"{self.chave} ({self.rota})"
+
+    @classmethod
+    def reservar(cls, usuario, chave, rota):
+        """
+        Reserva a chave para a requisição atual. Devolve (registro, criado):
+        com criado=False, o registro é o da tentativa anterior. Chaves vencidas
+        e reservas de processamentos interrompidos são descartadas antes.
+        """
+        config = settings.AUDITORIAS_CONFIG
+        agora = timezone.now()
+        cls.objects.filter(usuario=usuario, chave=chave).filter(
+            Q(expira_em__lte=agora) |
+            Q(status_resposta__isnull=True, data_criacao__lte=agora - timedelta(
+                minutes=config.get('IDEMPOTENCIA_PROCESSAMENTO_MINUTOS', 10)))
+        ).delete()
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    usuario=usuario, chave=chave, rota=rota, data_criacao=agora,
+                    expira_em=agora + timedelta(hours=config.get('IDEMPOTENCIA_HORAS', 48))
+                ), True
+        except IntegrityError:
+            return cls.objects.get(usuario=usuario, chave=chave), False
+
+    def concluir(self, status_resposta, corpo_resposta):
+        """Grava o resultado que será devolvido às próximas tentativas."""
+        self.status_resposta = status_resposta
+        self.corpo_resposta = corpo_resposta
+        self.save(update_fields=['status_resposta', 'corpo_resposta'])
+
+
 class Resposta(models.Model):
 
     auditoria_instancia = models.ForeignKey(
@@ -728,6 +1124,501 @@ class AnexoResposta(models.Model):
         return f"Anexo para a resposta {self.resposta.id}"
 
 
+class UploadAnexo(models.Model):
+    """
+    Arquivo enviado pelo app antes da submissão (ver auditorias/anexos.py),
+    de uma vez ou em partes. Identificado pelo token, que a submissão cita em
+    `anexos_tokens`; ao ser usado, vira um AnexoResposta com o mesmo arquivo.
+    """
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Usuário")
+    nome_original = models.CharField(
+        max_length=255, blank=True, verbose_name="Nome Original")
+    tamanho_total = models.PositiveBigIntegerField(verbose_name="Tamanho (bytes)")
+    tamanho_recebido = models.PositiveBigIntegerField(
+        default=0, verbose_name="Bytes Recebidos")
+    # Preenchido quando o upload termina e o tipo do arquivo é validado
+    arquivo = models.FileField(
+        upload_to='anexos_respostas/', blank=True, verbose_name="Arquivo")
+    data_criacao = models.DateTimeField(
+        default=timezone.now, db_index=True, verbose_name="Data de Criação")
+
+    class Meta:
+        verbose_name = "Upload de Anexo"
+        verbose_name_plural = "Uploads de Anexos"
+
+    def __str__(self):
+        return f"{self.token} ({self.tamanho_recebido}/{self.tamanho_total} bytes)"
+
+    @property
+    def concluido(self):
+        return bool(self.arquivo)
+
+
+class ResultadoAuditoria(models.Model):
+    """
+    Resumo do resultado de uma execução, calculado uma única vez na submissão
+    (as respostas não mudam depois que a instância é marcada como executada).
+    """
+    instancia = models.OneToOneField(
+        AuditoriaInstancia,
+        on_delete=models.CASCADE,
+        related_name='resultado',
+        verbose_name="Instância da Auditoria"
+    )
+    total_itens = models.PositiveIntegerField(
+        default=0, verbose_name="Total de Itens Respondidos")
+    total_conformidade = models.PositiveIntegerField(
+        default=0, verbose_name="Itens de Conformidade")
+    nao_conformes = models.PositiveIntegerField(
+        default=0, verbose_name="Não Conformes")
+    nao_conformidade_maior = models.PositiveIntegerField(
+        default=0, verbose_name="NC Maior")
+    nao_conformidade_menor = models.PositiveIntegerField(
+        default=0, verbose_name="NC Menor")
+    desvios_solucionados = models.PositiveIntegerField(
+        default=0, verbose_name="Desvios Solucionados")
+    oportunidades_melhoria = models.PositiveIntegerField(
+        default=0, verbose_name="Oportunidades de Melhoria")
+    nao_aplicaveis = models.PositiveIntegerField(
+        default=0, verbose_name="Não Aplicáveis")
+    taxa_conformidade = models.FloatField(
+        null=True, blank=True, verbose_name="Taxa de Conformidade (%)")
+    pontuacao_final = models.FloatField(
+        null=True, blank=True, verbose_name="Pontuação Final")
+    inicio_execucao = models.DateTimeField(
+        null=True, blank=True, verbose_name="Primeira Resposta")
+    data_conclusao = models.DateTimeField(
+        null=True, blank=True, verbose_name="Última Resposta")
+    duracao_segundos = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name="Duração da Execução (s)")
+    data_calculo = models.DateTimeField(
+        auto_now=True, verbose_name="Data do Cálculo")
+
+    class Meta:
+        verbose_name = "Resultado da Auditoria"
+        verbose_name_plural = "Resultados das Auditorias"
+
+    def __str__(self):
+        return f"Resultado da execução {self.instancia_id}"
+
+    @property
+    def tempo_execucao_display(self):
+        """Duração no formato HH:MM:SS (N/A com menos de duas respostas)."""
+        if self.duracao_segundos is None:
+            return "N/A"
+        horas, resto = divmod(self.duracao_segundos, 3600)
+        minutos, segundos = divmod(resto, 60)
+        return f"{horas:02}:{minutos:02}:{segundos:02}"
+
+    @classmethod
+    def calcular_para(cls, instancia):
+        """
+        Calcula (ou recalcula) o resultado da instância com uma única consulta
+        agregada sobre as respostas e grava o resumo.
+        """
+        conformidade = Q(opcao_resposta__isnull=False)
+        dados = Resposta.objects.filter(auditoria_instancia=instancia).aggregate(
+            total_itens=Count('id'),
+            total_conformidade=Count('id', filter=conformidade),
+            nao_conformes=Count('id', filter=Q(
+                opcao_resposta__status='NAO_CONFORME')),
+            nao_aplicaveis=Count('id', filter=Q(opcao_resposta__status='NA')),
+            nao_conformidade_maior=Count('id', filter=conformidade & Q(grau_nc='NC MAIOR')),
+            nao_conformidade_menor=Count('id', filter=conformidade & Q(grau_nc='NC MENOR')),
+            desvios_solucionados=Count(
+                'id', filter=conformidade & Q(desvio_solucionado=True)),
+            oportunidades_melhoria=Count(
+                'id', filter=conformidade & Q(oportunidade_melhoria=True)),
+            total_porcentagem=Count('id', filter=Q(opcao_porcentagem__isnull=False)),
+            soma_pesos=Sum('opcao_porcentagem__peso'),
+            primeira=Min('data_resposta'),
+            ultima=Max('data_resposta'),
+        )
+
+        # Taxa de conformidade: itens aplicáveis (sem N/A) que não são NC
+        taxa_conformidade = None
+        if dados['total_conformidade']:
+            itens_aplicaveis = dados['total_conformidade'] - dados['nao_aplicaveis']
+            taxa_conformidade = ((itens_aplicaveis - dados['nao_conformes']) /
+                                 itens_aplicaveis * 100) if itens_aplicaveis > 0 else 0.0
+
+        # Pontuação: média dos pesos das opções de porcentagem escolhidas
+        pontuacao_final = None
+        if dados['total_porcentagem']:
+            pontuacao_final = (dados['soma_pesos'] or 0) / dados['total_porcentagem']
+
+        # Tempo entre a primeira e a última resposta
+        duracao_segundos = None
+        if dados['total_itens'] > 1 and dados['primeira'] and dados['ultima']:
+            duracao_segundos = int(
+                (dados['ultima'] - dados['primeira']).total_seconds())
+
+        resultado, _ = cls.objects.update_or_create(
+            instancia=instancia,
+            defaults={
+                'total_itens': dados['total_itens'],
+                'total_conformidade': dados['total_conformidade'],
+                'nao_conformes': dados['nao_conformes'],
+                'nao_conformidade_maior': dados['nao_conformidade_maior'],
+                'nao_conformidade_menor': dados['nao_conformidade_menor'],
+                'desvios_solucionados': dados['desvios_solucionados'],
+                'oportunidades_melhoria': dados['oportunidades_melhoria'],
+                'nao_aplicaveis': dados['nao_aplicaveis'],
+                'taxa_conformidade': taxa_conformidade,
+                'pontuacao_final': pontuacao_final,
+                'inicio_execucao': dados['primeira'],
+                'data_conclusao': dados['ultima'],
+                'duracao_segundos': duracao_segundos,
+            }
+        )
+        return resultado
+
+    @classmethod
+    def obter_para(cls, instancia):
+        """Resultado gravado da instância; calcula na hora se ainda não existir."""
+        try:
+            return instancia.resultado
+        except cls.DoesNotExist:
+            return cls.calcular_para(instancia)
+
+
+class ResumoDiarioAuditoria(models.Model):
+    """
+    Rollup diário das execuções por data x subsetor x ferramenta x categoria x
+    responsável, lido pelo dashboard de auditorias. Cada dia afetado por uma
+    mudança é recalculado a partir das instâncias e dos resultados gravados.
+    """
+    data = models.DateField(db_index=True, verbose_name="Data")
+    local_execucao = models.ForeignKey(
+        SubSetor, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', verbose_name="Local (Subsetor)")
+    ferramenta = models.ForeignKey(
+        FerramentaDigital, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', verbose_name="Ferramenta")
+    categoria = models.ForeignKey(
+        CategoriaAuditoria, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', verbose_name="Categoria")
+    responsavel = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', verbose_name="Responsável")
+
+    planejadas = models.PositiveIntegerField(default=0, verbose_name="Planejadas")
+    executadas = models.PositiveIntegerField(default=0, verbose_name="Executadas")
+    respostas = models.PositiveIntegerField(default=0, verbose_name="Respostas")
+    nao_conformes = models.PositiveIntegerField(default=0, verbose_name="Não Conformes")
+    nao_aplicaveis = models.PositiveIntegerField(default=0, verbose_name="Não Aplicáveis")
+
+    # Chave do grupo e valores recalculados de cada linha
+    CHAVE = ('data', 'local_execucao_id', 'ferramenta_id', 'categoria_id', 'responsavel_id')
+    VALORES = ('planejadas', 'executadas', 'respostas', 'nao_conformes', 'nao_aplicaveis')
+
+    # Dias recalculados por transação
+    DIAS_POR_LOTE = 366
+
+    class Meta:
+        verbose_name = "Resumo Diário de Auditorias"
+        verbose_name_plural = "Resumos Diários de Auditorias"
+        ordering = ['data']
+        constraints = [
+            # Uma linha por grupo; os campos nulos (sem local, ferramenta...)
+            # entram como 0 para que também sejam comparados
+            models.UniqueConstraint(
+                'data', Coalesce('local_execucao', Value(0)),
+                Coalesce('ferramenta', Value(0)), Coalesce('categoria', Value(0)),
+                Coalesce('responsavel', Value(0)),
+                name='resumo_diario_grupo_unico'),
+        ]
+
+    def __str__(self):
+        return f"Resumo de {self.data}"
+
+    @classmethod
+    def recalcular_periodo(cls, data_inicial, data_final):
+        """
+        Recalcula todos os dias do período que têm execuções ou resumos
+        (usado pelo comando reconstruir_resumos_auditorias).
+        """
+        if not data_inicial or not data_final:
+            return 0
+        if data_final < data_inicial:
+            data_inicial, data_final = data_final, data_inicial
+        dias = set(AuditoriaInstancia.objects.filter(
+            data_execucao__range=(data_inicial, data_final)
+        ).order_by().values_list('data_execucao', flat=True).distinct())
+        dias.update(cls.objects.filter(
+            data__range=(data_inicial, data_final)
+        ).order_by().values_list('data', flat=True).distinct())
+        return cls.recalcular_dias(dias)
+
+    @classmethod
+    def recalcular_dias(cls, dias):
+        """
+        Recalcula os resumos dos dias informados e grava só as diferenças
+        (linhas novas, alteradas e as que deixaram de existir). Retorna a
+        quantidade de linhas gravadas ou removidas.
+        """
+        dias = sorted({dia for dia in dias if dia})
+        alteradas = 0
+        for inicio in range(0, len(dias), cls.DIAS_POR_LOTE):
+            lote = dias[inicio:inicio + cls.DIAS_POR_LOTE]
+            try:
+                with transaction.atomic():
+                    alteradas += cls._regravar_dias(lote)
+            except IntegrityError:
+                # Outra transação inseriu um dos grupos ao mesmo tempo: com
+                # ela já confirmada, o recálculo enxerga as duas mudanças
+                with transaction.atomic():
+                    alteradas += cls._regravar_dias(lote)
+        if alteradas:
+            # bulk_create/bulk_update não disparam sinais: invalida o cache do dashboard aqui
+            transaction.on_commit(lambda: invalidar_regiao('auditorias'))
+        return alteradas
+
+    @classmethod
+    def _regravar_dias(cls, dias):
+        # Bloqueia as linhas atuais dos dias antes de agrupar as instâncias:
+        # um recálculo simultâneo dos mesmos dias espera este terminar e então
+        # agrupa já vendo as mudanças confirmadas por ele
+        existentes = {
+            tuple(getattr(resumo, campo) for campo in cls.CHAVE): resumo
+            for resumo in cls.objects.select_for_update().filter(data__in=dias).order_by()
+        }
+
+        # Categoria do primeiro modelo do agendamento (mesma regra das telas)
+        categoria_do_agendamento = ModeloAuditoria.objects.filter(
+            auditoria=OuterRef('auditoria_agendada')
+        ).order_by('descricao').values('categoria')[:1]
+
+        grupos = AuditoriaInstancia.objects.filter(
+            data_execucao__in=dias
+        ).annotate(
+            categoria_id=Subquery(categoria_do_agendamento)
+        ).order_by().values(
+            'data_execucao', 'local_execucao_id', 'auditoria_agendada__ferramenta_id',
+            'categoria_id', 'responsavel_id'
+        ).annotate(
+            planejadas=Count('id'),
+            executadas=Count('id', filter=Q(executada=True)),
+            respostas=Sum('resultado__total_itens'),
+            nao_conformes=Sum('resultado__nao_conformes'),
+            nao_aplicaveis=Sum('resultado__nao_aplicaveis'),
+        )
+
+        novos, alterados = [], []
+        for grupo in grupos:
+            chave = (grupo['data_execucao'], grupo['local_execucao_id'],
+                     grupo['auditoria_agendada__ferramenta_id'], grupo['categoria_id'],
+                     grupo['responsavel_id'])
+            valores = {campo: grupo[campo] or 0 for campo in cls.VALORES}
+            resumo = existentes.pop(chave, None)
+            if resumo is None:
+                novos.append(cls(**dict(zip(cls.CHAVE, chave)), **valores))
+            elif any(getattr(resumo, campo) != valor for campo, valor in valores.items()):
+                for campo, valor in valores.items():
+                    setattr(resumo, campo, valor)
+                alterados.append(resumo)
+
+        if existentes:
+            cls.objects.filter(pk__in=[resumo.pk for resumo in existentes.values()]).delete()
+        cls.objects.bulk_update(alterados, cls.VALORES, batch_size=1000)
+        cls.objects.bulk_create(novos, batch_size=1000)
+        return len(novos) + len(alterados) + len(existentes)
+
+
+# Status em que o plano ainda está no fluxo (pode ser redirecionado, ter o
+# prazo alterado, etc.)
+STATUS_PLANO_EM_ANDAMENTO = (
+    'ABERTO', 'AGUARDANDO_VALIDACAO', 'EM_IMPLEMENTACAO',
+    'AGUARDANDO_APROVACAO', 'VALIDACAO_EFICACIA',
+)
+
+# Máquina de estados dos planos: para cada ação, o status de destino a partir
+# de cada status de origem permitido (nos demais a ação é recusada). Ações que
+# não mudam o status levam cada status a ele mesmo.
+TRANSICOES_PLANO = {
+    'aceitar': {'ABERTO': 'AGUARDANDO_VALIDACAO'},
+    'aprovar_planejamento': {'AGUARDANDO_VALIDACAO': 'EM_IMPLEMENTACAO'},
+    'concluir': {'EM_IMPLEMENTACAO': 'AGUARDANDO_APROVACAO'},
+    'finalizar': {'AGUARDANDO_APROVACAO': 'CONCLUIDO'},
+    'enviar_para_eficacia': {'AGUARDANDO_APROVACAO': 'VALIDACAO_EFICACIA'},
+    'validar_eficacia': {'VALIDACAO_EFICACIA': 'CONCLUIDO'},
+    'recusar': {
+        'ABERTO': 'CANCELADO',
+        'AGUARDANDO_VALIDACAO': 'ABERTO',
+        'AGUARDANDO_APROVACAO': 'EM_IMPLEMENTACAO',
+        'VALIDACAO_EFICACIA': 'AGUARDANDO_APROVACAO',
+    },
+    'arquivar': {status: 'ARQUIVADO' for status in (
+        *STATUS_PLANO_EM_ANDAMENTO, 'CONCLUIDO', 'CANCELADO')},
+    'redirecionar': {status: status for status in STATUS_PLANO_EM_ANDAMENTO},
+    'alterar_prazo': {status: status for status in STATUS_PLANO_EM_ANDAMENTO},
+}
+
+# Campos aceitos nos dados das ações (os do modal de cada uma)
+CAMPOS_TRANSICAO_PLANO = (
+    'causa_raiz', 'acoes_propostas', 'data_finalizacao', 'fluxo_simplificado',
+    'acoes_realizadas', 'observacao_eficacia', 'motivo', 'novo_responsavel',
+    'acoes_sugeridas', 'nova_data',
+)
+
+# No fluxo simplificado o plano pula as validações do auditor
+TRANSICOES_PLANO_SIMPLIFICADO = {
+    ('aceitar', 'ABERTO'): 'EM_IMPLEMENTACAO',
+    ('concluir', 'EM_IMPLEMENTACAO'): 'CONCLUIDO',
+}
+
+# Tipo e texto do histórico de cada ação
+HISTORICO_TRANSICOES_PLANO = {
+    'aceitar': ('STATUS', "Aceitou o plano e enviou para validação."),
+    'aprovar_planejamento': ('STATUS', "Aprovou o planejamento. Plano em implementação."),
+    'concluir': ('ANEXO', "Concluiu a implementação e enviou para aprovação."),
+    'finalizar': ('STATUS', "Finalizou o plano de ação."),
+    'enviar_para_eficacia': ('STATUS', "Enviou para validação de eficácia."),
+    'validar_eficacia': ('STATUS', "Validou a eficácia e concluiu o plano."),
+    'recusar': ('STATUS', "Recusou/Devolveu a etapa. Motivo: {motivo}"),
+    'arquivar': ('STATUS', "Arquivou o plano. Motivo: {motivo}"),
+    'redirecionar': ('REDISTRIBUICAO', "Redirecionou a ação para {responsavel}."),
+    'alterar_prazo': ('PRAZO', "Alterou a data prevista para {data}."),
+}
+HISTORICO_TRANSICOES_PLANO_SIMPLIFICADO = {
+    'aceitar': ('STATUS', "Aceitou o plano em Fluxo Simplificado (sem validação)."),
+    'concluir': ('ANEXO', "Concluiu a implementação. Plano finalizado automaticamente (Fluxo Simplificado)."),
+}
+
+
+class TransicaoInvalida(Exception):
+    """Ação de plano desconhecida, sem os dados obrigatórios ou fora do status de origem."""
+
+    def __init__(self, mensagem, planos=()):
+        super().__init__(mensagem)
+        # IDs dos planos que impediram a transição
+        self.planos = sorted(planos)
+
+
+def _valores_da_transicao(acao, dados, agora):
+    """
+    Campos gravados pela ação (os mesmos em todos os planos) e os valores que
+    completam o texto do histórico.
+    """
+    valores, contexto = {}, {}
+    if acao == 'aceitar':
+        valores['descricao_causa_raiz'] = dados.get('causa_raiz')
+        valores['descricao_acao'] = dados.get('acoes_propostas')
+        valores['fluxo_simplificado'] = dados.get('fluxo_simplificado') is True
+        if dados.get('data_finalizacao'):
+            valores['data_finalizacao_prevista'] = _data_da_transicao(dados['data_finalizacao'])
+    elif acao == 'concluir':
+        if dados.get('acoes_realizadas'):
+            valores['descricao_acao_realizada'] = dados['acoes_realizadas']
+        valores['data_conclusao'] = agora
+    elif acao == 'finalizar':
+        valores['data_conclusao'] = agora
+    elif acao == 'validar_eficacia':
+        if dados.get('observacao_eficacia'):
+            valores['observacao_eficacia'] = dados['observacao_eficacia']
+        valores['data_conclusao'] = agora
+    elif acao == 'recusar':
+        if dados.get('motivo'):
+            valores['motivo_recusa'] = dados['motivo']
+        contexto['motivo'] = dados.get('motivo')
+    elif acao == 'arquivar':
+        valores['motivo_arquivamento'] = contexto['motivo'] = dados.get('motivo', '')
+    elif acao == 'redirecionar':
+        if not dados.get('novo_responsavel'):
+            raise TransicaoInvalida('Novo responsável é obrigatório')
+        responsavel = get_user_model().objects.filter(pk=dados['novo_responsavel']).first()
+        if responsavel is None:
+            raise TransicaoInvalida('Novo responsável não encontrado')
+        valores['responsavel_acao'] = responsavel
+        if dados.get('acoes_sugeridas'):
+            valores['orientacoes_extra'] = dados['acoes_sugeridas']
+            valores['origem_orientacao'] = 'REDIRECIONAMENTO'
+        contexto['responsavel'] = responsavel.get_full_name()
+    elif acao == 'alterar_prazo':
+        valores['data_finalizacao_prevista'] = _data_da_transicao(dados.get('nova_data'))
+        contexto['data'] = valores['data_finalizacao_prevista'].strftime('%d/%m/%Y')
+    return valores, contexto
+
+
+def _data_da_transicao(valor):
+    try:
+        data = parse_date(valor or '')
+    except (TypeError, ValueError):
+        data = None
+    if data is None:
+        raise TransicaoInvalida('Data inválida')
+    return data
+
+
+class PlanoDeAcaoQuerySet(models.QuerySet):
+
+    def buscar(self, texto):
+        """
+        Planos cujo texto (título, tratativa, observação ou mensagens do
+        fórum) contém os termos buscados, anotados com `relevancia`.
+        """
+        return buscar_planos(self, texto)
+
+    def transicionar(self, acao, usuario, **dados):
+        """
+        Aplica uma ação do fluxo (TRANSICOES_PLANO) a todos os planos do
+        queryset, tudo ou nada: se algum plano não estiver em um status de
+        origem da ação, levanta TransicaoInvalida com os IDs recusados e nada
+        é gravado. Os planos são gravados com um bulk_update e o histórico com
+        um bulk_create, na mesma transação. Retorna os planos alterados.
+
+        `dados` são os campos do modal da ação (CAMPOS_TRANSICAO_PLANO),
+        aplicados igualmente a todos os planos.
+        """
+        if acao not in TRANSICOES_PLANO:
+            raise TransicaoInvalida(f'Ação desconhecida: {acao}')
+        agora = timezone.now()
+        valores, contexto = _valores_da_transicao(acao, dados, agora)
+
+        with transaction.atomic():
+            planos = list(self.select_for_update().order_by('pk'))
+            recusados = [plano.pk for plano in planos
+                         if plano.status_plano not in TRANSICOES_PLANO[acao]]
+            if recusados:
+                raise TransicaoInvalida(
+                    'Ação não permitida no status atual do(s) plano(s)', recusados)
+
+            historicos = []
+            for plano in planos:
+                for campo, valor in valores.items():
+                    setattr(plano, campo, valor)
+                chave_simplificada = (acao, plano.status_plano)
+                if plano.fluxo_simplificado and chave_simplificada in TRANSICOES_PLANO_SIMPLIFICADO:
+                    plano.status_plano = TRANSICOES_PLANO_SIMPLIFICADO[chave_simplificada]
+                    tipo, texto = HISTORICO_TRANSICOES_PLANO_SIMPLIFICADO[acao]
+                else:
+                    plano.status_plano = TRANSICOES_PLANO[acao][plano.status_plano]
+                    tipo, texto = HISTORICO_TRANSICOES_PLANO[acao]
+                # bulk_update não aplica o auto_now
+                plano.data_atualizacao = agora
+                historicos.append(HistoricoPlanoAcao(
+                    plano=plano, usuario=usuario, tipo=tipo,
+                    descricao=texto.format(**contexto)))
+
+            PlanoDeAcao.objects.bulk_update(
+                planos, [*valores, 'status_plano', 'data_atualizacao'], batch_size=500)
+            HistoricoPlanoAcao.objects.bulk_create(historicos, batch_size=500)
+
+            # bulk_update e bulk_create não disparam sinais
+            alterados = PlanoDeAcao.objects.filter(pk__in=[plano.pk for plano in planos])
+            if 'responsavel_acao' in valores:
+                VisibilidadePlano.atualizar(alterados)
+            if valores.keys() & set(CAMPOS_BUSCA_PLANO):
+                BuscaPlano.atualizar(alterados)
+            transaction.on_commit(lambda: invalidar_regiao('planos_de_acao'))
+        return planos
+
+
 class PlanoDeAcao(models.Model):
     """
     Armazena uma ação corretiva ou de melhoria gerada a partir
@@ -794,7 +1685,7 @@ class PlanoDeAcao(models.Model):
         verbose_name="Categoria da Auditoria"
     )
     data_abertura = models.DateTimeField(
-        verbose_name="Data da Ocorrência")
+        db_index=True, verbose_name="Data da Ocorrência")
 
     # --- Gerenciamento do Plano ---
     responsavel_acao = models.ForeignKey(
@@ -809,6 +1700,7 @@ class PlanoDeAcao(models.Model):
         choices=STATUS_PLANO,
         # <--- Garante que nasce como 'ABERTO' (que agora exibe "Recebido")
         default='ABERTO',
+        db_index=True,
         verbose_name="Status"
     )
     prazo_conclusao = models.DateField(
@@ -871,6 +1763,13 @@ class PlanoDeAcao(models.Model):
         verbose_name="Fluxo Simplificado (Sem Aprovações)"
     )
 
+    # Também é atualizada quando o histórico, os investimentos ou as evidências
+    # do plano mudam (auditorias/signals.py): versiona o detalhe do plano
+    data_atualizacao = models.DateTimeField(
+        auto_now=True, verbose_name="Última Atualização")
+
+    objects = PlanoDeAcaoQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Plano de Ação"
         verbose_name_plural = "Planos de Ação"
@@ -952,3 +1851,140 @@ class HistoricoPlanoAcao(models.Model):
 
     def __str__(self):
         return f"{self.plano.id} - {self.descricao}"
+
+
+# Usuários que enxergam um plano, do responsável pela ação ao responsável pela
+# empresa do local. Cada caminho é um valor de PlanoDeAcao.objects.values().
+CAMINHOS_VISIBILIDADE_PLANO = (
+    'responsavel_acao',
+    'origem_resposta__auditoria_instancia__responsavel',
+    'local_execucao__usuario_responsavel',
+    'local_execucao__setor__usuario_responsavel',
+    'local_execucao__setor__area__usuario_responsavel',
+    'local_execucao__setor__area__empresa__usuario_responsavel',
+)
+
+
+class VisibilidadePlano(models.Model):
+    """
+    Índice materializado de quem pode ver cada plano de ação (um par usuário x
+    plano para cada caminho de CAMINHOS_VISIBILIDADE_PLANO). Substitui o OR de
+    seis junções nas telas de planos por um único semi-join indexado.
+
+    É mantido pelos sinais de auditorias/signals.py e por chamadas explícitas
+    a `atualizar` onde os planos são gravados em lote (bulk_create não dispara
+    sinais). O comando `reconstruir_visibilidade_planos` o refaz por completo.
+    """
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Usuário")
+    plano = models.ForeignKey(
+        PlanoDeAcao,
+        on_delete=models.CASCADE,
+        related_name='visibilidade',
+        verbose_name="Plano de Ação")
+
+    class Meta:
+        verbose_name = "Visibilidade de Plano"
+        verbose_name_plural = "Visibilidade dos Planos"
+        # O índice único (usuario, plano) atende ao semi-join das telas
+        unique_together = ('usuario', 'plano')
+
+    def __str__(self):
+        return f"Plano #{self.plano_id} visível para o usuário {self.usuario_id}"
+
+    @classmethod
+    def atualizar(cls, planos):
+        """
+        Sincroniza o índice dos planos do queryset com a situação atual (quem é
+        o responsável, o auditor e os responsáveis da estrutura do local).
+        Grava apenas a diferença. Retorna (pares incluídos, pares removidos).
+        """
+        desejados = set()
+        encontrados = False
+        for plano_id, *usuarios in planos.order_by().values_list(
+                'pk', *CAMINHOS_VISIBILIDADE_PLANO).iterator():
+            encontrados = True
+            desejados.update((usuario_id, plano_id)
+                             for usuario_id in usuarios if usuario_id)
+        if not encontrados:
+            return 0, 0
+
+        existentes = {}
+        for registro_id, usuario_id, plano_id in cls.objects.filter(
+                plano__in=planos.order_by().values('pk')
+        ).values_list('pk', 'usuario_id', 'plano_id').iterator():
+            existentes[(usuario_id, plano_id)] = registro_id
+
+        obsoletos = [registro_id for par, registro_id in existentes.items()
+                     if par not in desejados]
+        novos = [cls(usuario_id=usuario_id, plano_id=plano_id)
+                 for usuario_id, plano_id in desejados - existentes.keys()]
+        if obsoletos:
+            cls.objects.filter(pk__in=obsoletos).delete()
+        cls.objects.bulk_create(novos, batch_size=1000, ignore_conflicts=True)
+        return len(novos), len(obsoletos)
+
+
+# Campos do plano que compõem o texto pesquisável (além das mensagens do fórum)
+CAMPOS_BUSCA_PLANO = (
+    'descricao_causa_raiz', 'descricao_acao', 'descricao_acao_realizada',
+    'observacao_origem',
+)
+
+
+class BuscaPlano(models.Model):
+    """
+    Texto pesquisável de cada plano de ação (ver auditorias/busca.py): o
+    título e, em `conteudo`, os campos de CAMPOS_BUSCA_PLANO e as mensagens
+    do fórum. O índice do banco (tsvector/GIN no PostgreSQL, FTS5 no SQLite)
+    criado na migração acompanha as alterações desta tabela.
+
+    É mantido pelos sinais de auditorias/signals.py e por chamadas explícitas
+    a `atualizar` onde os planos são gravados em lote. O comando
+    `reconstruir_busca_planos` o refaz por completo.
+    """
+    plano = models.OneToOneField(
+        PlanoDeAcao,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='busca',
+        verbose_name="Plano de Ação")
+    titulo = models.TextField(blank=True, default='')
+    conteudo = models.TextField(blank=True, default='')
+
+    class Meta:
+        verbose_name = "Texto de Busca do Plano"
+        verbose_name_plural = "Textos de Busca dos Planos"
+
+    def __str__(self):
+        return f"Busca do plano #{self.plano_id}"
+
+    @classmethod
+    def atualizar(cls, planos):
+        """
+        Regrava o texto pesquisável dos planos do queryset (três consultas,
+        qualquer que seja a quantidade de planos). Retorna quantos foram gravados.
+        """
+        linhas = list(planos.order_by().values_list(
+            'pk', 'forum_id', 'titulo', *CAMPOS_BUSCA_PLANO))
+        if not linhas:
+            return 0
+
+        mensagens = defaultdict(list)
+        for forum_id, conteudo in MensagemForum.objects.filter(
+                forum_id__in={forum_id for _, forum_id, *_ in linhas if forum_id}
+        ).order_by('data_envio').values_list('forum_id', 'conteudo').iterator():
+            mensagens[forum_id].append(conteudo)
+
+        documentos = [
+            cls(plano_id=plano_id, titulo=titulo or '',
+                conteudo='\n'.join(filter(None, [*textos, *mensagens.get(forum_id, [])])))
+            for plano_id, forum_id, titulo, *textos in linhas
+        ]
+        cls.objects.bulk_create(
+            documentos, batch_size=500, update_conflicts=True,
+            unique_fields=['plano'], update_fields=['titulo', 'conteudo'])
+        return len(documentos)
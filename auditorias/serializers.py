@@ -2,14 +2,22 @@
 
 from rest_framework import serializers
 from .models import (
-    Auditoria, AuditoriaInstancia, Checklist, Topico, Pergunta,
-    OpcaoResposta, OpcaoPorcentagem, Resposta, AnexoResposta, PlanoDeAcao
+    Auditoria, AuditoriaInstancia, Checklist, ChecklistSerializado, Topico, Pergunta,
+    OpcaoResposta, OpcaoPorcentagem, Resposta, AnexoResposta, PlanoDeAcao, UploadAnexo,
+    VisibilidadePlano, BuscaPlano
 )
+from .anexos import identificar_extensao, tamanho_maximo
+from core.imagens import gerar_apos_commit
 import base64
+import json
 import uuid
+from collections import defaultdict
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.urls import reverse
 from django.utils import timezone
 
+from core.cache import invalidar_regiao
 from planos_de_acao.models import Forum
 
 # --- CAMPO Base64 CORRIGIDO E MELHORADO ---
@@ -20,6 +28,8 @@ class Base64FileField(serializers.FileField):
     """
     Um campo de serializer que lida com arquivos codificados em Base64,
     aceitando tanto o formato raw quanto o formato com prefixo "data:".
+    Mantido para as versões do app anteriores ao upload separado de anexos
+    (/api/anexos/), que não carrega as fotos na memória da submissão.
     """
 
     def to_internal_value(self, data):
@@ -32,12 +42,18 @@ class Base64FileField(serializers.FileField):
             try:
                 # Decodifica os dados e cria um ContentFile
                 decoded_file = base64.b64decode(data)
-                # Gera um nome de arquivo único. Você pode adicionar uma extensão padrão se quiser.
-                file_name = str(uuid.uuid4())[:12]
-                # Usa o ContentFile que o Django entende
-                data = ContentFile(decoded_file, name=f'{file_name}.jpg')
             except (TypeError, ValueError):
                 self.fail('invalid_file')
+            if len(decoded_file) > tamanho_maximo():
+                raise serializers.ValidationError(
+                    'Arquivo maior que o tamanho máximo permitido.')
+            # Extensão pelo conteúdo; JPEG quando o tipo não é reconhecido,
+            # como antes
+            extensao = identificar_extensao(decoded_file) or 'jpg'
+            # Gera um nome de arquivo único
+            file_name = str(uuid.uuid4())[:12]
+            # Usa o ContentFile que o Django entende
+            data = ContentFile(decoded_file, name=f'{file_name}.{extensao}')
 
         return super().to_internal_value(data)
 
@@ -136,22 +152,55 @@ class AuditoriaPaiSerializer(serializers.ModelSerializer):
 
 
 class AuditoriaInstanciaDetailSerializer(serializers.ModelSerializer):
+    """
+    Detalhe da execução. O checklist é referenciado pela versão e pelo hash do
+    JSON gravado em ChecklistSerializado (`checklist_url` devolve a estrutura
+    com cache imutável); com ?checklist=referencia a estrutura não é embutida.
+    """
+    checklist_id = serializers.IntegerField(source='checklist_usado_id', read_only=True)
+    checklist_versao = serializers.IntegerField(
+        source='checklist_usado.version', read_only=True, default=None)
+    checklist_hash = serializers.SerializerMethodField()
+    checklist_url = serializers.SerializerMethodField()
     checklist = serializers.SerializerMethodField()
 
     class Meta:
         model = AuditoriaInstancia
-        fields = ['id', 'data_execucao', 'checklist']
+        fields = ['id', 'data_execucao', 'checklist_id', 'checklist_versao',
+                  'checklist_hash', 'checklist_url', 'checklist']
+
+    def _serializado(self, obj):
+        if not obj.checklist_usado_id:
+            return None
+        if not hasattr(obj, '_checklist_serializado'):
+            obj._checklist_serializado = ChecklistSerializado.obter_para(obj.checklist_usado)
+        return obj._checklist_serializado
+
+    def get_checklist_hash(self, obj):
+        serializado = self._serializado(obj)
+        return serializado.hash_conteudo if serializado else None
+
+    def get_checklist_url(self, obj):
+        serializado = self._serializado(obj)
+        if not serializado:
+            return None
+        url = f"{reverse('api_checklist', args=[obj.checklist_usado_id])}?v={serializado.hash_conteudo}"
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
     def get_checklist(self, obj):
-        if obj.checklist_usado:
-            return ChecklistSerializer(obj.checklist_usado).data
-        return None
+        request = self.context.get('request')
+        if request and request.query_params.get('checklist') == 'referencia':
+            return None
+        serializado = self._serializado(obj)
+        return json.loads(serializado.conteudo) if serializado else None
 
 
 class AuditoriaInstanciaListSerializer(serializers.ModelSerializer):
     auditoria_info = AuditoriaPaiSerializer(
         source='auditoria_agendada', read_only=True)
-    status = serializers.CharField(source='status_execucao', read_only=True)
+    status = serializers.CharField(
+        source='get_status_execucao_display', read_only=True)
 
     local_execucao_nome = serializers.CharField(
         source='local_execucao.nome', read_only=True, default='N/A')
@@ -177,23 +226,280 @@ class AuditoriaInstanciaListSerializer(serializers.ModelSerializer):
         ]
 
 
+class AuditoriaInstanciaSyncSerializer(AuditoriaInstanciaListSerializer):
+    """
+    Execução enviada pela sincronização incremental do app: os campos da
+    lista mais o necessário para o app classificar a execução localmente
+    (pendente, quarentena ou concluída).
+    """
+    inicio_quarentena = serializers.DateField(read_only=True)
+
+    class Meta(AuditoriaInstanciaListSerializer.Meta):
+        fields = AuditoriaInstanciaListSerializer.Meta.fields + [
+            'status_execucao',
+            'inicio_quarentena',
+            'data_atualizacao',
+        ]
+
+
+class RelacaoEmLoteField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que, dentro de RespostaListSerializer, resolve o ID
+    pelos objetos já carregados para o lote inteiro (sem uma consulta por item).
+    """
+
+    def to_internal_value(self, data):
+        carregados = self.context.get('em_lote', {}).get(self.queryset.model)
+        if carregados is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            objeto = carregados.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if objeto is None:
+            self.fail('does_not_exist', pk_value=data)
+        return objeto
+
+
+def ids_inteiros(itens, campo):
+    """IDs válidos citados em `campo` nos itens recebidos (os inválidos são recusados depois)."""
+    ids = set()
+    for item in itens:
+        if isinstance(item, dict):
+            try:
+                ids.add(int(item.get(campo)))
+            except (TypeError, ValueError):
+                pass
+    return ids
+
+
+def tokens_de_anexos(itens):
+    """Tokens de upload (UUID) válidos citados em `anexos_tokens` nos itens recebidos."""
+    tokens = set()
+    for item in itens:
+        if isinstance(item, dict) and isinstance(item.get('anexos_tokens'), list):
+            for token in item['anexos_tokens']:
+                try:
+                    tokens.add(uuid.UUID(str(token)))
+                except ValueError:
+                    pass
+    return tokens
+
+
+def _tipo_de_plano(resposta):
+    """
+    Tipo do plano de ação exigido pela resposta: Não Conformidade (se o desvio
+    não foi solucionado na hora), Oportunidade de Melhoria ou None.
+    """
+    if resposta.opcao_resposta and resposta.opcao_resposta.status == 'NAO_CONFORME':
+        # Só cria o plano se o desvio NÃO foi solucionado na hora
+        if not resposta.desvio_solucionado:
+            return 'NAO_CONFORMIDADE'
+        return None
+    if resposta.oportunidade_melhoria == True:
+        return 'OPORTUNIDADE_MELHORIA'
+    return None
+
+
+class RespostaListSerializer(serializers.ListSerializer):
+    """
+    Submissão das respostas de uma execução em lote. As perguntas e opções
+    citadas são carregadas com uma consulta cada para validar todas as
+    respostas, e a gravação usa operações em massa: upsert das respostas
+    (um bulk_create com update_conflicts na unicidade instância + pergunta
+    para cada conjunto de campos enviados) e criação de anexos, fóruns e
+    planos de ação. O número de consultas não cresce com o tamanho do
+    checklist. Use dentro de uma transação.
+    """
+    CAMPOS_PLANO = ['tipo', 'titulo', 'local_execucao', 'ferramenta', 'categoria',
+                    'data_abertura', 'responsavel_acao']
+
+    @staticmethod
+    def carregar_em_lote(respostas, usuario_id):
+        """
+        Opções, perguntas e uploads de anexos (concluídos, do usuário) citados
+        nas respostas, carregados uma única vez. Passe o resultado no contexto
+        para compartilhá-lo entre várias submissões (ex.: a submissão em lote).
+        """
+        return {
+            'uploads': {
+                upload.token: upload for upload in UploadAnexo.objects.filter(
+                    usuario_id=usuario_id, token__in=tokens_de_anexos(respostas)
+                ).exclude(arquivo='')
+            },
+            'em_lote': {
+                OpcaoResposta: OpcaoResposta.objects.in_bulk(
+                    ids_inteiros(respostas, 'opcao_resposta')),
+                OpcaoPorcentagem: OpcaoPorcentagem.objects.in_bulk(
+                    ids_inteiros(respostas, 'opcao_porcentagem')),
+            },
+            'perguntas': Pergunta.objects.only('id', 'descricao').in_bulk(
+                ids_inteiros(respostas, 'pergunta_id')),
+        }
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and 'em_lote' not in self._context:
+            self._context.update(self.carregar_em_lote(
+                data, self.context['auditoria_instancia'].responsavel_id))
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        ids = {dados['pergunta_id'] for dados in attrs}
+        perguntas = self.context['perguntas']
+        inexistentes = sorted(ids - perguntas.keys())
+        if inexistentes:
+            raise serializers.ValidationError(
+                f"Pergunta(s) inexistente(s): {', '.join(map(str, inexistentes))}.")
+        return attrs
+
+    def create(self, validated_data):
+        instancia = self.context['auditoria_instancia']
+
+        # Como no update_or_create anterior, cada resposta só altera os campos
+        # enviados (respostas repetidas da mesma pergunta são aplicadas em
+        # ordem); os anexos de todas são mantidos. Os enviados por upload
+        # entram pelo nome do arquivo já gravado no storage.
+        por_pergunta, anexos, uploads_usados = {}, {}, []
+        for dados in validated_data:
+            dados = dict(dados)
+            uploads = dados.pop('anexos_tokens', [])
+            uploads_usados.extend(upload.pk for upload in uploads)
+            anexos.setdefault(dados['pergunta_id'], []).extend(
+                dados.pop('anexos_base64', []) + [upload.arquivo.name for upload in uploads])
+            por_pergunta.setdefault(dados['pergunta_id'], {}).update(dados)
+
+        # Um upsert por conjunto de campos enviados: os omitidos mantêm o
+        # valor gravado (ou o padrão, nas respostas novas)
+        grupos = defaultdict(list)
+        for dados in por_pergunta.values():
+            grupos[frozenset(dados) - {'pergunta_id'}].append(
+                Resposta(auditoria_instancia=instancia, **dados))
+        for campos, grupo in grupos.items():
+            if campos:
+                Resposta.objects.bulk_create(
+                    grupo, update_conflicts=True,
+                    unique_fields=['auditoria_instancia', 'pergunta'],
+                    update_fields=sorted(campos))
+            else:
+                Resposta.objects.bulk_create(grupo, ignore_conflicts=True)
+
+        # Relidas como ficaram no banco: os planos dependem também dos campos
+        # não enviados, e nem todo banco devolve o ID das linhas atualizadas
+        respostas = list(Resposta.objects.filter(
+            auditoria_instancia=instancia, pergunta_id__in=por_pergunta
+        ).select_related('opcao_resposta'))
+
+        criados = AnexoResposta.objects.bulk_create([
+            AnexoResposta(resposta=resposta, arquivo=arquivo)
+            for resposta in respostas
+            for arquivo in anexos[resposta.pergunta_id]
+        ])
+        # Os enviados por upload já têm variantes; as das fotos em base64 são
+        # geradas após o commit (bulk_create não dispara o post_save)
+        gerar_apos_commit(anexo.arquivo for anexo in criados)
+        if uploads_usados:
+            # O arquivo passa a pertencer ao AnexoResposta
+            UploadAnexo.objects.filter(pk__in=uploads_usados).delete()
+
+        self.sincronizar_planos_de_acao(instancia, respostas)
+        return respostas
+
+    def sincronizar_planos_de_acao(self, instancia, respostas):
+        """
+        Versão em lote de RespostaSerializer.criar_plano_de_acao_se_necessario:
+        cria ou atualiza os planos das respostas que exigem um e exclui os das
+        que deixaram de exigir.
+        """
+        tipos = {resposta.pk: _tipo_de_plano(resposta) for resposta in respostas}
+        existentes = {plano.origem_resposta_id: plano for plano in PlanoDeAcao.objects.filter(
+            origem_resposta__in=list(tipos))}
+
+        obsoletos = [pk for pk, tipo in tipos.items() if not tipo and pk in existentes]
+        if obsoletos:
+            PlanoDeAcao.objects.filter(origem_resposta__in=obsoletos).delete()
+
+        com_plano = [resposta for resposta in respostas if tipos[resposta.pk]]
+        if not com_plano:
+            return
+
+        agendamento = instancia.auditoria_agendada
+        perguntas = self.context['perguntas']
+        # Categoria do primeiro modelo (pode ajustar se houver múltiplos)
+        primeiro_modelo = agendamento.modelos.first()
+        categoria_id = primeiro_modelo.categoria_id if primeiro_modelo else None
+        # Responsável pela ação com base no local de execução
+        responsavel_id = (instancia.local_execucao.usuario_responsavel_id
+                          if instancia.local_execucao else None)
+
+        novos_foruns = {
+            resposta.pk: Forum(
+                nome=f"Discussão Plano #{perguntas[resposta.pergunta_id].descricao[:50]}...")
+            for resposta in com_plano if resposta.pk not in existentes
+        }
+        Forum.objects.bulk_create(novos_foruns.values())
+
+        novos, alterados = [], []
+        for resposta in com_plano:
+            valores = {
+                'tipo': tipos[resposta.pk],
+                'titulo': perguntas[resposta.pergunta_id].descricao,
+                'local_execucao': instancia.local_execucao,
+                'ferramenta_id': agendamento.ferramenta_id,
+                'categoria_id': categoria_id,
+                'data_abertura': resposta.data_resposta or timezone.now(),
+                'responsavel_acao_id': responsavel_id,
+            }
+            plano = existentes.get(resposta.pk)
+            if plano is None:
+                novos.append(PlanoDeAcao(
+                    origem_resposta=resposta, forum=novos_foruns[resposta.pk], **valores))
+            else:
+                for campo, valor in valores.items():
+                    setattr(plano, campo, valor)
+                alterados.append(plano)
+
+        PlanoDeAcao.objects.bulk_create(novos)
+        if alterados:
+            PlanoDeAcao.objects.bulk_update(alterados, self.CAMPOS_PLANO)
+        # Operações em massa não disparam os sinais do cache dos dashboards
+        # nem os dos índices de visibilidade e de busca dos planos
+        transaction.on_commit(lambda: invalidar_regiao('planos_de_acao'))
+        planos = PlanoDeAcao.objects.filter(origem_resposta__auditoria_instancia=instancia)
+        VisibilidadePlano.atualizar(planos)
+        BuscaPlano.atualizar(planos)
+
+
 class RespostaSerializer(serializers.ModelSerializer):
     pergunta_id = serializers.IntegerField(write_only=True)
+    opcao_resposta = RelacaoEmLoteField(
+        queryset=OpcaoResposta.objects.all(), required=False, allow_null=True)
+    opcao_porcentagem = RelacaoEmLoteField(
+        queryset=OpcaoPorcentagem.objects.all(), required=False, allow_null=True)
     # --- ATUALIZADO: Usando o novo campo Base64FileField ---
     anexos_base64 = serializers.ListField(
         child=Base64FileField(),  # <<<--- MUDANÇA AQUI
         required=False,
         write_only=True
     )
+    # Tokens devolvidos por /api/anexos/ (upload separado da submissão)
+    anexos_tokens = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        write_only=True
+    )
 
     class Meta:
         model = Resposta
+        list_serializer_class = RespostaListSerializer
         fields = [
             'pergunta_id',
             'opcao_resposta',
             'opcao_porcentagem',
             'resposta_livre_texto',
             'anexos_base64',
+            'anexos_tokens',
             'oportunidade_melhoria',
             'desvio_solucionado',
             'grau_nc',
@@ -205,8 +511,22 @@ class RespostaSerializer(serializers.ModelSerializer):
             # --- FIM DOS CAMPOS ADICIONADOS ---
         ]
 
+    def validate_anexos_tokens(self, tokens):
+        """Troca cada token pelo UploadAnexo concluído do auditor."""
+        uploads = self.context.get('uploads')
+        if uploads is None:
+            uploads = {upload.token: upload for upload in UploadAnexo.objects.filter(
+                usuario_id=self.context['auditoria_instancia'].responsavel_id,
+                token__in=tokens).exclude(arquivo='')}
+        invalidos = [str(token) for token in tokens if token not in uploads]
+        if invalidos:
+            raise serializers.ValidationError(
+                f"Anexo(s) não encontrado(s) ou com upload incompleto: {', '.join(invalidos)}.")
+        return [uploads[token] for token in tokens]
+
     def create(self, validated_data):
         anexos_data = validated_data.pop('anexos_base64', [])
+        uploads = validated_data.pop('anexos_tokens', [])
         instancia = self.context['auditoria_instancia']
 
         resposta, created = Resposta.objects.update_or_create(
@@ -217,6 +537,9 @@ class RespostaSerializer(serializers.ModelSerializer):
 
         for anexo_file in anexos_data:
             AnexoResposta.objects.create(resposta=resposta, arquivo=anexo_file)
+        for upload in uploads:
+            AnexoResposta.objects.create(resposta=resposta, arquivo=upload.arquivo.name)
+            upload.delete()
 
         # --- LÓGICA PARA CRIAR O PLANO DE AÇÃO ---
         self.criar_plano_de_acao_se_necessario(resposta)
@@ -232,19 +555,8 @@ class RespostaSerializer(serializers.ModelSerializer):
         instancia = resposta.auditoria_instancia
         agendamento = instancia.auditoria_agendada
 
-        tipo_plano = None
-
-        # 1. Verifica se é Não Conformidade
-        if resposta.opcao_resposta and resposta.opcao_resposta.status == 'NAO_CONFORME':
-            # --- CORREÇÃO AQUI ---
-            # Só cria o plano se o desvio NÃO foi solucionado na hora
-            if not resposta.desvio_solucionado:
-                tipo_plano = 'NAO_CONFORMIDADE'
-            # ---------------------
-
-        # 2. Verifica se é Oportunidade de Melhoria
-        elif resposta.oportunidade_melhoria == True:
-            tipo_plano = 'OPORTUNIDADE_MELHORIA'
+        # 1. Não Conformidade ou 2. Oportunidade de Melhoria
+        tipo_plano = _tipo_de_plano(resposta)
 
         if tipo_plano:
             # Pega a categoria do primeiro modelo (pode ajustar se houver múltiplos)
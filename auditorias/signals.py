@@ -0,0 +1,171 @@
+# auditorias/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.cache import invalidar_ao_alterar
+from core.imagens import otimizar_ao_salvar
+from organizacao.models import Area, Empresa, Setor, SubSetor
+from planos_de_acao.models import MensagemForum
+
+from .models import (
+    CAMPOS_BUSCA_PLANO, AnexoResposta, Auditoria, AuditoriaInstancia, BuscaPlano, Checklist,
+    ChecklistSerializado, EvidenciaPlano, HistoricoPlanoAcao, Investimento, OpcaoPorcentagem,
+    OpcaoResposta, PlanoDeAcao, Pergunta, Resposta, Topico, VisibilidadePlano,
+    atualizar_contagens_checklists, estrutura_em_lote_ativa,
+)
+
+# Regiões de cache dos dashboards invalidadas pelas alterações destes modelos
+invalidar_ao_alterar('auditorias', Auditoria, AuditoriaInstancia, Resposta)
+invalidar_ao_alterar('planos_de_acao', PlanoDeAcao)
+
+# Miniatura e versão média das fotos (os anexos gravados em lote pela submissão
+# são tratados em RespostaListSerializer.create)
+otimizar_ao_salvar(AnexoResposta, 'arquivo')
+otimizar_ao_salvar(EvidenciaPlano, 'arquivo')
+
+
+@receiver([post_save, post_delete], sender=Topico)
+def atualizar_contagens_por_topico(sender, instance, **kwargs):
+    """
+    Mantém as contagens desnormalizadas do checklist após mudanças avulsas
+    nos tópicos (gravações em lote recalculam ao final de estrutura_em_lote).
+    """
+    if estrutura_em_lote_ativa():
+        return
+    atualizar_contagens_checklists(
+        Checklist.objects.filter(pk=instance.checklist_id))
+
+
+@receiver([post_save, post_delete], sender=Pergunta)
+def atualizar_contagens_por_pergunta(sender, instance, **kwargs):
+    """Mantém as contagens desnormalizadas do checklist após mudanças nas perguntas."""
+    if estrutura_em_lote_ativa():
+        return
+    atualizar_contagens_checklists(
+        Checklist.objects.filter(topicos__id=instance.topico_id))
+
+
+@receiver(post_save, sender=Checklist)
+def descartar_serializado_do_checklist(sender, instance, **kwargs):
+    """O JSON gravado inclui o nome do checklist: é gerado de novo quando pedido."""
+    ChecklistSerializado.objects.filter(checklist_id=instance.pk).delete()
+
+
+@receiver([post_save, post_delete], sender=Topico)
+def descartar_serializado_por_topico(sender, instance, **kwargs):
+    """Alterações pontuais na estrutura de uma versão descartam seu JSON gravado."""
+    if estrutura_em_lote_ativa():
+        return
+    ChecklistSerializado.objects.filter(checklist_id=instance.checklist_id).delete()
+
+
+@receiver([post_save, post_delete], sender=Pergunta)
+def descartar_serializado_por_pergunta(sender, instance, **kwargs):
+    if estrutura_em_lote_ativa():
+        return
+    ChecklistSerializado.objects.filter(
+        checklist__topicos__id=instance.topico_id).delete()
+
+
+@receiver([post_save, post_delete], sender=OpcaoResposta)
+@receiver([post_save, post_delete], sender=OpcaoPorcentagem)
+def descartar_serializado_por_opcao(sender, instance, **kwargs):
+    if estrutura_em_lote_ativa():
+        return
+    ChecklistSerializado.objects.filter(
+        checklist__topicos__perguntas__id=instance.pergunta_id).delete()
+
+
+# Campos que mudam quem enxerga os planos e o caminho dos planos afetados por
+# cada modelo (índice VisibilidadePlano)
+CAMPOS_VISIBILIDADE_PLANOS = {
+    PlanoDeAcao: (('responsavel_acao', 'local_execucao', 'origem_resposta'), 'pk'),
+    AuditoriaInstancia: (('responsavel',), 'origem_resposta__auditoria_instancia'),
+    SubSetor: (('usuario_responsavel', 'setor'), 'local_execucao'),
+    Setor: (('usuario_responsavel', 'area'), 'local_execucao__setor'),
+    Area: (('usuario_responsavel', 'empresa'), 'local_execucao__setor__area'),
+    Empresa: (('usuario_responsavel',), 'local_execucao__setor__area__empresa'),
+}
+
+
+def _altera_visibilidade(sender, update_fields):
+    """Se o save pode mudar algum dos campos que definem a visibilidade."""
+    if update_fields is None:
+        return True
+    campos, _ = CAMPOS_VISIBILIDADE_PLANOS[sender]
+    return any(campo in update_fields or f'{campo}_id' in update_fields
+               for campo in campos)
+
+
+def _valores_de_visibilidade(sender, instance):
+    campos, _ = CAMPOS_VISIBILIDADE_PLANOS[sender]
+    return tuple(getattr(instance, f'{campo}_id') for campo in campos)
+
+
+def guardar_visibilidade_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Lê os valores gravados antes do save para comparar no post_save."""
+    instance._visibilidade_anterior = None
+    if raw or instance._state.adding or not _altera_visibilidade(sender, update_fields):
+        return
+    campos, _ = CAMPOS_VISIBILIDADE_PLANOS[sender]
+    instance._visibilidade_anterior = sender._base_manager.filter(
+        pk=instance.pk).values_list(*(f'{campo}_id' for campo in campos)).first()
+
+
+def atualizar_visibilidade_planos(sender, instance, created, raw=False,
+                                  update_fields=None, **kwargs):
+    """
+    Atualiza o índice de visibilidade quando um plano é criado ou redirecionado
+    e quando muda o responsável (ou o pai) de uma execução ou de um nível da
+    estrutura organizacional.
+    """
+    if raw:
+        return
+    if created:
+        # Execuções e níveis recém-criados ainda não têm planos
+        alterado = sender is PlanoDeAcao
+    else:
+        anterior = getattr(instance, '_visibilidade_anterior', None)
+        alterado = (anterior is not None
+                    and anterior != _valores_de_visibilidade(sender, instance))
+    if alterado:
+        _, caminho = CAMPOS_VISIBILIDADE_PLANOS[sender]
+        VisibilidadePlano.atualizar(PlanoDeAcao.objects.filter(**{caminho: instance.pk}))
+
+
+for _modelo in CAMPOS_VISIBILIDADE_PLANOS:
+    pre_save.connect(guardar_visibilidade_anterior, sender=_modelo,
+                     dispatch_uid=f'visibilidade_planos:pre:{_modelo._meta.label}')
+    post_save.connect(atualizar_visibilidade_planos, sender=_modelo,
+                      dispatch_uid=f'visibilidade_planos:post:{_modelo._meta.label}')
+
+
+@receiver([post_save, post_delete], sender=HistoricoPlanoAcao)
+@receiver([post_save, post_delete], sender=Investimento)
+@receiver([post_save, post_delete], sender=EvidenciaPlano)
+def atualizar_versao_do_plano(sender, instance, raw=False, **kwargs):
+    """O detalhe do plano inclui esses registros: sua alteração muda o ETag do plano."""
+    if raw:
+        return
+    PlanoDeAcao.objects.filter(pk=instance.plano_id).update(
+        data_atualizacao=timezone.now())
+
+
+@receiver(post_save, sender=PlanoDeAcao)
+def atualizar_busca_do_plano(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Regrava o texto pesquisável do plano quando o título ou a tratativa podem ter mudado."""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & {'titulo', *CAMPOS_BUSCA_PLANO}:
+        return
+    BuscaPlano.atualizar(PlanoDeAcao.objects.filter(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=MensagemForum)
+def atualizar_busca_por_mensagem(sender, instance, raw=False, **kwargs):
+    """As mensagens do fórum também entram no texto pesquisável do plano."""
+    if raw:
+        return
+    BuscaPlano.atualizar(PlanoDeAcao.objects.filter(forum_id=instance.forum_id))
@@ -2,6 +2,8 @@
 
 from django import template
 
+from core.imagens import url_da_variante
+
 register = template.Library()
 
 
@@ -14,6 +16,16 @@ def get_item(dictionary, key):
     return dictionary.get(key)
 
 
+@register.filter
+def variante(arquivo, nome):
+    """
+    URL de uma variante redimensionada da imagem ('miniatura' ou 'media'),
+    ou do original quando não há variante.
+    Ex: <img src="{{ anexo.arquivo|variante:'miniatura' }}">
+    """
+    return url_da_variante(arquivo, nome)
+
+
 @register.filter
 def rem_page_param(query_dict):
     """
@@ -1,3 +1,1393 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import shutil
+import tempfile
+from calendar import monthrange
+from collections import Counter
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from cadastros_base.models import Turno, TurnoDetalheDia
+from organizacao.models import Area, Empresa, Setor, SubSetor
+from planos_de_acao.models import Forum, MensagemForum
+
+from .agendamento import (
+    TODOS_OS_DIAS, _somar_meses, calcular_datas, expandir_ocorrencias, mascara_dias_semana,
+)
+from .anexos import SUFIXO_RECEBENDO, caminho_parcial, diretorio_parcial
+from .models import (
+    STATUS_PLANO_EM_ANDAMENTO, TRANSICOES_PLANO, TRANSICOES_PLANO_SIMPLIFICADO, AnexoResposta,
+    Auditoria, AuditoriaInstancia, CategoriaAuditoria, ChaveIdempotencia, Checklist,
+    FerramentaDigital, HistoricoPlanoAcao, ModeloAuditoria, OpcaoResposta, Pergunta, Pilar,
+    PlanoDeAcao, RemocaoInstancia, Resposta, ResumoDiarioAuditoria, Topico, UploadAnexo,
+)
+from .serializers import RespostaSerializer
+from .views import (
+    LEGENDA_STATUS_CALENDARIO, STATUS_PLANOS_PENDENTES, SUFIXO_CURSOR_CONTINUACAO,
+    _codificar_cursor_sync, _gerar_instancias_para_auditoria, _indicadores_planos,
+    _ocorrencias_virtuais, _reconciliar_instancias_da_auditoria,
+)
+
+Usuario = get_user_model()
+
+
+def _config(**valores):
+    """AUDITORIAS_CONFIG com alguns valores trocados, para override_settings."""
+    return {**settings.AUDITORIAS_CONFIG, **valores}
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BaseAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='auditor', password='senha', first_name='Auditor')
+        self.client.force_authenticate(self.usuario)
+
+        self.checklist = Checklist.objects.create(nome='Checklist de Teste')
+        topico = Topico.objects.create(checklist=self.checklist, descricao='Tópico')
+        self.pergunta = Pergunta.objects.create(topico=topico, descricao='Pergunta')
+        self.conforme = OpcaoResposta.objects.create(
+            pergunta=self.pergunta, descricao='OK', status='CONFORME')
+
+        hoje = timezone.now().date()
+        self.auditoria = Auditoria.objects.create(
+            nivel_organizacional='SETOR', categoria_auditoria='WEB',
+            data_inicio=hoje, data_fim=hoje + timedelta(days=30),
+            por_frequencia=True, frequencia='DIARIO', responsavel=self.usuario)
+
+    def criar_instancia(self, dias=0, **campos):
+        return AuditoriaInstancia.objects.create(
+            auditoria_agendada=self.auditoria,
+            data_execucao=timezone.now().date() + timedelta(days=dias),
+            checklist_usado=self.checklist, responsavel=self.usuario, **campos)
+
+
+class IdempotenciaSubmissaoTests(BaseAPITestCase):
+    """Cabeçalho Idempotency-Key em POST /api/instancias/<pk>/submeter/."""
+
+    def setUp(self):
+        super().setUp()
+        self.instancia = self.criar_instancia()
+
+    def url(self, instancia=None):
+        return reverse('api_instancia_submeter', args=[(instancia or self.instancia).pk])
+
+    def submeter(self, chave, instancia=None):
+        corpo = {'respostas': [
+            {'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.conforme.pk}]}
+        return self.client.post(self.url(instancia), corpo, format='json',
+                                HTTP_IDEMPOTENCY_KEY=chave)
+
+    def test_repeticao_devolve_o_resultado_gravado(self):
+        primeira = self.submeter('chave-1')
+        segunda = self.submeter('chave-1')
+
+        self.assertEqual(primeira.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', primeira)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(self.instancia.respostas.count(), 1)
+
+    def test_sem_chave_a_repeticao_e_processada(self):
+        resposta = self.client.post(self.url(), {'respostas': []}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        resposta = self.client.post(self.url(), {'respostas': []}, format='json')
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_chave_em_processamento_responde_409(self):
+        agora = timezone.now()
+        ChaveIdempotencia.objects.create(
+            usuario=self.usuario, chave='chave-1', rota=self.url(),
+            data_criacao=agora, expira_em=agora + timedelta(hours=1))
+
+        resposta = self.submeter('chave-1')
+
+        self.assertEqual(resposta.status_code, 409)
+        self.instancia.refresh_from_db()
+        self.assertFalse(self.instancia.executada)
+
+    def test_chave_usada_em_outra_rota_responde_422(self):
+        outra = self.criar_instancia(dias=1)
+        self.assertEqual(self.submeter('chave-1').status_code, 200)
+
+        resposta = self.submeter('chave-1', instancia=outra)
+
+        self.assertEqual(resposta.status_code, 422)
+        outra.refresh_from_db()
+        self.assertFalse(outra.executada)
+
+    def test_erro_5xx_nao_e_gravado(self):
+        with mock.patch('auditorias.views._submeter_instancia',
+                        return_value=(503, {'detail': 'Indisponível'})):
+            self.assertEqual(self.submeter('chave-1').status_code, 503)
+        self.assertFalse(ChaveIdempotencia.objects.filter(chave='chave-1').exists())
+
+        resposta = self.submeter('chave-1')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', resposta)
+
+    def test_excecao_libera_a_chave(self):
+        with mock.patch('auditorias.views._submeter_instancia', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.submeter('chave-1')
+        self.assertFalse(ChaveIdempotencia.objects.filter(chave='chave-1').exists())
+        self.assertEqual(self.submeter('chave-1').status_code, 200)
+
+    def test_reserva_interrompida_e_assumida(self):
+        minutos = settings.AUDITORIAS_CONFIG.get('IDEMPOTENCIA_PROCESSAMENTO_MINUTOS', 10)
+        criada_em = timezone.now() - timedelta(minutes=minutos + 1)
+        ChaveIdempotencia.objects.create(
+            usuario=self.usuario, chave='chave-1', rota=self.url(),
+            data_criacao=criada_em, expira_em=criada_em + timedelta(hours=1))
+
+        resposta = self.submeter('chave-1')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', resposta)
+        registro = ChaveIdempotencia.objects.get(usuario=self.usuario, chave='chave-1')
+        self.assertEqual(registro.status_resposta, 200)
+
+    def test_chave_invalida_responde_400(self):
+        self.assertEqual(self.submeter('x' * 256).status_code, 400)
+
+
+class TransicaoPlanosEmLoteTests(BaseAPITestCase):
+    """Máquina de estados dos planos por /planos-de-acao/api/transicao-em-lote/."""
+
+    # Dados obrigatórios de cada ação (redirecionar recebe o próprio usuário)
+    DADOS = {
+        'alterar_prazo': {'nova_data': '2030-12-31'},
+        'recusar': {'motivo': 'Teste'},
+        'arquivar': {'motivo': 'Teste'},
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.usuario.is_superuser = True
+        self.usuario.save()
+        self.client.force_login(self.usuario)
+        self.url = reverse('auditorias:api_transicionar_planos_em_lote')
+
+    def criar_plano(self, status_plano, **campos):
+        return PlanoDeAcao.objects.create(
+            tipo='NAO_CONFORMIDADE', titulo='Plano', data_abertura=timezone.now(),
+            status_plano=status_plano, **campos)
+
+    def transicionar(self, acao, planos, **dados):
+        corpo = {'acao': acao, 'planos': [plano.pk for plano in planos],
+                 **self.DADOS.get(acao, {}), **dados}
+        if acao == 'redirecionar':
+            corpo['novo_responsavel'] = self.usuario.pk
+        return self.client.post(self.url, corpo, format='json')
+
+    def test_tabela_de_estados(self):
+        for acao, destinos in TRANSICOES_PLANO.items():
+            for status_plano, _ in PlanoDeAcao.STATUS_PLANO:
+                with self.subTest(acao=acao, status=status_plano):
+                    plano = self.criar_plano(status_plano)
+                    resposta = self.transicionar(acao, [plano])
+                    plano.refresh_from_db()
+                    if status_plano in destinos:
+                        self.assertEqual(resposta.status_code, 200)
+                        self.assertEqual(plano.status_plano, destinos[status_plano])
+                        self.assertTrue(HistoricoPlanoAcao.objects.filter(plano=plano).exists())
+                    else:
+                        self.assertEqual(resposta.status_code, 400)
+                        self.assertEqual(resposta.json()['planos'], [plano.pk])
+                        self.assertEqual(plano.status_plano, status_plano)
+
+    def test_fluxo_simplificado(self):
+        for (acao, status_plano), destino in TRANSICOES_PLANO_SIMPLIFICADO.items():
+            with self.subTest(acao=acao):
+                plano = self.criar_plano(status_plano, fluxo_simplificado=True)
+                dados = {'fluxo_simplificado': True} if acao == 'aceitar' else {}
+                self.assertEqual(self.transicionar(acao, [plano], **dados).status_code, 200)
+                plano.refresh_from_db()
+                self.assertEqual(plano.status_plano, destino)
+
+    def test_tudo_ou_nada(self):
+        em_andamento = self.criar_plano('EM_IMPLEMENTACAO')
+        concluido = self.criar_plano('CONCLUIDO')
+
+        resposta = self.transicionar('concluir', [em_andamento, concluido])
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json()['planos'], [concluido.pk])
+        em_andamento.refresh_from_db()
+        self.assertEqual(em_andamento.status_plano, 'EM_IMPLEMENTACAO')
+        self.assertFalse(HistoricoPlanoAcao.objects.exists())
+
+    def test_plano_inexistente_responde_404(self):
+        plano = self.criar_plano('ABERTO')
+        resposta = self.client.post(
+            self.url, {'acao': 'arquivar', 'planos': [plano.pk, plano.pk + 1000]},
+            format='json')
+
+        self.assertEqual(resposta.status_code, 404)
+        plano.refresh_from_db()
+        self.assertEqual(plano.status_plano, 'ABERTO')
+
+    def test_campos_fora_das_acoes_sao_ignorados(self):
+        plano = self.criar_plano('ABERTO')
+        resposta = self.transicionar('arquivar', [plano], usuario=999, status_plano='CONCLUIDO')
+
+        self.assertEqual(resposta.status_code, 200)
+        plano.refresh_from_db()
+        self.assertEqual(plano.status_plano, 'ARQUIVADO')
+
+    def test_dados_obrigatorios(self):
+        plano = self.criar_plano(STATUS_PLANO_EM_ANDAMENTO[0])
+        for acao, dados in [('redirecionar', {}), ('alterar_prazo', {'nova_data': 'x'})]:
+            with self.subTest(acao=acao):
+                resposta = self.client.post(
+                    self.url, {'acao': acao, 'planos': [plano.pk], **dados}, format='json')
+                self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(self.client.post(
+            self.url, {'acao': 'desconhecida', 'planos': [plano.pk]},
+            format='json').status_code, 400)
+
+
+class SincronizacaoTests(BaseAPITestCase):
+    """Cursor de GET /api/sync/."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('api_sync')
+
+    def sincronizar(self, cursor=None):
+        resposta = self.client.get(self.url, {'since': cursor} if cursor else {})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def ids(self, dados):
+        return {instancia['id'] for instancia in dados['alteradas']}
+
+    def test_primeira_rodada_envia_todas(self):
+        instancias = [self.criar_instancia(dias=dia) for dia in range(3)]
+
+        dados = self.sincronizar()
+
+        self.assertEqual(self.ids(dados), {instancia.pk for instancia in instancias})
+        self.assertFalse(dados['tem_mais'])
+        self.assertEqual(self.sincronizar(dados['cursor'])['removidas'], [])
+
+    def test_janela_relida_alcanca_commit_atrasado(self):
+        dados = self.sincronizar()
+        cursor = dados['cursor']
+        janela = settings.AUDITORIAS_CONFIG.get('SYNC_JANELA_SEGUNDOS', 120)
+        # Gravadas antes do cursor, mas confirmadas depois da leitura
+        atrasada = self.criar_instancia()
+        antiga = self.criar_instancia(dias=1)
+        AuditoriaInstancia.objects.filter(pk=atrasada.pk).update(
+            data_atualizacao=timezone.now() - timedelta(seconds=janela // 2))
+        AuditoriaInstancia.objects.filter(pk=antiga.pk).update(
+            data_atualizacao=timezone.now() - timedelta(seconds=janela * 3))
+
+        dados = self.sincronizar(cursor)
+
+        self.assertEqual(self.ids(dados), {atrasada.pk})
+
+    def test_cursor_da_rodada_nao_reenvia_eventos_antigos(self):
+        janela = settings.AUDITORIAS_CONFIG.get('SYNC_JANELA_SEGUNDOS', 120)
+        instancia = self.criar_instancia()
+        AuditoriaInstancia.objects.filter(pk=instancia.pk).update(
+            data_atualizacao=timezone.now() - timedelta(seconds=janela * 3))
+
+        dados = self.sincronizar()
+        self.assertEqual(self.ids(dados), {instancia.pk})
+
+        self.assertEqual(self.sincronizar(dados['cursor'])['alteradas'], [])
+
+    @override_settings(AUDITORIAS_CONFIG=_config(SYNC_TAMANHO_PAGINA=2))
+    def test_paginas_de_continuacao(self):
+        agora = timezone.now()
+        instancias = [self.criar_instancia(dias=dia) for dia in range(5)]
+        for posicao, instancia in enumerate(instancias):
+            AuditoriaInstancia.objects.filter(pk=instancia.pk).update(
+                data_atualizacao=agora - timedelta(hours=1, seconds=10 - posicao))
+
+        recebidas, cursor, paginas = [], None, 0
+        while True:
+            dados = self.sincronizar(cursor)
+            paginas += 1
+            recebidas.extend(self.ids(dados))
+            cursor = dados['cursor']
+            self.assertEqual(cursor.endswith(SUFIXO_CURSOR_CONTINUACAO), dados['tem_mais'])
+            if not dados['tem_mais']:
+                break
+
+        self.assertEqual(paginas, 3)
+        self.assertCountEqual(recebidas, [instancia.pk for instancia in instancias])
+
+    def test_remocao_e_enviada(self):
+        instancia = self.criar_instancia()
+        cursor = self.sincronizar()['cursor']
+
+        AuditoriaInstancia.objects.filter(pk=instancia.pk).excluir()
+        dados = self.sincronizar(cursor)
+
+        self.assertEqual(dados['removidas'], [instancia.pk])
+        self.assertEqual(dados['alteradas'], [])
+        self.assertTrue(RemocaoInstancia.objects.filter(id_instancia=instancia.pk).exists())
+
+    def test_cursor_invalido_responde_400(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'abc'}).status_code, 400)
+
+    def test_cursor_no_futuro_nao_envia_nada(self):
+        self.criar_instancia()
+        cursor = _codificar_cursor_sync(timezone.now() + timedelta(days=1))
+        self.assertEqual(self.sincronizar(cursor)['alteradas'], [])
+
+
+class SubmissaoRespostasTests(BaseAPITestCase):
+    """Gravação em lote das respostas (RespostaListSerializer)."""
+
+    # Cabeçalho PNG: basta para a identificação do tipo pelo conteúdo
+    PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 16
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.instancia = self.criar_instancia()
+        self.nao_conforme = OpcaoResposta.objects.create(
+            pergunta=self.pergunta, descricao='NOK', status='NAO_CONFORME')
+
+    def gravar(self, *respostas):
+        """Grava as respostas como na submissão, sem marcar a execução."""
+        serializer = RespostaSerializer(
+            data=list(respostas), many=True, context={'auditoria_instancia': self.instancia})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+    def submeter(self, respostas, instancia=None):
+        instancia = instancia or self.instancia
+        return self.client.post(reverse('api_instancia_submeter', args=[instancia.pk]),
+                                {'respostas': respostas}, format='json')
+
+    def test_reenvio_altera_so_os_campos_enviados(self):
+        self.gravar({'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.conforme.pk,
+                     'resposta_livre_texto': 'Observação', 'grau_nc': 'NC MENOR'})
+        self.gravar({'pergunta_id': self.pergunta.pk, 'grau_nc': 'NC MAIOR'})
+
+        resposta = Resposta.objects.get(auditoria_instancia=self.instancia)
+        self.assertEqual(resposta.opcao_resposta, self.conforme)
+        self.assertEqual(resposta.resposta_livre_texto, 'Observação')
+        self.assertEqual(resposta.grau_nc, 'NC MAIOR')
+
+    def test_respostas_com_campos_diferentes_no_mesmo_envio(self):
+        outra = Pergunta.objects.create(topico=self.pergunta.topico, descricao='Outra')
+        self.gravar({'pergunta_id': self.pergunta.pk, 'resposta_livre_texto': 'Antes'},
+                    {'pergunta_id': outra.pk, 'resposta_livre_texto': 'Antes'})
+        self.gravar({'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.conforme.pk},
+                    {'pergunta_id': outra.pk, 'resposta_livre_texto': 'Depois'})
+
+        textos = dict(Resposta.objects.values_list('pergunta_id', 'resposta_livre_texto'))
+        self.assertEqual(textos, {self.pergunta.pk: 'Antes', outra.pk: 'Depois'})
+
+    def test_plano_considera_os_campos_ja_gravados(self):
+        self.gravar({'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.nao_conforme.pk})
+        plano = PlanoDeAcao.objects.get()
+        self.assertEqual(plano.tipo, 'NAO_CONFORMIDADE')
+
+        # Sem a opção no reenvio, vale a gravada: o plano continua
+        self.gravar({'pergunta_id': self.pergunta.pk, 'resposta_livre_texto': 'Detalhe'})
+        self.assertEqual(PlanoDeAcao.objects.get(), plano)
+
+        self.gravar({'pergunta_id': self.pergunta.pk, 'desvio_solucionado': True})
+        self.assertFalse(PlanoDeAcao.objects.exists())
+
+    def test_planos_e_foruns_criados_pela_submissao(self):
+        outra = Pergunta.objects.create(topico=self.pergunta.topico, descricao='Melhoria')
+        resposta = self.submeter([
+            {'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.nao_conforme.pk},
+            {'pergunta_id': outra.pk, 'oportunidade_melhoria': True},
+        ])
+
+        self.assertEqual(resposta.status_code, 200)
+        planos = {plano.titulo: plano for plano in PlanoDeAcao.objects.select_related('forum')}
+        self.assertEqual(planos['Pergunta'].tipo, 'NAO_CONFORMIDADE')
+        self.assertEqual(planos['Melhoria'].tipo, 'OPORTUNIDADE_MELHORIA')
+        self.assertEqual(planos['Pergunta'].forum.nome, 'Discussão Plano #Pergunta...')
+        self.assertEqual(Forum.objects.count(), 2)
+
+    def test_anexos_em_base64_e_por_token(self):
+        upload = UploadAnexo.objects.create(
+            usuario=self.usuario, tamanho_total=len(self.PNG), tamanho_recebido=len(self.PNG),
+            arquivo=ContentFile(self.PNG, name='enviado.png'))
+        resposta = self.submeter([{
+            'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.conforme.pk,
+            'anexos_base64': [base64.b64encode(self.PNG).decode()],
+            'anexos_tokens': [str(upload.token)],
+        }])
+
+        self.assertEqual(resposta.status_code, 200)
+        arquivos = AnexoResposta.objects.filter(
+            resposta__auditoria_instancia=self.instancia).values_list('arquivo', flat=True)
+        self.assertEqual(len(arquivos), 2)
+        self.assertIn(upload.arquivo.name, arquivos)
+        self.assertTrue(all(arquivo.endswith('.png') for arquivo in arquivos))
+        # O arquivo do upload passa a pertencer ao anexo
+        self.assertFalse(UploadAnexo.objects.exists())
+
+    def test_token_de_outro_usuario_e_recusado(self):
+        dono = Usuario.objects.create_user(username='outro')
+        upload = UploadAnexo.objects.create(
+            usuario=dono, tamanho_total=len(self.PNG),
+            arquivo=ContentFile(self.PNG, name='enviado.png'))
+        resposta = self.submeter([{'pergunta_id': self.pergunta.pk,
+                                   'anexos_tokens': [str(upload.token)]}])
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertTrue(UploadAnexo.objects.filter(pk=upload.pk).exists())
+
+    def test_consultas_nao_crescem_com_o_checklist(self):
+        perguntas = []
+        for indice in range(30):
+            pergunta = Pergunta.objects.create(
+                topico=self.pergunta.topico, descricao=f'Pergunta {indice}')
+            opcao = OpcaoResposta.objects.create(
+                pergunta=pergunta, descricao='NOK', status='NAO_CONFORME')
+            perguntas.append({'pergunta_id': pergunta.pk, 'opcao_resposta': opcao.pk})
+
+        consultas = []
+        for quantidade in (10, 30):
+            instancia = self.criar_instancia()
+            with CaptureQueriesContext(connection) as contexto:
+                self.assertEqual(self.submeter(perguntas[:quantidade], instancia).status_code, 200)
+            consultas.append(len(contexto))
+
+        self.assertEqual(consultas[0], consultas[1])
+        self.assertEqual(PlanoDeAcao.objects.count(), 40)
+
+
+class ReconciliacaoInstanciasTests(BaseAPITestCase):
+    """Edição incremental das execuções (_reconciliar_instancias_da_auditoria)."""
+
+    def setUp(self):
+        super().setUp()
+        self.hoje = timezone.now().date()
+        setor = Setor.objects.create(
+            area=Area.objects.create(empresa=Empresa.objects.create(nome='Empresa'), nome='Área'),
+            nome='Setor')
+        self.subsetores = [SubSetor.objects.create(setor=setor, nome=f'Sub {indice}')
+                           for indice in range(3)]
+
+    def criar_turno(self, descricao, dias):
+        turno = Turno.objects.create(descricao=descricao)
+        for dia in dias:
+            TurnoDetalheDia.objects.create(turno=turno, dia_semana=dia)
+        return turno
+
+    def gerar(self, subsetores=None):
+        _gerar_instancias_para_auditoria(self.auditoria, subsetores)
+        return self.ids()
+
+    def reconciliar(self, subsetores=None, **campos):
+        for campo, valor in campos.items():
+            setattr(self.auditoria, campo, valor)
+        self.auditoria.save()
+        return _reconciliar_instancias_da_auditoria(self.auditoria, subsetores)
+
+    def ids(self):
+        return set(self.auditoria.instancias.values_list('pk', flat=True))
+
+    def datas(self):
+        return sorted(self.auditoria.instancias.values_list('data_execucao', flat=True))
+
+    def test_sem_mudanca_nada_e_alterado(self):
+        ids = self.gerar()
+        resultado = self.reconciliar()
+
+        self.assertEqual(resultado, {'criadas': 0, 'removidas': 0, 'atualizadas': 0, 'dias': set()})
+        self.assertEqual(self.ids(), ids)
+
+    def test_frequencia_mantem_as_execucoes_que_continuam_validas(self):
+        ids = self.gerar()
+        mantidas = set(self.auditoria.instancias.filter(
+            data_execucao__in=[self.hoje + timedelta(days=dias) for dias in range(0, 31, 7)]
+        ).values_list('pk', flat=True))
+
+        resultado = self.reconciliar(frequencia='SEMANAL')
+
+        self.assertEqual((resultado['criadas'], resultado['removidas']), (0, 26))
+        self.assertEqual(self.ids(), mantidas)
+        # As removidas ficam registradas para a sincronização do app
+        self.assertEqual(
+            set(RemocaoInstancia.objects.filter(motivo='EXCLUIDA').values_list('id_instancia', flat=True)),
+            ids - mantidas)
+
+    def test_execucoes_realizadas_nao_sao_removidas(self):
+        self.gerar()
+        executada = self.auditoria.instancias.get(data_execucao=self.hoje + timedelta(days=1))
+        AuditoriaInstancia.objects.filter(pk=executada.pk).update(executada=True)
+
+        self.reconciliar(frequencia='SEMANAL')
+
+        self.assertIn(executada.pk, self.ids())
+        self.assertEqual(len(self.ids()), 6)
+
+    def test_datas(self):
+        ids = self.gerar()
+        resultado = self.reconciliar(data_fim=self.hoje + timedelta(days=40))
+
+        self.assertEqual((resultado['criadas'], resultado['removidas']), (10, 0))
+        self.assertTrue(ids <= self.ids())
+        self.assertEqual(resultado['dias'], {self.hoje + timedelta(days=dias)
+                                              for dias in range(31, 41)})
+
+        resultado = self.reconciliar(data_inicio=self.hoje + timedelta(days=5))
+        self.assertEqual((resultado['criadas'], resultado['removidas']), (0, 5))
+        self.assertEqual(self.datas()[0], self.hoje + timedelta(days=5))
+
+    def test_locais(self):
+        self.auditoria.agendamento_especifico = True
+        primeiro, segundo, terceiro = (subsetor.pk for subsetor in self.subsetores)
+        self.gerar([primeiro, segundo])
+        mantidas = set(self.auditoria.instancias.filter(
+            local_execucao_id=segundo).values_list('pk', flat=True))
+
+        resultado = self.reconciliar([segundo, terceiro])
+
+        self.assertEqual((resultado['criadas'], resultado['removidas']), (31, 31))
+        locais = self.auditoria.instancias.values_list('local_execucao_id', flat=True)
+        self.assertEqual(set(locais), {segundo, terceiro})
+        self.assertTrue(mantidas <= self.ids())
+
+    def test_turnos(self):
+        semana = self.criar_turno('Semana', range(5))
+        todos = self.criar_turno('Todos', range(7))
+        self.auditoria.turnos.set([semana, todos])
+        self.gerar()
+        mantidas = set(self.auditoria.instancias.filter(turno=todos).values_list('pk', flat=True))
+
+        self.auditoria.turnos.set([todos])
+        resultado = self.reconciliar()
+
+        self.assertEqual(resultado['criadas'], 0)
+        self.assertEqual(self.ids(), mantidas)
+        self.assertEqual(len(mantidas), 31)
+
+    def test_repeticoes_casadas_pela_ordem_de_criacao(self):
+        self.auditoria.numero_repeticoes = 3
+        self.gerar()
+        por_data = {}
+        for pk, data in self.auditoria.instancias.order_by('pk').values_list(
+                'pk', 'data_execucao'):
+            por_data.setdefault(data, []).append(pk)
+        # A primeira repetição foi realizada: continua ocupando o índice 0
+        primeiras = [pks[0] for pks in por_data.values()]
+        AuditoriaInstancia.objects.filter(pk__in=primeiras).update(executada=True)
+
+        resultado = self.reconciliar(numero_repeticoes=2)
+
+        self.assertEqual((resultado['criadas'], resultado['removidas']), (0, 31))
+        self.assertEqual(self.ids(), {pk for pks in por_data.values() for pk in pks[:2]})
+
+    def test_troca_de_responsavel_mantem_os_ids(self):
+        ids = self.gerar()
+        novo = Usuario.objects.create_user(username='novo')
+
+        resultado = self.reconciliar(responsavel=novo)
+
+        self.assertEqual((resultado['criadas'], resultado['removidas']), (0, 0))
+        self.assertEqual(resultado['atualizadas'], 31)
+        self.assertEqual(self.ids(), ids)
+        self.assertFalse(self.auditoria.instancias.exclude(responsavel=novo).exists())
+        # O auditor anterior recebe a remoção na sincronização
+        redirecionadas = RemocaoInstancia.objects.filter(motivo='REDIRECIONADA')
+        self.assertEqual(set(redirecionadas.values_list('id_instancia', flat=True)), ids)
+        self.assertEqual(set(redirecionadas.values_list('usuario', flat=True)), {self.usuario.pk})
+
+
+class MotorRecorrenciaTests(SimpleTestCase):
+    """Séries de datas de auditorias/agendamento.py."""
+
+    def test_frequencias_em_dias(self):
+        inicio = date(2027, 1, 4)
+        for frequencia, datas in (
+            ('DIARIO', [date(2027, 1, dia) for dia in range(4, 12)]),
+            ('SEMANAL', [date(2027, 1, 4), date(2027, 1, 11)]),
+            ('QUINZENAL', [date(2027, 1, 4)]),
+        ):
+            with self.subTest(frequencia=frequencia):
+                self.assertEqual(
+                    calcular_datas(inicio, date(2027, 1, 11), frequencia=frequencia), datas)
+
+    def test_intervalo_sao_dias_de_folga(self):
+        self.assertEqual(
+            calcular_datas(date(2027, 1, 1), date(2027, 1, 10), intervalo=2),
+            [date(2027, 1, 1), date(2027, 1, 4), date(2027, 1, 7), date(2027, 1, 10)])
+
+    def test_fim_de_mes_calculado_a_partir_do_inicio(self):
+        # Cada data parte do início: depois de fevereiro o dia volta a ser 31
+        self.assertEqual(
+            calcular_datas(date(2027, 1, 31), date(2027, 5, 31), frequencia='MENSAL'),
+            [date(2027, 1, 31), date(2027, 2, 28), date(2027, 3, 31),
+             date(2027, 4, 30), date(2027, 5, 31)])
+
+    def test_ultima_data_mensal_nao_passa_do_fim(self):
+        self.assertEqual(
+            calcular_datas(date(2027, 1, 31), date(2027, 2, 27), frequencia='MENSAL'),
+            [date(2027, 1, 31)])
+
+    def test_dia_29_de_fevereiro(self):
+        self.assertEqual(
+            calcular_datas(date(2028, 2, 29), date(2032, 3, 1), frequencia='ANUAL'),
+            [date(2028, 2, 29), date(2029, 2, 28), date(2030, 2, 28),
+             date(2031, 2, 28), date(2032, 2, 29)])
+        self.assertEqual(_somar_meses(date(2027, 12, 31), 2), date(2028, 2, 29))
+        self.assertEqual(_somar_meses(date(2027, 11, 30), 14), date(2029, 1, 30))
+
+    def test_pular_finais_de_semana(self):
+        # 01/01/2027 é sexta-feira
+        self.assertEqual(
+            calcular_datas(date(2027, 1, 1), date(2027, 1, 5), frequencia='DIARIO',
+                           pular_finais_semana=True),
+            [date(2027, 1, 1), date(2027, 1, 4), date(2027, 1, 5)])
+        self.assertEqual(
+            calcular_datas(date(2027, 1, 2), date(2027, 6, 30), frequencia='MENSAL',
+                           pular_finais_semana=True),
+            [date(2027, 2, 2), date(2027, 3, 2), date(2027, 4, 2), date(2027, 6, 2)])
+
+    def test_dia_unico_e_periodo_invalido(self):
+        inicio = date(2027, 1, 1)
+        self.assertEqual(calcular_datas(inicio), [inicio])
+        self.assertEqual(calcular_datas(inicio, date(2027, 1, 9)), [inicio])
+        self.assertEqual(calcular_datas(inicio, date(2026, 12, 31), frequencia='DIARIO'), [])
+        self.assertEqual(calcular_datas(None), [])
+
+    def test_limite_de_ocorrencias(self):
+        datas = calcular_datas(date(2027, 1, 1), date(2027, 12, 31), frequencia='DIARIO',
+                               limite=10)
+        self.assertEqual(datas[-1], date(2027, 1, 10))
+
+    def test_mascara_dias_semana(self):
+        self.assertEqual(mascara_dias_semana([]), 0)
+        self.assertEqual(mascara_dias_semana([0, 2, 4]), 0b10101)
+        self.assertEqual(mascara_dias_semana(range(7)), TODOS_OS_DIAS)
+
+    def test_expandir_ocorrencias(self):
+        # Segunda e sábado: o turno de dias úteis não trabalha no sábado
+        segunda, sabado = date(2027, 1, 4), date(2027, 1, 9)
+        turnos = [('UTEIS', mascara_dias_semana(range(5))), ('TODOS', TODOS_OS_DIAS)]
+
+        self.assertEqual(expandir_ocorrencias([segunda, sabado], [1, 2], turnos, repeticoes=2), [
+            (segunda, 1, 'UTEIS', 0), (segunda, 1, 'UTEIS', 1),
+            (segunda, 1, 'TODOS', 0), (segunda, 1, 'TODOS', 1),
+            (segunda, 2, 'UTEIS', 0), (segunda, 2, 'UTEIS', 1),
+            (segunda, 2, 'TODOS', 0), (segunda, 2, 'TODOS', 1),
+            (sabado, 1, 'TODOS', 0), (sabado, 1, 'TODOS', 1),
+            (sabado, 2, 'TODOS', 0), (sabado, 2, 'TODOS', 1),
+        ])
+        self.assertEqual(
+            expandir_ocorrencias([sabado], [None], [(None, TODOS_OS_DIAS)], repeticoes=0),
+            [(sabado, None, None, 0)])
+
+
+class UploadAnexosEmPartesTests(BaseAPITestCase):
+    """Upload retomável de /api/anexos/<token>/ e limpeza dos abandonados."""
+
+    PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(24))
+
+    def setUp(self):
+        super().setUp()
+        temporario = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temporario, ignore_errors=True)
+        configuracao = override_settings(
+            MEDIA_ROOT=os.path.join(temporario, 'media'), FILE_UPLOAD_TEMP_DIR=temporario)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def abrir(self, conteudo, nome='foto.png'):
+        resposta = self.client.post(reverse('api_anexos'),
+                                    {'nome': nome, 'tamanho': len(conteudo)}, format='json')
+        self.assertEqual(resposta.status_code, 201)
+        return UploadAnexo.objects.get(token=resposta.data['token'])
+
+    def enviar(self, upload, parte, offset):
+        return self.client.patch(
+            reverse('api_anexo_upload', args=[upload.token]), parte,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_envio_em_partes(self):
+        upload = self.abrir(self.PNG)
+        self.assertEqual(self.enviar(upload, self.PNG[:10], 0).data['offset'], 10)
+        resposta = self.enviar(upload, self.PNG[10:], 10)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.data['concluido'])
+        upload.refresh_from_db()
+        self.assertTrue(upload.arquivo.name.endswith('.png'))
+        with upload.arquivo.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), self.PNG)
+        self.assertFalse(os.path.exists(caminho_parcial(upload)))
+
+    def test_offset_fora_de_ordem_responde_409_com_o_estado(self):
+        upload = self.abrir(self.PNG)
+        self.enviar(upload, self.PNG[:10], 0)
+
+        for offset in (0, 20):
+            with self.subTest(offset=offset):
+                resposta = self.enviar(upload, self.PNG[offset:], offset)
+                self.assertEqual(resposta.status_code, 409)
+                self.assertEqual(resposta.data['offset'], 10)
+                self.assertEqual(resposta['Upload-Offset'], '10')
+        upload.refresh_from_db()
+        self.assertEqual(upload.tamanho_recebido, 10)
+
+    def test_reenvio_apos_falha_descarta_os_bytes_nao_confirmados(self):
+        upload = self.abrir(self.PNG)
+        self.enviar(upload, self.PNG[:10], 0)
+        # Parte gravada no arquivo parcial sem a confirmação no banco
+        with open(caminho_parcial(upload), 'ab') as parcial:
+            parcial.write(b'lixo')
+
+        resposta = self.enviar(upload, self.PNG[10:], 10)
+
+        self.assertTrue(resposta.data['concluido'])
+        upload.refresh_from_db()
+        with upload.arquivo.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), self.PNG)
+
+    def test_parte_maior_que_o_declarado_e_recusada(self):
+        upload = self.abrir(self.PNG)
+        resposta = self.enviar(upload, self.PNG + b'!', 0)
+
+        self.assertEqual(resposta.status_code, 400)
+        upload.refresh_from_db()
+        self.assertEqual(upload.tamanho_recebido, 0)
+        self.assertFalse([nome for nome in os.listdir(diretorio_parcial())
+                          if nome.endswith(SUFIXO_RECEBENDO)])
+
+    def test_conteudo_diferente_da_extensao_e_recusado(self):
+        conteudo = b'texto qualquer, nao uma imagem'
+        upload = self.abrir(conteudo)
+        resposta = self.enviar(upload, conteudo, 0)
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(UploadAnexo.objects.filter(pk=upload.pk).exists())
+        self.assertFalse(os.path.exists(caminho_parcial(upload)))
+
+    def test_limpeza_dos_uploads_abandonados(self):
+        antigo = self.abrir(self.PNG)
+        self.enviar(antigo, self.PNG, 0)
+        antigo.refresh_from_db()
+        parcial = self.abrir(self.PNG)
+        self.enviar(parcial, self.PNG[:10], 0)
+        UploadAnexo.objects.filter(pk__in=[antigo.pk, parcial.pk]).update(
+            data_criacao=timezone.now() - timedelta(hours=49))
+        recente = self.abrir(self.PNG)
+
+        # Partes de requisições interrompidas: só a antiga é removida
+        interrompidas = []
+        for horas in (49, 1):
+            descritor, caminho = tempfile.mkstemp(
+                dir=diretorio_parcial(), suffix=SUFIXO_RECEBENDO)
+            os.close(descritor)
+            instante = (timezone.now() - timedelta(hours=horas)).timestamp()
+            os.utime(caminho, (instante, instante))
+            interrompidas.append(caminho)
+
+        call_command('limpar_uploads_anexos', stdout=io.StringIO())
+
+        self.assertEqual(list(UploadAnexo.objects.values_list('pk', flat=True)), [recente.pk])
+        self.assertFalse(antigo.arquivo.storage.exists(antigo.arquivo.name))
+        self.assertFalse(os.path.exists(caminho_parcial(parcial)))
+        self.assertEqual([os.path.exists(caminho) for caminho in interrompidas], [False, True])
+
+
+class BuscaPlanosTests(BaseAPITestCase):
+    """Busca textual dos planos (auditorias/busca.py e índice da migração 0063)."""
+
+    def criar_plano(self, titulo, **campos):
+        return PlanoDeAcao.objects.create(
+            tipo='NAO_CONFORMIDADE', titulo=titulo, data_abertura=timezone.now(),
+            forum=Forum.objects.create(nome=titulo), **campos)
+
+    def encontrados(self, texto):
+        return set(PlanoDeAcao.objects.buscar(texto).values_list('pk', flat=True))
+
+    def test_plano_encontrado_apos_criar_e_alterar(self):
+        plano = self.criar_plano('Vazamento de óleo na prensa')
+        self.assertEqual(self.encontrados('vazamento prensa'), {plano.pk})
+        self.assertEqual(self.encontrados('mangueira'), set())
+
+        plano.descricao_acao = 'Trocar a mangueira hidráulica'
+        plano.save()
+        self.assertEqual(self.encontrados('mangueira'), {plano.pk})
+
+        plano.titulo = 'Ruído no compressor'
+        plano.save(update_fields=['titulo'])
+        self.assertEqual(self.encontrados('vazamento'), set())
+        self.assertEqual(self.encontrados('compressor'), {plano.pk})
+
+    def test_mensagens_do_forum(self):
+        plano = self.criar_plano('Extintor vencido')
+        mensagem = MensagemForum.objects.create(
+            forum=plano.forum, autor=self.usuario, conteudo='Fornecedor agendou a recarga')
+        self.assertEqual(self.encontrados('recarga'), {plano.pk})
+
+        mensagem.delete()
+        self.assertEqual(self.encontrados('recarga'), set())
+
+    def test_plano_excluido_nao_e_encontrado(self):
+        plano = self.criar_plano('Piso escorregadio')
+        outro = self.criar_plano('Piso quebrado')
+        plano.delete()
+
+        self.assertEqual(self.encontrados('piso'), {outro.pk})
+        if connection.vendor == 'sqlite':
+            # O trigger também remove a linha do índice FTS5
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT rowid FROM auditorias_buscaplano_fts')
+                self.assertEqual([linha[0] for linha in cursor.fetchall()], [outro.pk])
+
+    def test_relevancia_pesa_o_titulo(self):
+        no_titulo = self.criar_plano('Iluminação insuficiente')
+        no_texto = self.criar_plano('Inspeção do galpão',
+                                    descricao_causa_raiz='Iluminação insuficiente no galpão')
+        ordem = list(PlanoDeAcao.objects.buscar('iluminação').order_by(
+            '-relevancia').values_list('pk', flat=True))
+        self.assertEqual(ordem, [no_titulo.pk, no_texto.pk])
+
+    def test_lista_respeita_a_visibilidade(self):
+        visivel = self.criar_plano('Proteção da serra ausente', responsavel_acao=self.usuario)
+        self.criar_plano('Proteção da esteira ausente')
+        self.client.force_login(self.usuario)
+
+        resposta = self.client.get(reverse('auditorias:lista_planos_de_acao'),
+                                   {'q': 'proteção ausente'})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([plano.pk for plano in resposta.context['page_obj']], [visivel.pk])
+
+
+class HorizonteRolanteTests(BaseAPITestCase):
+    """
+    Horizonte rolante: instâncias gravadas + ocorrências virtuais devem dar
+    o mesmo que a materialização completa de antes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.hoje = timezone.now().date()
+        turnos = []
+        for descricao, dias in (('Semana', range(5)), ('Todos', range(7))):
+            turno = Turno.objects.create(descricao=descricao)
+            for dia in dias:
+                TurnoDetalheDia.objects.create(turno=turno, dia_semana=dia)
+            turnos.append(turno)
+        self.auditoria.data_fim = self.hoje + timedelta(days=59)
+        self.auditoria.numero_repeticoes = 2
+        self.auditoria.save()
+        self.auditoria.turnos.set(turnos)
+
+        # Referência: o mesmo agendamento materializado de uma só vez
+        referencia = Auditoria.objects.get(pk=self.auditoria.pk)
+        referencia.pk = None
+        referencia.save()
+        referencia.turnos.set(turnos)
+        _gerar_instancias_para_auditoria(referencia)
+        self.esperado = self.slots(referencia)
+
+    def slots(self, auditoria):
+        return Counter(auditoria.instancias.values_list(
+            'data_execucao', 'local_execucao_id', 'turno_id'))
+
+    def virtuais(self):
+        return Counter(data for data, _ in _ocorrencias_virtuais(
+            self.hoje, self.auditoria.data_fim, Auditoria.objects.filter(pk=self.auditoria.pk)))
+
+    def estender(self):
+        saida = io.StringIO()
+        call_command('estender_horizonte_agendamentos', auditoria=self.auditoria.pk,
+                     stdout=saida)
+        self.auditoria.refresh_from_db()
+        return saida.getvalue()
+
+    def test_gravadas_e_virtuais_cobrem_o_agendamento(self):
+        with override_settings(AUDITORIAS_CONFIG=_config(HORIZONTE_SEMANAS=2)):
+            _gerar_instancias_para_auditoria(self.auditoria)
+        self.auditoria.refresh_from_db()
+
+        limite = self.hoje + timedelta(weeks=2)
+        self.assertEqual(self.auditoria.materializado_ate, limite)
+        gravadas = self.slots(self.auditoria)
+        self.assertEqual(gravadas, Counter(
+            {slot: total for slot, total in self.esperado.items() if slot[0] <= limite}))
+
+        datas_esperadas = Counter()
+        for (data, _, _), total in self.esperado.items():
+            datas_esperadas[data] += total
+        datas_gravadas = Counter()
+        for (data, _, _), total in gravadas.items():
+            datas_gravadas[data] += total
+        self.assertEqual(datas_gravadas + self.virtuais(), datas_esperadas)
+
+    def test_extensao_pelo_comando(self):
+        with override_settings(AUDITORIAS_CONFIG=_config(HORIZONTE_SEMANAS=2)):
+            _gerar_instancias_para_auditoria(self.auditoria)
+
+        with override_settings(AUDITORIAS_CONFIG=_config(HORIZONTE_SEMANAS=4)):
+            self.estender()
+            self.assertEqual(self.auditoria.materializado_ate, self.hoje + timedelta(weeks=4))
+            ids = set(self.auditoria.instancias.values_list('pk', flat=True))
+            # Idempotente: a segunda execução não grava nada
+            self.assertIn('0 execução(ões)', self.estender())
+            self.assertEqual(set(self.auditoria.instancias.values_list('pk', flat=True)), ids)
+
+        # Sem horizonte, o restante é gravado e o resultado é o da materialização completa
+        self.estender()
+        self.assertIsNone(self.auditoria.materializado_ate)
+        self.assertEqual(self.slots(self.auditoria), self.esperado)
+        self.assertEqual(self.virtuais(), Counter())
+
+
+def _status_antigo(instancia, hoje):
+    """Status como era calculado (propriedade status_execucao) antes de ser persistido."""
+    if instancia.executada:
+        return 'CONCLUIDA'
+    if instancia.data_execucao > hoje:
+        return 'AGENDADA'
+    if instancia.data_execucao == hoje:
+        return 'PENDENTE'
+    agendamento = instancia.auditoria_agendada
+    carencia = timedelta(days=1)
+    if agendamento.por_frequencia and agendamento.frequencia:
+        carencia = {
+            'DIARIO': timedelta(days=1),
+            'SEMANAL': timedelta(weeks=1),
+            'QUINZENAL': timedelta(weeks=2),
+            'MENSAL': relativedelta(months=1),
+            'ANUAL': relativedelta(years=1),
+        }.get(agendamento.frequencia, carencia)
+    elif agendamento.por_intervalo and agendamento.intervalo:
+        carencia = timedelta(days=agendamento.intervalo + 1)
+    return 'ATRASO' if hoje >= instancia.data_execucao + carencia else 'PENDENTE'
+
+
+class StatusExecucaoPersistidoTests(BaseAPITestCase):
+    """Status e data limite gravados, comparados com o cálculo antigo em Python."""
+
+    PROGRAMACOES = [
+        {'por_frequencia': True, 'frequencia': frequencia}
+        for frequencia in ('DIARIO', 'SEMANAL', 'QUINZENAL', 'MENSAL', 'ANUAL')
+    ] + [
+        {'por_frequencia': False, 'por_intervalo': True, 'intervalo': 3},
+        {'por_frequencia': False, 'frequencia': None},
+    ]
+    DESLOCAMENTOS = (-400, -366, -365, -40, -31, -30, -15, -14, -13, -8, -7, -6,
+                     -4, -3, -2, -1, 0, 1, 30)
+
+    def setUp(self):
+        super().setUp()
+        self.hoje = timezone.now().date()
+        for programacao in self.PROGRAMACOES:
+            auditoria = Auditoria.objects.create(
+                nivel_organizacional='SETOR', categoria_auditoria='WEB',
+                data_inicio=self.hoje, responsavel=self.usuario, **programacao)
+            for dias in self.DESLOCAMENTOS:
+                for executada in (False, True):
+                    AuditoriaInstancia.objects.create(
+                        auditoria_agendada=auditoria, executada=executada,
+                        data_execucao=self.hoje + timedelta(days=dias))
+
+    def assertStatusComoAntes(self, hoje):
+        for instancia in AuditoriaInstancia.objects.select_related('auditoria_agendada'):
+            with self.subTest(data=instancia.data_execucao, executada=instancia.executada,
+                              agendamento=instancia.auditoria_agendada.get_programacao_display):
+                self.assertEqual(instancia.status_execucao, _status_antigo(instancia, hoje))
+
+    def test_gravado_no_save(self):
+        self.assertStatusComoAntes(self.hoje)
+
+    def test_comando_preenche_e_recalcula(self):
+        # Linhas gravadas sem o save(): sem data limite e com status obsoleto
+        AuditoriaInstancia.objects.update(data_limite=None, status_execucao='AGENDADA')
+
+        call_command('recalcular_status_execucoes', stdout=io.StringIO())
+
+        self.assertFalse(AuditoriaInstancia.objects.filter(data_limite__isnull=True).exists())
+        self.assertStatusComoAntes(self.hoje)
+
+    def test_passagem_dos_dias(self):
+        for dias in (1, 7, 32, 400):
+            amanha = self.hoje + timedelta(days=dias)
+            AuditoriaInstancia.objects.recalcular_status(amanha)
+            self.assertStatusComoAntes(amanha)
+        self.assertEqual(AuditoriaInstancia.objects.recalcular_status(amanha), 0)
+
+
+class QuarentenaTests(BaseAPITestCase):
+    """Limites da quarentena calculados no banco, comparados com o laço antigo em Python."""
+
+    DESLOCAMENTOS = range(-15, 3)
+
+    def setUp(self):
+        super().setUp()
+        self.hoje = timezone.now().date()
+        pilar = Pilar.objects.create(nome='Pilar')
+        self.agendamentos = []
+        # Tolerância de cada agendamento: categoria do primeiro modelo (por descrição)
+        for tolerancias in ([], [None], [0], [3], [10, 2]):
+            auditoria = Auditoria.objects.create(
+                nivel_organizacional='SETOR', categoria_auditoria='WEB',
+                data_inicio=self.hoje, responsavel=self.usuario)
+            for indice, dias in enumerate(tolerancias):
+                categoria = None
+                if dias is not None:
+                    categoria = CategoriaAuditoria.objects.create(
+                        pilar=pilar, descricao=f'{dias} dias', dias_para_quarentena=dias)
+                auditoria.modelos.add(ModeloAuditoria.objects.create(
+                    descricao=f'Modelo {indice}', categoria=categoria))
+            for dias in self.DESLOCAMENTOS:
+                for executada in (False, True):
+                    AuditoriaInstancia.objects.create(
+                        auditoria_agendada=auditoria, responsavel=self.usuario,
+                        executada=executada, data_execucao=self.hoje + timedelta(days=dias))
+
+    def em_quarentena_antes(self):
+        """Laço da lista_quarentena antes do cálculo no banco."""
+        ids = set()
+        for instancia in AuditoriaInstancia.objects.filter(
+                executada=False, data_execucao__lt=self.hoje):
+            limite = 7
+            primeiro_modelo = instancia.auditoria_agendada.modelos.first()
+            if primeiro_modelo and primeiro_modelo.categoria:
+                limite = primeiro_modelo.categoria.dias_para_quarentena
+            if (self.hoje - instancia.data_execucao).days > limite:
+                ids.add(instancia.pk)
+        return ids
+
+    def ids(self, dados):
+        return {item['id'] for item in dados}
+
+    def test_limites_como_antes(self):
+        esperado = self.em_quarentena_antes()
+        self.assertTrue(esperado)
+
+        self.assertEqual(set(AuditoriaInstancia.objects.em_quarentena(self.hoje).values_list(
+            'pk', flat=True)), esperado)
+        abertas = set(AuditoriaInstancia.objects.filter(executada=False).values_list(
+            'pk', flat=True))
+        self.assertEqual(set(AuditoriaInstancia.objects.fora_de_quarentena(
+            self.hoje).values_list('pk', flat=True)), abertas - esperado)
+
+    def test_tolerancia_anotada(self):
+        tolerancias = dict(AuditoriaInstancia.objects.com_tolerancia_quarentena().values_list(
+            'auditoria_agendada_id', 'dias_tolerancia'))
+        self.assertEqual(sorted(tolerancias.values()), [0, 3, 7, 7, 10])
+
+    def test_apis_do_app(self):
+        esperado = self.em_quarentena_antes()
+        abertas = set(AuditoriaInstancia.objects.filter(executada=False).values_list(
+            'pk', flat=True))
+
+        quarentena = self.client.get(reverse('api_auditorias_quarentena'))
+        pendentes = self.client.get(reverse('api_auditorias_pendentes'))
+
+        self.assertEqual(self.ids(quarentena.data), esperado)
+        self.assertEqual(self.ids(pendentes.data), abertas - esperado)
+
+
+class CalendarioTests(BaseAPITestCase):
+    """Contagens do calendário (GROUP BY) e GET condicional por ETag."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        self.url = reverse('auditorias:get_dados_calendario')
+        self.hoje = timezone.now().date()
+        self.inicio_mes = self.hoje.replace(day=1)
+        self.fim_mes = self.inicio_mes.replace(day=monthrange(self.hoje.year, self.hoje.month)[1])
+
+        pilar = Pilar.objects.create(nome='Pilar')
+        self.categoria = CategoriaAuditoria.objects.create(pilar=pilar, descricao='Segurança')
+        self.ferramenta = FerramentaDigital.objects.create(nome='5S')
+        self.outro = Usuario.objects.create_user(username='outro')
+        # Dois modelos da mesma categoria: o filtro não pode duplicar as contagens
+        self.auditoria.ferramenta = self.ferramenta
+        self.auditoria.save()
+        for descricao in ('A', 'B'):
+            self.auditoria.modelos.add(ModeloAuditoria.objects.create(
+                descricao=descricao, categoria=self.categoria))
+        outra = Auditoria.objects.create(
+            nivel_organizacional='SETOR', categoria_auditoria='WEB',
+            data_inicio=self.inicio_mes, responsavel=self.outro)
+
+        data = self.inicio_mes
+        while data <= self.fim_mes:
+            for auditoria, responsavel in ((self.auditoria, self.usuario), (outra, self.outro)):
+                AuditoriaInstancia.objects.create(
+                    auditoria_agendada=auditoria, responsavel=responsavel,
+                    data_execucao=data, executada=data.day % 3 == 0)
+            data += timedelta(days=1)
+
+    def consultar(self, etag=None, **parametros):
+        parametros = {'year': self.hoje.year, 'month': self.hoje.month, **parametros}
+        cabecalhos = {'if-none-match': etag} if etag else {}
+        return self.client.get(self.url, parametros, headers=cabecalhos)
+
+    def contagens_antes(self, chave_do_dia=lambda data: str(data.day), **filtros):
+        """Contagem instância a instância, como no laço anterior ao GROUP BY."""
+        dados = {}
+        for instancia in AuditoriaInstancia.objects.filter(
+                data_execucao__range=(self.inicio_mes, self.fim_mes), **filtros):
+            dia = dados.setdefault(chave_do_dia(instancia.data_execucao), {})
+            legenda = LEGENDA_STATUS_CALENDARIO[instancia.status_execucao]
+            dia[legenda] = dia.get(legenda, 0) + 1
+        return dados
+
+    def test_contagens_como_antes(self):
+        resposta = self.consultar()
+        self.assertEqual(resposta.json(), {'dados': self.contagens_antes(), 'sucesso': True})
+
+    def test_modo_anual(self):
+        dados = self.consultar(modo='ano').json()['dados']
+        self.assertEqual(dados, self.contagens_antes(chave_do_dia=date.isoformat))
+
+    def test_filtros(self):
+        for parametros, filtros in (
+            ({'responsavel': self.outro.pk}, {'responsavel': self.outro}),
+            ({'ferramenta': self.ferramenta.pk}, {'auditoria_agendada': self.auditoria}),
+            ({'categoria': self.categoria.pk}, {'auditoria_agendada': self.auditoria}),
+        ):
+            with self.subTest(parametros=parametros):
+                self.assertEqual(self.consultar(**parametros).json()['dados'],
+                                 self.contagens_antes(**filtros))
+
+    def test_etag_e_304(self):
+        primeira = self.consultar()
+        etag = primeira['ETag']
+        self.assertNotIn('Last-Modified', primeira)
+
+        self.assertEqual(self.consultar(etag).status_code, 304)
+
+        # A exclusão de uma execução muda os dados e o ETag
+        AuditoriaInstancia.objects.filter(data_execucao=self.inicio_mes).excluir()
+        nova = self.consultar(etag)
+        self.assertEqual(nova.status_code, 200)
+        self.assertNotEqual(nova['ETag'], etag)
+        self.assertEqual(nova.json()['dados'], self.contagens_antes())
+
+
+class ResumoDiarioTests(BaseAPITestCase):
+    """Rollups diários do dashboard recalculados por dia afetado."""
+
+    def setUp(self):
+        super().setUp()
+        self.hoje = timezone.now().date()
+        self.nao_conforme = OpcaoResposta.objects.create(
+            pergunta=self.pergunta, descricao='NOK', status='NAO_CONFORME')
+        self.outras = [Pergunta.objects.create(topico=self.pergunta.topico, descricao=descricao)
+                       for descricao in ('Segunda', 'Terceira')]
+        self.na = OpcaoResposta.objects.create(
+            pergunta=self.outras[0], descricao='N/A', status='NA')
+        categoria = CategoriaAuditoria.objects.create(
+            pilar=Pilar.objects.create(nome='Pilar'), descricao='Qualidade')
+        self.auditoria.modelos.add(ModeloAuditoria.objects.create(
+            descricao='Modelo', categoria=categoria))
+        self.outro = Usuario.objects.create_user(username='outro')
+
+        self.instancias = [self.criar_instancia(dias) for dias in (0, 0, 1)]
+        self.instancias.append(AuditoriaInstancia.objects.create(
+            auditoria_agendada=self.auditoria, data_execucao=self.hoje,
+            checklist_usado=self.checklist, responsavel=self.outro))
+        ResumoDiarioAuditoria.recalcular_dias(self.dias())
+
+    def dias(self):
+        return {self.hoje, self.hoje + timedelta(days=1)}
+
+    def resumos(self):
+        return {
+            tuple(getattr(resumo, campo) for campo in ResumoDiarioAuditoria.CHAVE):
+            tuple(getattr(resumo, campo) for campo in ResumoDiarioAuditoria.VALORES)
+            for resumo in ResumoDiarioAuditoria.objects.all()
+        }
+
+    def resumos_antes(self):
+        """Agrupamento instância a instância, como o dashboard fazia sobre as respostas."""
+        grupos = {}
+        for instancia in AuditoriaInstancia.objects.filter(data_execucao__in=self.dias()):
+            primeiro_modelo = instancia.auditoria_agendada.modelos.first()
+            chave = (instancia.data_execucao, instancia.local_execucao_id,
+                     instancia.auditoria_agendada.ferramenta_id,
+                     primeiro_modelo.categoria_id if primeiro_modelo else None,
+                     instancia.responsavel_id)
+            planejadas, executadas, respostas, nao_conformes, nao_aplicaveis = grupos.get(
+                chave, (0, 0, 0, 0, 0))
+            status = [resposta.opcao_resposta.status if resposta.opcao_resposta else None
+                      for resposta in instancia.respostas.all()] if instancia.executada else []
+            grupos[chave] = (
+                planejadas + 1, executadas + instancia.executada, respostas + len(status),
+                nao_conformes + status.count('NAO_CONFORME'), nao_aplicaveis + status.count('NA'))
+        return grupos
+
+    def submeter(self, instancia, respostas):
+        resposta = self.client.post(reverse('api_instancia_submeter', args=[instancia.pk]),
+                                    {'respostas': respostas}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_submissao_recalcula_o_dia(self):
+        self.assertEqual(self.resumos(), self.resumos_antes())
+
+        self.submeter(self.instancias[0], [
+            {'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.nao_conforme.pk},
+            {'pergunta_id': self.outras[0].pk, 'opcao_resposta': self.na.pk},
+            {'pergunta_id': self.outras[1].pk, 'resposta_livre_texto': 'Ok'},
+        ])
+        self.submeter(self.instancias[1], [
+            {'pergunta_id': self.pergunta.pk, 'opcao_resposta': self.conforme.pk}])
+
+        resumos = self.resumos()
+        self.assertEqual(resumos, self.resumos_antes())
+        do_dia = [valores for chave, valores in resumos.items()
+                  if chave[0] == self.hoje and chave[4] == self.usuario.pk]
+        self.assertEqual(do_dia, [(2, 2, 4, 1, 1)])
+        # Nada mudou desde o último recálculo
+        self.assertEqual(ResumoDiarioAuditoria.recalcular_dias(self.dias()), 0)
+
+    def test_exclusao_remove_os_grupos_vazios(self):
+        amanha = self.hoje + timedelta(days=1)
+        AuditoriaInstancia.objects.filter(pk=self.instancias[2].pk).excluir()
+        AuditoriaInstancia.objects.filter(pk=self.instancias[0].pk).excluir()
+
+        self.assertEqual(ResumoDiarioAuditoria.recalcular_dias(self.dias()), 2)
+        self.assertFalse(ResumoDiarioAuditoria.objects.filter(data=amanha).exists())
+        self.assertEqual(self.resumos(), self.resumos_antes())
+
+    def test_redirecionamento_move_a_execucao_de_grupo(self):
+        AuditoriaInstancia.objects.filter(pk=self.instancias[1].pk).redirecionar(self.outro.pk)
+        ResumoDiarioAuditoria.recalcular_dias(self.dias())
+
+        self.assertEqual(self.resumos(), self.resumos_antes())
+
+
+class IndicadoresPlanosTests(BaseAPITestCase):
+    """Indicadores do dashboard de planos, comparados com uma contagem plano a plano."""
+
+    SEM_FILTROS = {'data_inicial': None, 'data_final': None, 'empresa': None,
+                   'area': None, 'setor': None, 'categoria': None}
+
+    def setUp(self):
+        super().setUp()
+        self.usuario.is_superuser = True
+        self.usuario.save()
+        empresa = Empresa.objects.create(nome='Empresa')
+        area = Area.objects.create(empresa=empresa, nome='Área')
+        self.setores = [Setor.objects.create(area=area, nome=f'Setor {indice}')
+                        for indice in range(2)]
+        locais = [None] + [SubSetor.objects.create(setor=setor, nome=f'Local {setor.pk}')
+                           for setor in self.setores]
+        ferramentas = [None] + [FerramentaDigital.objects.create(nome=nome)
+                                for nome in ('5S', 'Kaizen')]
+        pilar = Pilar.objects.create(nome='Pilar')
+        self.categorias = [None] + [CategoriaAuditoria.objects.create(pilar=pilar, descricao=nome)
+                                    for nome in ('Segurança', 'Qualidade')]
+        responsaveis = [None, Usuario.objects.create_user(username='ana', first_name='Ana'),
+                        Usuario.objects.create_user(username='bruno')]
+        status = [codigo for codigo, _ in PlanoDeAcao.STATUS_PLANO]
+
+        agora = timezone.localtime().replace(hour=12)
+        for indice in range(60):
+            PlanoDeAcao.objects.create(
+                tipo='NAO_CONFORMIDADE', titulo=f'Plano {indice}',
+                data_abertura=agora - timedelta(days=indice * 8),
+                status_plano=status[indice % len(status)],
+                local_execucao=locais[indice % 3], ferramenta=ferramentas[indice % 3 - 1],
+                categoria=self.categorias[indice % 3],
+                responsavel_acao=responsaveis[indice % 3 - 2])
+
+    def indicadores_antes(self, planos):
+        """Contagem plano a plano dos mesmos indicadores."""
+        pendentes = [plano for plano in planos if plano.status_plano in STATUS_PLANOS_PENDENTES]
+        nomes_status = dict(PlanoDeAcao.STATUS_PLANO)
+        por_status = Counter(nomes_status[plano.status_plano] for plano in pendentes)
+        ultimo_mes = timezone.localdate().replace(day=1)
+        meses = [ultimo_mes - relativedelta(months=atras) for atras in range(11, -1, -1)]
+        por_mes = Counter(timezone.localtime(plano.data_abertura).date().replace(day=1)
+                          for plano in planos)
+        ranking = Counter(
+            (plano.responsavel_acao.get_full_name() or plano.responsavel_acao.username)
+            for plano in pendentes if plano.responsavel_acao)
+        return {
+            'kpi_total_pendentes': len(pendentes),
+            'kpi_colaboradores': len({plano.responsavel_acao_id for plano in pendentes
+                                      if plano.responsavel_acao_id}),
+            'kpi_porcentagem': f"{len(pendentes) / len(planos) * 100:.1f}%" if planos else '0.0%',
+            'status': dict(por_status),
+            'meses': [por_mes[mes] for mes in meses],
+            'ferramentas': dict(Counter(
+                plano.ferramenta.nome if plano.ferramenta else 'Não Definido'
+                for plano in planos)),
+            'locais': dict(Counter(
+                plano.local_execucao.nome if plano.local_execucao else 'Não Definido'
+                for plano in planos)),
+            'ranking': dict(ranking),
+        }
+
+    def indicadores(self, usuario=None, **filtros):
+        dados = _indicadores_planos(usuario or self.usuario, {**self.SEM_FILTROS, **filtros})
+        return {
+            'kpi_total_pendentes': dados['kpi_total_pendentes'],
+            'kpi_colaboradores': dados['kpi_colaboradores'],
+            'kpi_porcentagem': dados['kpi_porcentagem'],
+            'status': dict(zip(dados['status_labels'], dados['status_series'])),
+            'meses': dados['mes_series'],
+            'ferramentas': dict(zip(dados['ferramenta_labels'], dados['ferramenta_series'])),
+            'locais': dict(zip(dados['local_labels'], dados['local_series'])),
+            'ranking': {item['nome']: item['qtd'] for item in dados['ranking_list']},
+        }
+
+    def planos(self, **filtros):
+        return list(PlanoDeAcao.objects.select_related(
+            'ferramenta', 'local_execucao', 'responsavel_acao').filter(**filtros))
+
+    def test_totais_como_antes(self):
+        self.assertEqual(self.indicadores(), self.indicadores_antes(self.planos()))
+
+    def test_filtros(self):
+        categoria = self.categorias[1]
+        self.assertEqual(self.indicadores(categoria=categoria.pk),
+                         self.indicadores_antes(self.planos(categoria=categoria)))
+        setor = self.setores[0]
+        self.assertEqual(self.indicadores(setor=setor.pk),
+                         self.indicadores_antes(self.planos(local_execucao__setor=setor)))
+
+    def test_periodo(self):
+        data_final = timezone.localdate() - timedelta(days=30)
+        data_inicial = data_final - timedelta(days=90)
+        dados = _indicadores_planos(self.usuario, {
+            **self.SEM_FILTROS, 'data_inicial': data_inicial, 'data_final': data_final})
+        planos = [plano for plano in self.planos()
+                  if data_inicial <= timezone.localtime(plano.data_abertura).date() <= data_final]
+
+        self.assertEqual(sum(dados['ferramenta_series']), len(planos))
+        self.assertEqual(len(dados['mes_series']), len(dados['mes_labels']))
+        self.assertEqual(sum(dados['mes_series']), len(planos))
+
+    def test_visibilidade(self):
+        ana = Usuario.objects.get(username='ana')
+        self.assertEqual(self.indicadores(usuario=ana),
+                         self.indicadores_antes(self.planos(responsavel_acao=ana)))
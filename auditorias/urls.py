@@ -82,6 +82,9 @@ urlpatterns = [
     path('ajax/get-subsetores-por-nivel/', views.get_subsetores_por_nivel,
          name='get_subsetores_por_nivel'),
 
+    path('ajax/arvore-organizacional/', views.get_arvore_organizacional,
+         name='get_arvore_organizacional'),
+
     path('ajax/preview-dates/', views.preview_audit_dates,
          name='preview_audit_dates'),
 
@@ -143,6 +146,8 @@ urlpatterns = [
 
     path('planos-de-acao/api/<int:pk>/redirecionar/',
          views.redirecionar_plano, name='api_redirecionar_plano'),
+    path('planos-de-acao/api/transicao-em-lote/',
+         views.transicionar_planos_em_lote, name='api_transicionar_planos_em_lote'),
 
     path('planos-de-acao/api/forum/<int:forum_id>/mensagens/',
          views.api_listar_mensagens, name='api_listar_mensagens'),
@@ -154,6 +159,8 @@ urlpatterns = [
 
     path('planos-de-acao/dashboard/',
          views.dashboard_planos_de_acao, name='dashboard_planos'),
+    path('planos-de-acao/api/dashboard/',
+         views.api_dashboard_planos, name='api_dashboard_planos'),
 
     path('ajax/calendario-dados/', views.get_dados_calendario,
          name='get_dados_calendario'),
@@ -1,5 +1,6 @@
 # auditorias/views.py
 
+from bisect import bisect_left, bisect_right
 from datetime import timedelta
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
@@ -10,34 +11,60 @@ from django.http import JsonResponse
 from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+import hashlib
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from dateutil.relativedelta import relativedelta
 import csv
+import logging
+from functools import wraps
+from collections import defaultdict
 from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.gzip import gzip_page
 from django.db.models import Q, Count
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
-from .serializers import RespostaSerializer
+from .serializers import RespostaListSerializer, RespostaSerializer, ids_inteiros
 
 from planos_de_acao.models import Forum, MensagemForum
+from django.conf import settings
+from core.cache import obter_ou_calcular
+from core.http import aplicar_cabecalhos_condicionais, json_condicional
+from core.imagens import url_da_variante
 
 from django.views.decorators.http import require_POST
 
 # Altere ListAPIView para incluir RetrieveAPIView
 from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 # Altere a importação dos serializers
-from .serializers import AuditoriaInstanciaListSerializer, AuditoriaInstanciaDetailSerializer
+from .serializers import (
+    AuditoriaInstanciaListSerializer, AuditoriaInstanciaDetailSerializer,
+    AuditoriaInstanciaSyncSerializer,
+)
 
 from .models import (
     Pilar, CategoriaAuditoria, Norma, RequisitoNorma, FerramentaDigital,
-    Checklist, Topico, Pergunta, OpcaoResposta, OpcaoPorcentagem,
+    Checklist, ChecklistSerializado, Topico, Pergunta, OpcaoResposta, OpcaoPorcentagem,
     FerramentaCausaRaiz, ModeloAuditoria, Auditoria, AuditoriaInstancia, Resposta,
-    CATEGORIAS_AUDITORIA, PlanoDeAcao, Investimento, EvidenciaPlano, HistoricoPlanoAcao
+    CATEGORIAS_AUDITORIA, STATUS_EXECUCAO, PlanoDeAcao, Investimento, EvidenciaPlano,
+    HistoricoPlanoAcao, ChaveIdempotencia, RemocaoInstancia, UploadAnexo, ResultadoAuditoria, ResumoDiarioAuditoria,
+    VisibilidadePlano, TransicaoInvalida, CAMPOS_TRANSICAO_PLANO, estrutura_em_lote
+)
+from .anexos import (
+    AnexoInvalido, OffsetDivergente, descartar, gravar_parte, salvar_arquivo_enviado,
+    tamanho_maximo,
 )
-from organizacao.models import Empresa, Area, Setor, SubSetor
+from .agendamento import (
+    TAMANHO_LOTE_INSTANCIAS, TODOS_OS_DIAS, calcular_datas, data_limite_da_execucao,
+    datas_do_agendamento, expandir_ocorrencias, limite_do_horizonte,
+    mascara_dias_semana, semanas_de_horizonte, status_da_execucao
+)
+from organizacao.models import CAMPO_DO_NIVEL, Empresa, Area, Setor, SubSetor, filtro_sob
 from ativos.models import Ativo
 from cadastros_base.models import Turno
 from usuarios.models import Usuario
@@ -53,16 +80,18 @@ from datetime import date, timedelta
 
 from django.db.models import F, ExpressionWrapper, fields
 
-from django.db import transaction
+from django.db import DatabaseError, transaction
 
 from django.db.models.functions import TruncMonth
-from django.db.models import Count, Q
+from django.db.models import Count, Exists, OuterRef, Q, Sum, Prefetch, prefetch_related_objects
 
 import json
 
 from calendar import monthrange
 from datetime import date
 
+logger = logging.getLogger(__name__)
+
 # ============================================================================
 # VIEWS PRINCIPAIS - DASHBOARD E LISTAGENS
 # ============================================================================
@@ -80,93 +109,158 @@ def registrar_historico(plano, usuario, descricao, tipo='STATUS'):
 
 @login_required
 def dashboard_auditorias(request):
-    # 1. Filtros Básicos (Por padrão, ano atual)
+    # 1. Filtros (Por padrão, ano atual). Os indicadores vêm dos rollups
+    # diários (ResumoDiarioAuditoria), não das respostas.
     ano_atual = timezone.now().year
-    qs_instancias = AuditoriaInstancia.objects.filter(
-        data_execucao__year=ano_atual)
-
-    # 2. KPIs Principais
-    total_planejadas = qs_instancias.count()
-    total_realizadas = qs_instancias.filter(executada=True).count()
-
-    eficiencia = 0
-    if total_planejadas > 0:
-        eficiencia = (total_realizadas / total_planejadas) * 100
-
-    # Total de Itens Não Conformes (Respostas NC em auditorias deste ano)
-    total_nc = Resposta.objects.filter(
-        auditoria_instancia__in=qs_instancias,
-        opcao_resposta__status='NAO_CONFORME'
-    ).count()
-
-    # 3. Gráfico: Planejado vs Realizado por Mês (Barras Agrupadas)
-    dados_mensais = qs_instancias.annotate(
-        mes=TruncMonth('data_execucao')
-    ).values('mes').annotate(
-        planejado=Count('id'),
-        realizado=Count('id', filter=Q(executada=True))
-    ).order_by('mes')
-
-    # Jan, Fev...
-    meses_labels = [d['mes'].strftime('%b') for d in dados_mensais]
-    series_planejado = [d['planejado'] for d in dados_mensais]
-    series_realizado = [d['realizado'] for d in dados_mensais]
-
-    # 4. Gráfico: Auditorias por Local (Top 10)
-    # Tenta pegar o subsetor, se não tiver, pega o setor
-    locais_data = qs_instancias.values(
-        'local_execucao__nome'
-    ).annotate(qtd=Count('id')).order_by('-qtd')[:10]
-
-    # Limpeza de nomes (trata auditorias sem local definido ainda)
-    locais_labels = [l['local_execucao__nome'] if l['local_execucao__nome']
-                     else 'Não Definido' for l in locais_data]
-    locais_series = [l['qtd'] for l in locais_data]
-
-    # 5. Gráfico: Conformidade Geral (Pizza)
-    # Conta total de respostas avaliadas no período
-    total_respostas = Resposta.objects.filter(
-        auditoria_instancia__in=qs_instancias).count()
-    total_respostas_nc = Resposta.objects.filter(
-        auditoria_instancia__in=qs_instancias,
-        opcao_resposta__status='NAO_CONFORME'
-    ).count()
-
-    total_conforme = total_respostas - total_respostas_nc
-
-    # Evita gráfico vazio
-    if total_respostas == 0:
-        series_conformidade = [0, 0]
-    else:
-        series_conformidade = [total_conforme, total_respostas_nc]
-
-    # 6. Tabela: Próximas Auditorias (Agenda)
-    proximas_auditorias = qs_instancias.filter(
-        executada=False,
-        data_execucao__gte=timezone.now().date()
-    ).select_related('responsavel', 'auditoria_agendada__ferramenta').order_by('data_execucao')[:5]
+    try:
+        ano_selecionado = int(request.GET.get('ano', ano_atual))
+    except ValueError:
+        ano_selecionado = ano_atual
+    # Fora do intervalo de datas do Python o filtro por ano quebraria a consulta
+    if not 1 <= ano_selecionado <= 9999:
+        ano_selecionado = ano_atual
+
+    # Apenas IDs numéricos são aceitos; valores inválidos são ignorados
+    filtros = {
+        chave: valor if valor.isdigit() else ''
+        for chave, valor in (
+            (chave, request.GET.get(chave, ''))
+            for chave in ('subsetor', 'ferramenta', 'categoria', 'responsavel'))
+    }
+    campos_filtro = {
+        'subsetor': 'local_execucao_id',
+        'ferramenta': 'ferramenta_id',
+        'categoria': 'categoria_id',
+        'responsavel': 'responsavel_id',
+    }
 
-    context = {
-        'title': f'Dashboard de Auditorias {ano_atual}',
+    def calcular_indicadores():
+        qs_resumos = ResumoDiarioAuditoria.objects.filter(data__year=ano_selecionado)
+        qs_instancias = AuditoriaInstancia.objects.filter(
+            data_execucao__year=ano_selecionado)
+        for chave, valor in filtros.items():
+            if valor:
+                qs_resumos = qs_resumos.filter(**{campos_filtro[chave]: valor})
+        if filtros['subsetor']:
+            qs_instancias = qs_instancias.filter(local_execucao_id=filtros['subsetor'])
+        if filtros['ferramenta']:
+            qs_instancias = qs_instancias.filter(
+                auditoria_agendada__ferramenta_id=filtros['ferramenta'])
+        if filtros['categoria']:
+            qs_instancias = qs_instancias.filter(auditoria_agendada__in=Auditoria.objects.filter(
+                modelos__categoria_id=filtros['categoria']).values('pk'))
+        if filtros['responsavel']:
+            qs_instancias = qs_instancias.filter(responsavel_id=filtros['responsavel'])
+
+        # 2. KPIs Principais (uma única agregação sobre os rollups)
+        totais = qs_resumos.aggregate(
+            planejadas=Sum('planejadas'),
+            realizadas=Sum('executadas'),
+            respostas=Sum('respostas'),
+            nao_conformes=Sum('nao_conformes'),
+        )
+        total_planejadas = totais['planejadas'] or 0
+        total_realizadas = totais['realizadas'] or 0
+
+        eficiencia = 0
+        if total_planejadas > 0:
+            eficiencia = (total_realizadas / total_planejadas) * 100
+
+        # Total de Itens Não Conformes (Respostas NC em auditorias do ano)
+        total_nc = totais['nao_conformes'] or 0
+
+        # 3. Gráfico: Planejado vs Realizado por Mês (Barras Agrupadas)
+        dados_mensais = qs_resumos.annotate(
+            mes=TruncMonth('data')
+        ).values('mes').annotate(
+            planejado=Sum('planejadas'),
+            realizado=Sum('executadas')
+        ).order_by('mes')
+
+        # Jan, Fev...
+        meses_labels = [d['mes'].strftime('%b') for d in dados_mensais]
+        series_planejado = [d['planejado'] for d in dados_mensais]
+        series_realizado = [d['realizado'] for d in dados_mensais]
+
+        # 4. Gráfico: Auditorias por Local (Top 10)
+        locais_data = qs_resumos.values(
+            'local_execucao__nome'
+        ).annotate(qtd=Sum('planejadas')).order_by('-qtd')[:10]
+
+        # Limpeza de nomes (trata auditorias sem local definido ainda)
+        locais_labels = [l['local_execucao__nome'] if l['local_execucao__nome']
+                         else 'Não Definido' for l in locais_data]
+        locais_series = [l['qtd'] for l in locais_data]
+
+        # 5. Gráfico: Conformidade Geral (Pizza)
+        total_respostas = totais['respostas'] or 0
+        total_respostas_nc = total_nc
+
+        total_conforme = total_respostas - total_respostas_nc
+
+        # Evita gráfico vazio
+        if total_respostas == 0:
+            series_conformidade = [0, 0]
+        else:
+            series_conformidade = [total_conforme, total_respostas_nc]
 
-        # KPIs
-        'kpi_realizadas': total_realizadas,
-        'kpi_planejadas': total_planejadas,
-        'kpi_eficiencia': f"{eficiencia:.1f}".replace('.', ','),
-        'kpi_nc': total_nc,
+        # 6. Tabela: Próximas Auditorias (Agenda)
+        proximas_auditorias = qs_instancias.filter(
+            executada=False,
+            data_execucao__gte=timezone.now().date()
+        ).select_related('responsavel', 'local_execucao',
+                         'auditoria_agendada__ferramenta').order_by('data_execucao')[:5]
+
+        # Anos disponíveis para o seletor
+        limites = ResumoDiarioAuditoria.objects.aggregate(
+            primeiro=Min('data'), ultimo=Max('data'))
+        primeiro_ano = limites['primeiro'].year if limites['primeiro'] else ano_atual
+        ultimo_ano = limites['ultimo'].year if limites['ultimo'] else ano_atual
+        anos_disponiveis = list(range(
+            max(ultimo_ano, ano_atual, ano_selecionado),
+            min(primeiro_ano, ano_atual, ano_selecionado) - 1, -1))
+
+        return {
+            'anos_disponiveis': anos_disponiveis,
+
+            # KPIs
+            'kpi_realizadas': total_realizadas,
+            'kpi_planejadas': total_planejadas,
+            'kpi_eficiencia': f"{eficiencia:.1f}".replace('.', ','),
+            'kpi_nc': total_nc,
+
+            # Listas
+            'proximas_auditorias': list(proximas_auditorias),
+
+            # Dados Gráficos
+            'chart_meses_labels': json.dumps(meses_labels),
+            'chart_series_planejado': json.dumps(series_planejado),
+            'chart_series_realizado': json.dumps(series_realizado),
+
+            'chart_locais_labels': json.dumps(locais_labels),
+            'chart_locais_series': json.dumps(locais_series),
+
+            'chart_conformidade_series': json.dumps(series_conformidade),
+        }
 
-        # Listas
-        'proximas_auditorias': proximas_auditorias,
+    # Indicadores em cache por ano + filtros; invalidados pelas alterações
+    # nas execuções, respostas e rollups (ver core.cache)
+    chave_cache = 'dashboard:{}:{subsetor}:{ferramenta}:{categoria}:{responsavel}'.format(
+        ano_selecionado, **filtros)
+    indicadores = obter_ou_calcular('auditorias', chave_cache, calcular_indicadores)
 
-        # Dados Gráficos
-        'chart_meses_labels': json.dumps(meses_labels),
-        'chart_series_planejado': json.dumps(series_planejado),
-        'chart_series_realizado': json.dumps(series_realizado),
+    context = {
+        'title': f'Dashboard de Auditorias {ano_selecionado}',
 
-        'chart_locais_labels': json.dumps(locais_labels),
-        'chart_locais_series': json.dumps(locais_series),
+        # Filtros
+        'ano_selecionado': ano_selecionado,
+        'filtros': filtros,
+        'subsetores': SubSetor.objects.filter(ativo=True),
+        'ferramentas': FerramentaDigital.objects.all(),
+        'categorias': CategoriaAuditoria.objects.filter(ativo=True),
+        'usuarios': Usuario.objects.filter(is_active=True),
 
-        'chart_conformidade_series': json.dumps(series_conformidade),
+        **indicadores,
     }
 
     return render(request, 'auditorias/dashboard.html', context)
@@ -355,6 +449,7 @@ def criar_categoria_auditoria(request):
         dias_quarentena = request.POST.get('dias_para_quarentena')
         if not dias_quarentena:
             dias_quarentena = 7
+        semanas_horizonte = request.POST.get('semanas_horizonte') or None
 
         if pilar_id and descricao:
             try:
@@ -363,7 +458,8 @@ def criar_categoria_auditoria(request):
                     pilar=pilar,
                     descricao=descricao,
                     ativo=ativo,
-                    dias_para_quarentena=dias_quarentena
+                    dias_para_quarentena=dias_quarentena,
+                    semanas_horizonte=semanas_horizonte
                 )
                 messages.success(request, 'Categoria criada com sucesso!')
                 return redirect('auditorias:lista_categorias_auditoria')
@@ -394,6 +490,10 @@ def editar_categoria_auditoria(request, pk):
         if dias_quarentena:
             categoria.dias_para_quarentena = int(dias_quarentena)
 
+        semanas_horizonte = request.POST.get('semanas_horizonte')
+        categoria.semanas_horizonte = int(
+            semanas_horizonte) if semanas_horizonte else None
+
         if pilar_id:
             categoria.pilar = Pilar.objects.get(pk=pilar_id)
 
@@ -775,6 +875,7 @@ def criar_checklist(request):
 
                 # Processar tópicos e perguntas
                 processar_estrutura_checklist(request, checklist)
+                ChecklistSerializado.gerar_para(checklist)
 
                 messages.success(request, 'Checklist criado com sucesso!')
                 return redirect('auditorias:lista_checklists')
@@ -840,56 +941,58 @@ def _create_new_version_from_request(request, checklist_original):
                 'ordem': request.POST.get(f'topico-ordem[{topico_id_form}]', 0)
             }
 
-    for topico_id_form, topico_info in topicos_data.items():
-        novo_topico = Topico.objects.create(
-            checklist=nova_versao,
-            descricao=topico_info['descricao'],
-            ordem=int(topico_info['ordem']) if topico_info['ordem'] else 0
-        )
-
-        for key in request.POST:
-            if key.startswith(f'pergunta-descricao[{topico_id_form}-'):
-                pergunta_id_full = key.split('[')[1].split(']')[0]
-                nova_pergunta = Pergunta.objects.create(
-                    topico=novo_topico,
-                    descricao=request.POST.get(key),
-                    ordem=int(request.POST.get(
-                        f'pergunta-ordem[{pergunta_id_full}]', 0)),
-                    obrigatoria=request.POST.get(
-                        f'pergunta-obrigatorio[{pergunta_id_full}]') == 'on',
-                    resposta_livre=request.POST.get(
-                        f'pergunta-resposta_livre[{pergunta_id_full}]') == 'on',
-                    foto=request.POST.get(
-                        f'pergunta-foto[{pergunta_id_full}]') == 'on',
-                    criar_opcao=request.POST.get(
-                        f'pergunta-criar_opcao[{pergunta_id_full}]') == 'on',
-                    porcentagem=request.POST.get(
-                        f'pergunta-porcentagem[{pergunta_id_full}]') == 'on'
-                )
+    # Contagens e JSON serializado são recalculados uma única vez ao final
+    with estrutura_em_lote(nova_versao):
+        for topico_id_form, topico_info in topicos_data.items():
+            novo_topico = Topico.objects.create(
+                checklist=nova_versao,
+                descricao=topico_info['descricao'],
+                ordem=int(topico_info['ordem']) if topico_info['ordem'] else 0
+            )
 
-                for opt_key in request.POST:
-                    if opt_key.startswith(f'opcao-resposta-descricao[{pergunta_id_full}-'):
-                        opt_id_full = opt_key.split('[')[1].split(']')[
-                            0]
-                        OpcaoResposta.objects.create(
-                            pergunta=nova_pergunta,
-                            descricao=request.POST.get(opt_key),
-                            status=request.POST.get(
-                                f'opcao-resposta-status[{opt_id_full}]', 'CONFORME')
-                        )
-
-                for opt_key in request.POST:
-                    if opt_key.startswith(f'opcao-porcentagem-descricao[{pergunta_id_full}-'):
-                        opt_id_full = opt_key.split('[')[1].split(']')[
-                            0]
-                        OpcaoPorcentagem.objects.create(
-                            pergunta=nova_pergunta,
-                            descricao=request.POST.get(opt_key),
-                            peso=int(request.POST.get(
-                                f'opcao-porcentagem-peso[{opt_id_full}]', 0)),
-                            cor=request.POST.get(
-                                f'opcao-porcentagem-cor[{opt_id_full}]', '#FFFFFF')
-                        )
+            for key in request.POST:
+                if key.startswith(f'pergunta-descricao[{topico_id_form}-'):
+                    pergunta_id_full = key.split('[')[1].split(']')[0]
+                    nova_pergunta = Pergunta.objects.create(
+                        topico=novo_topico,
+                        descricao=request.POST.get(key),
+                        ordem=int(request.POST.get(
+                            f'pergunta-ordem[{pergunta_id_full}]', 0)),
+                        obrigatoria=request.POST.get(
+                            f'pergunta-obrigatorio[{pergunta_id_full}]') == 'on',
+                        resposta_livre=request.POST.get(
+                            f'pergunta-resposta_livre[{pergunta_id_full}]') == 'on',
+                        foto=request.POST.get(
+                            f'pergunta-foto[{pergunta_id_full}]') == 'on',
+                        criar_opcao=request.POST.get(
+                            f'pergunta-criar_opcao[{pergunta_id_full}]') == 'on',
+                        porcentagem=request.POST.get(
+                            f'pergunta-porcentagem[{pergunta_id_full}]') == 'on'
+                    )
+
+                    for opt_key in request.POST:
+                        if opt_key.startswith(f'opcao-resposta-descricao[{pergunta_id_full}-'):
+                            opt_id_full = opt_key.split('[')[1].split(']')[
+                                0]
+                            OpcaoResposta.objects.create(
+                                pergunta=nova_pergunta,
+                                descricao=request.POST.get(opt_key),
+                                status=request.POST.get(
+                                    f'opcao-resposta-status[{opt_id_full}]', 'CONFORME')
+                            )
+
+                    for opt_key in request.POST:
+                        if opt_key.startswith(f'opcao-porcentagem-descricao[{pergunta_id_full}-'):
+                            opt_id_full = opt_key.split('[')[1].split(']')[
+                                0]
+                            OpcaoPorcentagem.objects.create(
+                                pergunta=nova_pergunta,
+                                descricao=request.POST.get(opt_key),
+                                peso=int(request.POST.get(
+                                    f'opcao-porcentagem-peso[{opt_id_full}]', 0)),
+                                cor=request.POST.get(
+                                    f'opcao-porcentagem-cor[{opt_id_full}]', '#FFFFFF')
+                            )
 
     return nova_versao
 
@@ -918,6 +1021,7 @@ def editar_checklist(request, pk):
                 # 2. Cria a nova versão (a função interna agora calcula o número da versão corretamente).
                 novo_checklist = _create_new_version_from_request(
                     request, checklist_a_ser_editado)
+                ChecklistSerializado.gerar_para(novo_checklist)
 
                 # 3. Desativa a versão que ERA a mais recente, marcando-a como 'is_latest=False'.
                 if versao_mais_recente_anterior:
@@ -940,7 +1044,8 @@ def editar_checklist(request, pk):
                             auditoria_agendada__modelos__id__in=modelos_afetados_ids,
                             executada=False,
                             data_execucao__gt=timezone.now().date()
-                        ).update(checklist_usado=novo_checklist)
+                        ).update(checklist_usado=novo_checklist,
+                                 data_atualizacao=timezone.now())
 
                 messages.success(
                     request, f'Checklist "{novo_checklist.nome}" atualizado para a versão {novo_checklist.version} com sucesso!')
@@ -968,17 +1073,12 @@ def editar_checklist(request, pk):
 # from .models import AuditoriaInstancia, Checklist, SubSetor, Topico, Pergunta, OpcaoResposta, OpcaoPorcentagem
 
 
-def _gerar_instancias_para_auditoria(auditoria, subsetores_selecionados_ids=None):
+def _calcular_slots_da_auditoria(auditoria, subsetores_selecionados_ids=None):
     """
-    Função ATUALIZADA para gerar instâncias com base na nova lógica de agendamento.
+    Calcula os slots (data, local_id, turno_id, repetição) previstos pelo
+    agendamento e o checklist que as instâncias devem usar.
     """
-    # 1. Apaga todas as instâncias futuras que ainda não foram executadas
-    auditoria.instancias.filter(
-        executada=False,
-        data_execucao__gte=timezone.now().date()
-    ).delete()
-
-    # 2. Busca o checklist mais recente a ser usado
+    # 1. Busca o checklist mais recente a ser usado
     primeiro_modelo = auditoria.modelos.first()
     checklist_para_usar = None
     if primeiro_modelo and primeiro_modelo.checklist:
@@ -989,218 +1089,479 @@ def _gerar_instancias_para_auditoria(auditoria, subsetores_selecionados_ids=None
             is_latest=True
         ).first()
 
-    # 3. Lógica para gerar a lista de datas
-    dates_to_create = []
-    if auditoria.data_inicio:
-        current_date = auditoria.data_inicio
-        end_date = auditoria.data_fim
-        if not end_date:
-            if not (auditoria.pular_finais_semana and current_date.weekday() >= 5):
-                dates_to_create.append(current_date)
-        else:
-            loop_limit = 365 * 5
-            loops = 0
-            while current_date <= end_date and loops < loop_limit:
-                loops += 1
-                if not (auditoria.pular_finais_semana and current_date.weekday() >= 5):
-                    dates_to_create.append(current_date)
-                if auditoria.por_intervalo and auditoria.intervalo:
-                    current_date += timedelta(days=auditoria.intervalo + 1)
-                elif auditoria.por_frequencia and auditoria.frequencia:
-                    # ... lógica de frequência ...
-                    if auditoria.frequencia == 'DIARIO':
-                        current_date += timedelta(days=1)
-                    elif auditoria.frequencia == 'SEMANAL':
-                        current_date += timedelta(weeks=1)
-                    elif auditoria.frequencia == 'QUINZENAL':
-                        current_date += timedelta(weeks=2)
-                    elif auditoria.frequencia == 'MENSAL':
-                        current_date += relativedelta(months=1)
-                    elif auditoria.frequencia == 'ANUAL':
-                        current_date += relativedelta(years=1)
-                    else:
-                        break
-                else:
-                    break
+    # 2. Gera a lista de datas com o motor de recorrência compartilhado
+    dates_to_create = datas_do_agendamento(auditoria)
+
+    # 3. Determina os locais (IDs de subsetor) e turnos
+    if auditoria.agendamento_especifico and subsetores_selecionados_ids:
+        # Descarta IDs de subsetores que não existem mais
+        subsetores_selecionados_ids = list(SubSetor.objects.filter(
+            pk__in=subsetores_selecionados_ids).values_list('pk', flat=True))
+    target_locations = _locais_do_agendamento(
+        auditoria, subsetores_selecionados_ids)
+    target_turnos = _turnos_do_agendamento(
+        auditoria.turnos.prefetch_related('turnodetalhedia_set'))
+
+    repetitions = auditoria.numero_repeticoes if auditoria.numero_repeticoes and auditoria.numero_repeticoes > 0 else 1
 
-    # 4. Determina os locais e turnos
+    slots = expandir_ocorrencias(
+        dates_to_create, target_locations, target_turnos, repetitions)
+    return slots, checklist_para_usar
+
+
+def _locais_do_agendamento(auditoria, subsetores_selecionados_ids=None):
+    """Locais (IDs de subsetor, ou None para local livre) de um agendamento."""
     target_locations = []
 
     if auditoria.agendamento_especifico:
         # CENÁRIO 2: Locais Específicos. Usa a lista de IDs recebida.
         if subsetores_selecionados_ids:
-            target_locations = list(SubSetor.objects.filter(
-                pk__in=subsetores_selecionados_ids))
+            target_locations = list(subsetores_selecionados_ids)
     else:
         # CENÁRIO 1: Auditoria de Gestão ("Flutuante").
         # Se o nível NÃO for Subsetor, criamos uma instância sem local definido.
         if auditoria.nivel_organizacional != 'SUBSETOR':
             # O 'None' indica que o local será escolhido no app
             target_locations.append(None)
-        elif auditoria.local_subsetor:
+        elif auditoria.local_subsetor_id:
             # Caso especial: se o nível for Subsetor, o agendamento é para aquele local.
-            target_locations.append(auditoria.local_subsetor)
+            target_locations.append(auditoria.local_subsetor_id)
 
     # Garante que não falhe se nenhuma localização for encontrada
     if not target_locations:
         target_locations.append(None)
+    return target_locations
 
-    target_turnos = list(auditoria.turnos.all())
+
+def _turnos_do_agendamento(turnos):
+    """
+    Pares (turno, bitmask dos dias de trabalho) dos turnos do agendamento.
+    Os turnos devem vir com `turnodetalhedia_set` pré-carregado.
+    """
+    target_turnos = [
+        (turno.pk, mascara_dias_semana(
+            detalhe.dia_semana for detalhe in turno.turnodetalhedia_set.all()))
+        for turno in turnos
+    ]
     if not target_turnos:
-        target_turnos.append(None)
+        target_turnos.append((None, TODOS_OS_DIAS))
+    return target_turnos
 
-    repetitions = auditoria.numero_repeticoes if auditoria.numero_repeticoes and auditoria.numero_repeticoes > 0 else 1
 
-    # 5. Cria as novas instâncias (lógica inalterada)
-    instancias_a_criar = []
-    for dt in dates_to_create:
-        for location in target_locations:
-            for turno in target_turnos:
-                if turno and not turno.turnodetalhedia_set.filter(dia_semana=dt.weekday()).exists():
-                    continue
-                for _ in range(repetitions):
-                    instancias_a_criar.append(AuditoriaInstancia(
-                        auditoria_agendada=auditoria,
-                        data_execucao=dt,
-                        local_execucao=location,
-                        responsavel=auditoria.responsavel,
-                        turno=turno,
-                        checklist_usado=checklist_para_usar
-                    ))
-
-    if instancias_a_criar:
-        AuditoriaInstancia.objects.bulk_create(instancias_a_criar)
+def _limite_horizonte_da_auditoria(auditoria, hoje):
+    """
+    Data até a qual as instâncias da auditoria ficam gravadas no modo de
+    horizonte rolante (None quando tudo deve ser materializado).
+    """
+    primeiro_modelo = auditoria.modelos.select_related('categoria').first()
+    categoria = primeiro_modelo.categoria if primeiro_modelo else None
+    limite = limite_do_horizonte(semanas_de_horizonte(categoria), hoje)
+    if limite and auditoria.data_fim and limite >= auditoria.data_fim:
+        # O horizonte já cobre o agendamento inteiro
+        return None
+    return limite
+
+
+def _marcar_materializado_ate(auditoria, limite):
+    """Registra até onde as instâncias foram gravadas, sem disparar o save()."""
+    auditoria.materializado_ate = limite
+    Auditoria.objects.filter(pk=auditoria.pk).update(materializado_ate=limite)
+
+
+def _subsetores_do_agendamento(auditoria):
+    """
+    Subsetores usados por um agendamento específico. Agendamentos criados
+    antes de a seleção ser gravada usam os locais das instâncias existentes.
+    """
+    ids = list(auditoria.subsetores_especificos.values_list('pk', flat=True))
+    if not ids and auditoria.agendamento_especifico:
+        ids = list(auditoria.instancias.filter(
+            local_execucao__isnull=False
+        ).values_list('local_execucao_id', flat=True).distinct())
+    return ids
+
+
+def _criar_instancias_em_lotes(auditoria, slots, checklist_para_usar):
+    """Monta as instâncias em memória e grava em lotes de tamanho fixo."""
+    # bulk_create não passa pelo save(): prazo e status são calculados aqui,
+    # uma única vez por data
+    hoje = timezone.now().date()
+    prazos = {}
+    for dt, _, _, _ in slots:
+        if dt not in prazos:
+            data_limite = data_limite_da_execucao(dt, auditoria)
+            prazos[dt] = (data_limite,
+                          status_da_execucao(False, dt, data_limite, hoje))
+
+    for inicio in range(0, len(slots), TAMANHO_LOTE_INSTANCIAS):
+        AuditoriaInstancia.objects.bulk_create([
+            AuditoriaInstancia(
+                auditoria_agendada=auditoria,
+                data_execucao=dt,
+                local_execucao_id=location,
+                responsavel_id=auditoria.responsavel_id,
+                turno_id=turno_id,
+                checklist_usado=checklist_para_usar,
+                data_limite=prazos[dt][0],
+                status_execucao=prazos[dt][1]
+            )
+            for dt, location, turno_id, _ in slots[inicio:inicio + TAMANHO_LOTE_INSTANCIAS]
+        ])
+
+
+def _recalcular_prazos_da_auditoria(auditoria):
+    """
+    Recalcula a data limite e o status das execuções abertas de um agendamento
+    (a frequência ou o intervalo podem ter mudado na edição).
+    Retorna a quantidade de execuções alteradas.
+    """
+    agora = timezone.now()
+    hoje = agora.date()
+    alteradas = []
+    for instancia in auditoria.instancias.filter(executada=False).only(
+            'id', 'data_execucao', 'data_limite', 'status_execucao', 'executada'):
+        data_limite = data_limite_da_execucao(instancia.data_execucao, auditoria)
+        status_execucao = status_da_execucao(
+            False, instancia.data_execucao, data_limite, hoje)
+        if (instancia.data_limite, instancia.status_execucao) != (data_limite, status_execucao):
+            instancia.data_limite = data_limite
+            instancia.status_execucao = status_execucao
+            instancia.data_atualizacao = agora
+            alteradas.append(instancia)
+    AuditoriaInstancia.objects.bulk_update(
+        alteradas, ['data_limite', 'status_execucao', 'data_atualizacao'],
+        batch_size=TAMANHO_LOTE_INSTANCIAS)
+    return len(alteradas)
+
+
+def _atualizar_resumos_dos_dias(dias):
+    """Recalcula os rollups diários do dashboard apenas nos dias informados."""
+    ResumoDiarioAuditoria.recalcular_dias(dias)
+
+
+def _dias_das_instancias(instancias):
+    """Dias distintos das execuções do queryset (para recalcular os rollups)."""
+    return set(instancias.order_by().values_list('data_execucao', flat=True).distinct())
+
+
+def _gerar_instancias_para_auditoria(auditoria, subsetores_selecionados_ids=None):
+    """
+    Função ATUALIZADA para gerar instâncias com base na nova lógica de agendamento.
+    """
+    # 1. Apaga todas as instâncias futuras que ainda não foram executadas
+    futuras = auditoria.instancias.filter(
+        executada=False,
+        data_execucao__gte=timezone.now().date()
+    )
+    dias_afetados = _dias_das_instancias(futuras)
+    futuras.excluir()
+
+    # 2. Calcula os slots e cria as novas instâncias (no modo de horizonte
+    # rolante, apenas as que caem dentro da janela)
+    slots, checklist_para_usar = _calcular_slots_da_auditoria(
+        auditoria, subsetores_selecionados_ids)
+    limite = _limite_horizonte_da_auditoria(auditoria, timezone.now().date())
+    if limite:
+        slots = [slot for slot in slots if slot[0] <= limite]
+    _criar_instancias_em_lotes(auditoria, slots, checklist_para_usar)
+    _marcar_materializado_ate(auditoria, limite)
+    _atualizar_resumos_dos_dias(dias_afetados | {slot[0] for slot in slots})
+
+
+def _reconciliar_instancias_da_auditoria(auditoria, subsetores_selecionados_ids=None):
+    """
+    Modo incremental usado na edição: compara os slots futuros previstos com as
+    instâncias existentes e só insere, apaga ou atualiza o que mudou, mantendo
+    os IDs das instâncias que continuam válidas (o app mobile guarda esses IDs).
+
+    Instâncias executadas nunca são alteradas, mas continuam ocupando o seu slot.
+    Retorna a quantidade de linhas criadas, removidas e atualizadas e os dias
+    em que houve mudança (para os rollups).
+    """
+    hoje = timezone.now().date()
+    slots, checklist_para_usar = _calcular_slots_da_auditoria(
+        auditoria, subsetores_selecionados_ids)
+    checklist_id = checklist_para_usar.pk if checklist_para_usar else None
+
+    # Slots alvo (somente a partir de hoje; o passado não é reescrito).
+    # No modo de horizonte rolante, apenas os que caem dentro da janela.
+    limite = _limite_horizonte_da_auditoria(auditoria, hoje)
+    alvo = dict.fromkeys(
+        slot for slot in slots
+        if slot[0] >= hoje and (limite is None or slot[0] <= limite))
+
+    existentes = auditoria.instancias.filter(
+        data_execucao__gte=hoje
+    ).only(
+        'id', 'data_execucao', 'local_execucao_id', 'turno_id',
+        'responsavel_id', 'checklist_usado_id', 'executada'
+    ).order_by('pk')
+
+    # As linhas existentes não guardam a repetição: ela é o índice da linha
+    # dentro do grupo (data, local, turno), em ordem de criação.
+    repeticoes_vistas = {}
+    ids_a_remover = []
+    dias_alterados = set()
+    instancias_a_atualizar = []
+    redirecionadas = []
+    agora = timezone.now()
+    for instancia in existentes:
+        grupo = (instancia.data_execucao,
+                 instancia.local_execucao_id, instancia.turno_id)
+        repeticao = repeticoes_vistas.get(grupo, 0)
+        repeticoes_vistas[grupo] = repeticao + 1
+
+        if grupo + (repeticao,) in alvo:
+            del alvo[grupo + (repeticao,)]
+            if instancia.executada:
+                continue
+            if (instancia.responsavel_id != auditoria.responsavel_id
+                    or instancia.checklist_usado_id != checklist_id):
+                if instancia.responsavel_id != auditoria.responsavel_id:
+                    redirecionadas.append((instancia.pk, instancia.responsavel_id))
+                    dias_alterados.add(instancia.data_execucao)
+                instancia.responsavel_id = auditoria.responsavel_id
+                instancia.checklist_usado_id = checklist_id
+                instancia.data_atualizacao = agora
+                instancias_a_atualizar.append(instancia)
+        elif not instancia.executada:
+            ids_a_remover.append(instancia.pk)
+            dias_alterados.add(instancia.data_execucao)
+
+    for inicio in range(0, len(ids_a_remover), TAMANHO_LOTE_INSTANCIAS):
+        AuditoriaInstancia.objects.filter(
+            pk__in=ids_a_remover[inicio:inicio + TAMANHO_LOTE_INSTANCIAS]
+        ).excluir()
+
+    if instancias_a_atualizar:
+        AuditoriaInstancia.objects.bulk_update(
+            instancias_a_atualizar,
+            ['responsavel', 'checklist_usado', 'data_atualizacao'],
+            batch_size=TAMANHO_LOTE_INSTANCIAS
+        )
+        RemocaoInstancia.registrar(redirecionadas, 'REDIRECIONADA')
+
+    _criar_instancias_em_lotes(auditoria, list(alvo), checklist_para_usar)
+    _marcar_materializado_ate(auditoria, limite)
+    dias_alterados.update(slot[0] for slot in alvo)
+
+    return {
+        'criadas': len(alvo),
+        'removidas': len(ids_a_remover),
+        'atualizadas': len(instancias_a_atualizar),
+        'dias': dias_alterados,
+    }
+
+
+def _estender_horizonte_da_auditoria(auditoria, hoje):
+    """
+    Grava as instâncias que entraram no horizonte rolante desde a última
+    execução. Idempotente: só cria slots posteriores a `materializado_ate`.
+    Retorna a quantidade de instâncias criadas.
+    """
+    inicio_pendente = auditoria.materializado_ate
+    limite = _limite_horizonte_da_auditoria(auditoria, hoje)
+    data_final = limite or auditoria.data_fim
+    if inicio_pendente is None or data_final is None or data_final <= inicio_pendente:
+        return 0
+
+    slots, checklist_para_usar = _calcular_slots_da_auditoria(
+        auditoria, _subsetores_do_agendamento(auditoria))
+    novos = [slot for slot in slots
+             if inicio_pendente < slot[0] <= data_final and slot[0] >= hoje]
+    _criar_instancias_em_lotes(auditoria, novos, checklist_para_usar)
+    _marcar_materializado_ate(auditoria, limite)
+    _atualizar_resumos_dos_dias(slot[0] for slot in novos)
+    return len(novos)
+
+
+def _ocorrencias_virtuais(data_inicial, data_final, auditorias=None, subsetor_id=None):
+    """
+    Ocorrências além do horizonte materializado, calculadas na hora e não
+    gravadas no banco. Retorna uma lista de (data, auditoria).
+    `auditorias` e `subsetor_id` restringem os agendamentos e o local.
+
+    Só as datas dentro de [data_inicial, data_final] são expandidas, e os
+    turnos e subsetores de todas as auditorias são carregados de uma vez.
+    """
+    if auditorias is None:
+        auditorias = Auditoria.objects.all()
+    auditorias = list(auditorias.filter(
+        materializado_ate__isnull=False,
+        materializado_ate__lt=data_final,
+        data_fim__gt=F('materializado_ate'),
+        data_fim__gte=data_inicial,
+    ).distinct().prefetch_related(
+        'turnos__turnodetalhedia_set', 'subsetores_especificos'))
+
+    # Agendamentos específicos sem seleção gravada: locais das instâncias,
+    # buscados em uma única consulta
+    locais_das_instancias = {}
+    sem_selecao = [
+        auditoria.pk for auditoria in auditorias
+        if auditoria.agendamento_especifico
+        and not auditoria.subsetores_especificos.all()
+    ]
+    if sem_selecao:
+        for auditoria_id, local_id in AuditoriaInstancia.objects.filter(
+            auditoria_agendada_id__in=sem_selecao, local_execucao__isnull=False
+        ).order_by().values_list('auditoria_agendada_id', 'local_execucao_id').distinct():
+            locais_das_instancias.setdefault(auditoria_id, []).append(local_id)
+
+    ocorrencias = []
+    for auditoria in auditorias:
+        inicio = max(data_inicial, auditoria.materializado_ate + timedelta(days=1))
+        # A série completa é só aritmética; a expansão fica restrita à janela
+        datas = datas_do_agendamento(auditoria)
+        datas = datas[bisect_left(datas, inicio):bisect_right(datas, data_final)]
+        if not datas:
+            continue
+        subsetores_ids = [
+            subsetor.pk for subsetor in auditoria.subsetores_especificos.all()
+        ] or locais_das_instancias.get(auditoria.pk, [])
+        locais = _locais_do_agendamento(auditoria, subsetores_ids)
+        if subsetor_id is not None:
+            locais = [local for local in locais if local == subsetor_id]
+            if not locais:
+                continue
+        repeticoes = auditoria.numero_repeticoes if auditoria.numero_repeticoes and auditoria.numero_repeticoes > 0 else 1
+        slots = expandir_ocorrencias(
+            datas, locais, _turnos_do_agendamento(auditoria.turnos.all()),
+            repeticoes)
+        ocorrencias.extend((slot[0], auditoria) for slot in slots)
+    return ocorrencias
 
 
 def processar_estrutura_checklist(request, checklist):
     """Processa e salva toda a estrutura de tópicos, perguntas e opções do checklist."""
-    topicos_ids_processados = set()
-    perguntas_ids_processadas = set()
-    opcoes_resposta_ids_processadas = set()
-    opcoes_porcentagem_ids_processadas = set()
+    with estrutura_em_lote(checklist):
+        topicos_ids_processados = set()
+        perguntas_ids_processadas = set()
+        opcoes_resposta_ids_processadas = set()
+        opcoes_porcentagem_ids_processadas = set()
+
+        for key, value in request.POST.items():
+            if key.startswith('topico-descricao['):
+                topico_id_str = key.split('[')[1].split(']')[0]
+                topico_descricao = value
+                topico_ordem = request.POST.get(
+                    f'topico-ordem[{topico_id_str}]', 0)
+
+                if topico_id_str.startswith('new-'):
+                    topico = Topico.objects.create(
+                        checklist=checklist, descricao=topico_descricao, ordem=topico_ordem)
+                else:
+                    topico = get_object_or_404(Topico, pk=int(
+                        topico_id_str), checklist=checklist)
+                    topico.descricao = topico_descricao
+                    topico.ordem = topico_ordem
+                    topico.save()
+                topicos_ids_processados.add(topico.id)
+
+                # Processar perguntas deste tópico
+                for p_key, p_value in request.POST.items():
+                    if p_key.startswith(f'pergunta-descricao[{topico_id_str}-'):
+                        pergunta_id_full = p_key.split('[')[1].split(']')[0]
+                        pergunta_id_str = pergunta_id_full.replace(
+                            f'{topico_id_str}-', '')
+
+                        pergunta_descricao = p_value
+                        pergunta_ordem = request.POST.get(
+                            f'pergunta-ordem[{pergunta_id_full}]', 0)
+
+                        if pergunta_id_str.startswith('new-'):
+                            pergunta = Pergunta.objects.create(
+                                topico=topico, descricao=pergunta_descricao, ordem=pergunta_ordem)
+                        else:
+                            pergunta = get_object_or_404(
+                                Pergunta, pk=int(pergunta_id_str), topico=topico)
+                            pergunta.descricao = pergunta_descricao
+                            pergunta.ordem = pergunta_ordem
+
+                        pergunta.obrigatoria = request.POST.get(
+                            f'pergunta-obrigatorio[{pergunta_id_full}]') == 'on'
+                        pergunta.resposta_livre = request.POST.get(
+                            f'pergunta-resposta_livre[{pergunta_id_full}]') == 'on'
+                        pergunta.foto = request.POST.get(
+                            f'pergunta-foto[{pergunta_id_full}]') == 'on'
+                        pergunta.criar_opcao = request.POST.get(
+                            f'pergunta-criar_opcao[{pergunta_id_full}]') == 'on'
+                        pergunta.porcentagem = request.POST.get(
+                            f'pergunta-porcentagem[{pergunta_id_full}]') == 'on'
+                        pergunta.save()
+                        perguntas_ids_processadas.add(pergunta.id)
+
+                        # Processar opções de resposta
+                        for o_key, o_value in request.POST.items():
+                            if o_key.startswith(f'opcao-resposta-descricao[{pergunta_id_full}-'):
+                                opcao_id_full = o_key.split('[')[1].split(']')[0]
+                                opcao_id_str = opcao_id_full.replace(
+                                    f'{pergunta_id_full}-', '')
+
+                                if opcao_id_str.startswith('new-'):
+                                    opcao = OpcaoResposta.objects.create(
+                                        pergunta=pergunta)
+                                else:
+                                    opcao = get_object_or_404(OpcaoResposta, pk=int(
+                                        opcao_id_str), pergunta=pergunta)
 
-    for key, value in request.POST.items():
-        if key.startswith('topico-descricao['):
-            topico_id_str = key.split('[')[1].split(']')[0]
-            topico_descricao = value
-            topico_ordem = request.POST.get(
-                f'topico-ordem[{topico_id_str}]', 0)
-
-            if topico_id_str.startswith('new-'):
-                topico = Topico.objects.create(
-                    checklist=checklist, descricao=topico_descricao, ordem=topico_ordem)
-            else:
-                topico = get_object_or_404(Topico, pk=int(
-                    topico_id_str), checklist=checklist)
-                topico.descricao = topico_descricao
-                topico.ordem = topico_ordem
-                topico.save()
-            topicos_ids_processados.add(topico.id)
-
-            # Processar perguntas deste tópico
-            for p_key, p_value in request.POST.items():
-                if p_key.startswith(f'pergunta-descricao[{topico_id_str}-'):
-                    pergunta_id_full = p_key.split('[')[1].split(']')[0]
-                    pergunta_id_str = pergunta_id_full.replace(
-                        f'{topico_id_str}-', '')
-
-                    pergunta_descricao = p_value
-                    pergunta_ordem = request.POST.get(
-                        f'pergunta-ordem[{pergunta_id_full}]', 0)
-
-                    if pergunta_id_str.startswith('new-'):
-                        pergunta = Pergunta.objects.create(
-                            topico=topico, descricao=pergunta_descricao, ordem=pergunta_ordem)
-                    else:
-                        pergunta = get_object_or_404(
-                            Pergunta, pk=int(pergunta_id_str), topico=topico)
-                        pergunta.descricao = pergunta_descricao
-                        pergunta.ordem = pergunta_ordem
-
-                    pergunta.obrigatoria = request.POST.get(
-                        f'pergunta-obrigatorio[{pergunta_id_full}]') == 'on'
-                    pergunta.resposta_livre = request.POST.get(
-                        f'pergunta-resposta_livre[{pergunta_id_full}]') == 'on'
-                    pergunta.foto = request.POST.get(
-                        f'pergunta-foto[{pergunta_id_full}]') == 'on'
-                    pergunta.criar_opcao = request.POST.get(
-                        f'pergunta-criar_opcao[{pergunta_id_full}]') == 'on'
-                    pergunta.porcentagem = request.POST.get(
-                        f'pergunta-porcentagem[{pergunta_id_full}]') == 'on'
-                    pergunta.save()
-                    perguntas_ids_processadas.add(pergunta.id)
-
-                    # Processar opções de resposta
-                    for o_key, o_value in request.POST.items():
-                        if o_key.startswith(f'opcao-resposta-descricao[{pergunta_id_full}-'):
-                            opcao_id_full = o_key.split('[')[1].split(']')[0]
-                            opcao_id_str = opcao_id_full.replace(
-                                f'{pergunta_id_full}-', '')
-
-                            if opcao_id_str.startswith('new-'):
-                                opcao = OpcaoResposta.objects.create(
-                                    pergunta=pergunta)
-                            else:
-                                opcao = get_object_or_404(OpcaoResposta, pk=int(
-                                    opcao_id_str), pergunta=pergunta)
-
-                            opcao.descricao = o_value
-                            opcao.status = request.POST.get(
-                                f'opcao-resposta-status[{opcao_id_full}]')
-                            opcao.ordem = int(request.POST.get(
-                                f'opcao-resposta-ordem[{opcao_id_full}]', 0))
-                            opcao.save()
-                            opcoes_resposta_ids_processadas.add(opcao.id)
-
-                    # Processar opções de porcentagem
-                    for o_key, o_value in request.POST.items():
-                        if o_key.startswith(f'opcao-porcentagem-descricao[{pergunta_id_full}-'):
-                            opcao_id_full = o_key.split('[')[1].split(']')[0]
-                            opcao_id_str = opcao_id_full.replace(
-                                f'{pergunta_id_full}-', '')
-
-                            # ==========================================================
-                            # INÍCIO DA CORREÇÃO
-                            # ==========================================================
-                            if opcao_id_str.startswith('new-'):
-                                # Passa todos os dados diretamente na criação
-                                opcao = OpcaoPorcentagem.objects.create(
-                                    pergunta=pergunta,
-                                    descricao=o_value,
-                                    peso=int(request.POST.get(
-                                        f'opcao-porcentagem-peso[{opcao_id_full}]', 0)),
-                                    cor=request.POST.get(
-                                        f'opcao-porcentagem-cor[{opcao_id_full}]', '#FFFFFF'),
-                                    ordem=int(request.POST.get(
-                                        f'opcao-porcentagem-ordem[{opcao_id_full}]', 0))
-                                )
-                            else:
-                                # Lógica de atualização continua a mesma
-                                opcao = get_object_or_404(OpcaoPorcentagem, pk=int(
-                                    opcao_id_str), pergunta=pergunta)
                                 opcao.descricao = o_value
-                                opcao.peso = int(request.POST.get(
-                                    f'opcao-porcentagem-peso[{opcao_id_full}]', 0))
-                                opcao.cor = request.POST.get(
-                                    f'opcao-porcentagem-cor[{opcao_id_full}]', '#FFFFFF')
+                                opcao.status = request.POST.get(
+                                    f'opcao-resposta-status[{opcao_id_full}]')
                                 opcao.ordem = int(request.POST.get(
-                                    f'opcao-porcentagem-ordem[{opcao_id_full}]', 0))
+                                    f'opcao-resposta-ordem[{opcao_id_full}]', 0))
                                 opcao.save()
-                            # ==========================================================
-                            # FIM DA CORREÇÃO
-                            # ==========================================================
+                                opcoes_resposta_ids_processadas.add(opcao.id)
+
+                        # Processar opções de porcentagem
+                        for o_key, o_value in request.POST.items():
+                            if o_key.startswith(f'opcao-porcentagem-descricao[{pergunta_id_full}-'):
+                                opcao_id_full = o_key.split('[')[1].split(']')[0]
+                                opcao_id_str = opcao_id_full.replace(
+                                    f'{pergunta_id_full}-', '')
+
+                                # ==========================================================
+                                # INÍCIO DA CORREÇÃO
+                                # ==========================================================
+                                if opcao_id_str.startswith('new-'):
+                                    # Passa todos os dados diretamente na criação
+                                    opcao = OpcaoPorcentagem.objects.create(
+                                        pergunta=pergunta,
+                                        descricao=o_value,
+                                        peso=int(request.POST.get(
+                                            f'opcao-porcentagem-peso[{opcao_id_full}]', 0)),
+                                        cor=request.POST.get(
+                                            f'opcao-porcentagem-cor[{opcao_id_full}]', '#FFFFFF'),
+                                        ordem=int(request.POST.get(
+                                            f'opcao-porcentagem-ordem[{opcao_id_full}]', 0))
+                                    )
+                                else:
+                                    # Lógica de atualização continua a mesma
+                                    opcao = get_object_or_404(OpcaoPorcentagem, pk=int(
+                                        opcao_id_str), pergunta=pergunta)
+                                    opcao.descricao = o_value
+                                    opcao.peso = int(request.POST.get(
+                                        f'opcao-porcentagem-peso[{opcao_id_full}]', 0))
+                                    opcao.cor = request.POST.get(
+                                        f'opcao-porcentagem-cor[{opcao_id_full}]', '#FFFFFF')
+                                    opcao.ordem = int(request.POST.get(
+                                        f'opcao-porcentagem-ordem[{opcao_id_full}]', 0))
+                                    opcao.save()
+                                # ==========================================================
+                                # FIM DA CORREÇÃO
+                                # ==========================================================
 
-                            opcoes_porcentagem_ids_processadas.add(opcao.id)
+                                opcoes_porcentagem_ids_processadas.add(opcao.id)
 
-    # Deletar itens que não foram processados (removidos do formulário)
-    OpcaoResposta.objects.filter(pergunta__topico__checklist=checklist).exclude(
-        id__in=opcoes_resposta_ids_processadas).delete()
-    OpcaoPorcentagem.objects.filter(pergunta__topico__checklist=checklist).exclude(
-        id__in=opcoes_porcentagem_ids_processadas).delete()
-    Pergunta.objects.filter(topico__checklist=checklist).exclude(
-        id__in=perguntas_ids_processadas).delete()
-    Topico.objects.filter(checklist=checklist).exclude(
-        id__in=topicos_ids_processados).delete()
+        # Deletar itens que não foram processados (removidos do formulário)
+        OpcaoResposta.objects.filter(pergunta__topico__checklist=checklist).exclude(
+            id__in=opcoes_resposta_ids_processadas).delete()
+        OpcaoPorcentagem.objects.filter(pergunta__topico__checklist=checklist).exclude(
+            id__in=opcoes_porcentagem_ids_processadas).delete()
+        Pergunta.objects.filter(topico__checklist=checklist).exclude(
+            id__in=perguntas_ids_processadas).delete()
+        Topico.objects.filter(checklist=checklist).exclude(
+            id__in=topicos_ids_processados).delete()
 
 
 @login_required
@@ -1233,14 +1594,11 @@ def historico_versoes_checklist(request, pk):
     # Encontra o checklist original (V1) para buscar todas as suas versões
     original = checklist_atual.original_checklist or checklist_atual
 
-    # MODIFICAÇÃO: A consulta agora 'anota' (annotate) em cada versão
-    # a contagem total de perguntas, somando as de todos os seus tópicos.
+    # A contagem total de perguntas de cada versão já vem gravada no checklist
     versoes = Checklist.objects.filter(
         Q(pk=original.pk) | Q(original_checklist=original)
     ).prefetch_related(
         'topicos'
-    ).annotate(
-        total_perguntas=Count('topicos__perguntas')
     ).order_by('-version')
 
     context = {
@@ -1325,8 +1683,8 @@ def _gerar_dados_comparacao(versoes):
             'version': v.version,
             'nome': v.nome,
             'data': v.data_cadastro,
-            'total_topicos': v.topicos.count(),
-            'total_perguntas': sum(t.perguntas.count() for t in v.topicos.all()),
+            'total_topicos': v.total_topicos,
+            'total_perguntas': v.total_perguntas,
         })
 
     # Criar estrutura de dados para cada versão
@@ -1797,6 +2155,8 @@ def criar_auditoria(request):
                 auditoria.ativos_auditados.set(
                     request.POST.getlist('ativos_auditados'))
                 auditoria.turnos.set(request.POST.getlist('turnos'))
+                auditoria.subsetores_especificos.set(
+                    subsetores_selecionados_ids if agendamento_especifico else [])
 
                 # --- CHAMA A FUNÇÃO ATUALIZADA ---
                 _gerar_instancias_para_auditoria(
@@ -1813,12 +2173,9 @@ def criar_auditoria(request):
     context = {
         'ferramentas': FerramentaDigital.objects.all(),
         'usuarios': Usuario.objects.filter(is_active=True),
+        # Áreas, setores, subsetores e ativos vêm de get_arvore_organizacional
         'empresas': Empresa.objects.filter(ativo=True),
-        'areas': Area.objects.filter(ativo=True),
-        'setores': Setor.objects.filter(ativo=True),
-        'subsetores': SubSetor.objects.filter(ativo=True),
         'modelos': ModeloAuditoria.objects.filter(ativo=True),
-        'ativos': Ativo.objects.filter(ativo=True),
         'turnos': Turno.objects.filter(ativo=True),
         'title': 'Criar Auditoria',
         'back_url': 'auditorias:lista_auditorias'
@@ -1848,6 +2205,11 @@ def editar_auditoria(request, pk):
                     return redirect('auditorias:editar_auditoria', pk=pk)
 
             with transaction.atomic():
+                # Ferramenta e modelos (categoria) entram na chave dos rollups
+                # de todas as execuções, inclusive as passadas
+                chave_rollup_anterior = (
+                    auditoria.ferramenta_id, set(auditoria.modelos.values_list('pk', flat=True)))
+
                 data_inicio_str = request.POST.get('data_inicio')
                 data_fim_str = request.POST.get('data_fim')
                 auditoria.data_inicio = datetime.strptime(
@@ -1908,12 +2270,29 @@ def editar_auditoria(request, pk):
                 auditoria.ativos_auditados.set(
                     request.POST.getlist('ativos_auditados'))
                 auditoria.turnos.set(request.POST.getlist('turnos'))
+                auditoria.subsetores_especificos.set(
+                    subsetores_selecionados_ids if agendamento_especifico else [])
 
-                # --- CHAMA A FUNÇÃO ATUALIZADA ---
-                _gerar_instancias_para_auditoria(
+                # --- RECONCILIA APENAS AS EXECUÇÕES QUE MUDARAM ---
+                alteracoes = _reconciliar_instancias_da_auditoria(
                     auditoria, subsetores_selecionados_ids)
+                # A mudança de frequência/intervalo altera o prazo das execuções abertas
+                _recalcular_prazos_da_auditoria(auditoria)
+                # Os dados do agendamento vão junto com cada execução no app
+                auditoria.instancias.marcar_alteradas()
+                chave_rollup = (
+                    auditoria.ferramenta_id, set(auditoria.modelos.values_list('pk', flat=True)))
+                if chave_rollup != chave_rollup_anterior:
+                    _atualizar_resumos_dos_dias(_dias_das_instancias(auditoria.instancias.all()))
+                else:
+                    _atualizar_resumos_dos_dias(alteracoes['dias'])
 
-            messages.success(request, 'Auditoria atualizada com sucesso!')
+            messages.success(
+                request,
+                'Auditoria atualizada com sucesso! Execuções: '
+                f"{alteracoes['criadas']} criada(s), "
+                f"{alteracoes['removidas']} removida(s), "
+                f"{alteracoes['atualizadas']} atualizada(s).")
             return redirect('auditorias:lista_auditorias')
         except Exception as e:
             messages.error(request, f'Erro ao atualizar auditoria: {repr(e)}')
@@ -1925,12 +2304,9 @@ def editar_auditoria(request, pk):
         'auditoria': auditoria,
         'ferramentas': FerramentaDigital.objects.all(),
         'usuarios': Usuario.objects.filter(is_active=True),
+        # Áreas, setores, subsetores e ativos vêm de get_arvore_organizacional
         'empresas': Empresa.objects.filter(ativo=True),
-        'areas': Area.objects.filter(ativo=True),
-        'setores': Setor.objects.filter(ativo=True),
-        'subsetores': SubSetor.objects.filter(ativo=True),
         'modelos': ModeloAuditoria.objects.filter(ativo=True),
-        'ativos': Ativo.objects.filter(ativo=True),
         'turnos': Turno.objects.filter(ativo=True),
         'title': 'Editar Auditoria',
         'back_url': 'auditorias:lista_auditorias'
@@ -1945,7 +2321,11 @@ def deletar_auditoria(request, pk):
 
     if request.method == 'POST':
         try:
-            auditoria.delete()
+            dias = _dias_das_instancias(auditoria.instancias.all())
+            with transaction.atomic():
+                auditoria.instancias.all().excluir()
+                auditoria.delete()
+            _atualizar_resumos_dos_dias(dias)
             messages.success(request, 'Auditoria deletada com sucesso!')
         except Exception as e:
             messages.error(request, f'Erro ao deletar auditoria: {repr(e)}')
@@ -1997,16 +2377,8 @@ def get_ativos_por_local(request):
 
     ativos = Ativo.objects.filter(ativo=True)
 
-    if nivel == 'EMPRESA' and local_id:
-        ativos = ativos.filter(
-            estrutura_organizacional__setor__area__empresa_id=local_id)
-    elif nivel == 'AREA' and local_id:
-        ativos = ativos.filter(
-            estrutura_organizacional__setor__area_id=local_id)
-    elif nivel == 'SETOR' and local_id:
-        ativos = ativos.filter(estrutura_organizacional__setor_id=local_id)
-    elif nivel == 'SUBSETOR' and local_id:
-        ativos = ativos.filter(estrutura_organizacional_id=local_id)
+    if nivel in CAMPO_DO_NIVEL and local_id:
+        ativos = ativos.filter(filtro_sob(nivel, local_id, 'estrutura_organizacional'))
 
     ativos_data = ativos.values('id', 'tag', 'descricao')
     return JsonResponse(list(ativos_data), safe=False)
@@ -2026,11 +2398,11 @@ def get_subsetores_por_nivel(request):
     queryset = SubSetor.objects.filter(ativo=True)
 
     if setor_id:
-        queryset = queryset.filter(setor_id=setor_id)
+        queryset = queryset.sob('SETOR', setor_id)
     elif area_id:
-        queryset = queryset.filter(setor__area_id=area_id)
+        queryset = queryset.sob('AREA', area_id)
     elif empresa_id:
-        queryset = queryset.filter(setor__area__empresa_id=empresa_id)
+        queryset = queryset.sob('EMPRESA', empresa_id)
     else:
         # Se nenhum ID for fornecido, retorna uma lista vazia
         queryset = queryset.none()
@@ -2040,6 +2412,118 @@ def get_subsetores_por_nivel(request):
 # --- FIM DA NOVA VIEW ---
 
 
+# Modelos cuja última alteração (e quantidade de registros) versiona a árvore
+MODELOS_ARVORE_ORGANIZACIONAL = (Empresa, Area, Setor, SubSetor, Ativo)
+
+
+def _versao_arvore_organizacional():
+    """
+    Versão da árvore organizacional: a maior data_atualizacao e a quantidade
+    de registros de cada modelo (a quantidade cobre as exclusões, que não
+    alteram a data). Os nomes dos responsáveis também vão na árvore e Usuario
+    não tem data de alteração: entram a quantidade de responsáveis e um hash
+    dos nomes exibidos. Devolve (versao, ultima_modificacao).
+    """
+    partes = []
+    ultima_modificacao = None
+    for modelo in MODELOS_ARVORE_ORGANIZACIONAL:
+        resumo = modelo.objects.aggregate(
+            ultima=Max('data_atualizacao'), total=Count('id'))
+        ultima = resumo['ultima']
+        partes.append(f"{ultima.timestamp() if ultima else 0}:{resumo['total']}")
+        if ultima and (ultima_modificacao is None or ultima > ultima_modificacao):
+            ultima_modificacao = ultima
+
+    responsaveis = list(Usuario.objects.filter(
+        Q(pk__in=Empresa.objects.values('usuario_responsavel'))
+        | Q(pk__in=Area.objects.values('usuario_responsavel'))
+        | Q(pk__in=Setor.objects.values('usuario_responsavel'))
+        | Q(pk__in=SubSetor.objects.values('usuario_responsavel'))
+    ).order_by('pk').values_list('pk', 'first_name', 'last_name', 'username'))
+    nomes = hashlib.md5(repr(responsaveis).encode('utf-8')).hexdigest()
+    partes.append(f'{nomes}:{len(responsaveis)}')
+    return '-'.join(partes), ultima_modificacao
+
+
+def _arvore_organizacional(incluir_ativos=False, contar_ativos=False):
+    """
+    Nós da estrutura organizacional em listas compactas: cada nó traz o id do
+    pai (empresa -> área -> setor -> subsetor), o flag `ativo` e o id do
+    responsável, cujo nome fica uma única vez em `responsaveis`.
+    """
+    campos = ('id', 'nome', 'ativo', 'usuario_responsavel_id')
+
+    def nos(queryset, campo_pai=None):
+        lista = []
+        for no in queryset.order_by('nome').values(*campos, *filter(None, [campo_pai])):
+            item = {'id': no['id'], 'nome': no['nome'], 'ativo': no['ativo'],
+                    'responsavel': no['usuario_responsavel_id']}
+            if campo_pai:
+                item[campo_pai.removesuffix('_id')] = no[campo_pai]
+            lista.append(item)
+        return lista
+
+    arvore = {
+        'empresas': nos(Empresa.objects.all()),
+        'areas': nos(Area.objects.all(), 'empresa_id'),
+        'setores': nos(Setor.objects.all(), 'area_id'),
+        'subsetores': nos(SubSetor.objects.all(), 'setor_id'),
+    }
+
+    ids_responsaveis = {no['responsavel'] for nivel in arvore.values()
+                        for no in nivel if no['responsavel']}
+    arvore['responsaveis'] = {
+        str(usuario.pk): usuario.get_full_name() or usuario.username
+        for usuario in Usuario.objects.filter(pk__in=ids_responsaveis).only(
+            'pk', 'first_name', 'last_name', 'username')
+    }
+
+    ativos = Ativo.objects.filter(ativo=True)
+    if contar_ativos:
+        contagem = dict(ativos.values_list('estrutura_organizacional_id').annotate(
+            total=Count('id')).order_by())
+        for subsetor in arvore['subsetores']:
+            subsetor['ativos'] = contagem.get(subsetor['id'], 0)
+    if incluir_ativos:
+        arvore['ativos'] = [
+            {'id': ativo['id'], 'tag': ativo['tag'], 'descricao': ativo['descricao'],
+             'subsetor': ativo['estrutura_organizacional_id']}
+            for ativo in ativos.order_by('tag').values(
+                'id', 'tag', 'descricao', 'estrutura_organizacional_id')
+        ]
+    return arvore
+
+
+@login_required
+def get_arvore_organizacional(request):
+    """
+    Árvore organizacional completa (empresas, áreas, setores e subsetores)
+    para o formulário de auditoria filtrar os locais e ativos no navegador.
+
+    Parâmetros: `ativos=1` inclui a lista de ativos ativos de cada subsetor e
+    `contagem_ativos=1` acrescenta a quantidade em cada subsetor. O JSON fica
+    no cache sob a versão da árvore (última data_atualizacao), que também é o
+    ETag: enquanto nada mudar, o navegador revalida e recebe 304.
+    """
+    incluir_ativos = request.GET.get('ativos') == '1'
+    contar_ativos = request.GET.get('contagem_ativos') == '1'
+    versao, ultima_modificacao = _versao_arvore_organizacional()
+    etag = quote_etag(f'{versao}-{int(incluir_ativos)}{int(contar_ativos)}')
+
+    # Cliente já tem a versão atual: responde 304 sem montar nem ler a árvore
+    resposta = aplicar_cabecalhos_condicionais(
+        request, HttpResponse(), etag, ultima_modificacao=ultima_modificacao)
+    if resposta.status_code == 304:
+        return resposta
+
+    arvore = obter_ou_calcular(
+        'organizacao', f'arvore:{etag}',
+        lambda: _arvore_organizacional(incluir_ativos, contar_ativos))
+    return aplicar_cabecalhos_condicionais(
+        request, JsonResponse({'versao': versao, **arvore}), etag,
+        ultima_modificacao=ultima_modificacao)
+
+
 @login_required
 def lista_perguntas(request, checklist_pk):
     """Lista todas as perguntas de um checklist, agrupadas por tópico."""
@@ -2262,6 +2746,21 @@ def deletar_topico(request, pk):
     return render(request, 'auditorias/deletar_generico.html', context)
 
 
+# Relações lidas pelo AuditoriaInstanciaListSerializer: carregadas de uma vez
+# para que as listas da API não façam consultas extras por linha
+RELACOES_LISTA_INSTANCIAS = [
+    'checklist_usado',
+    'local_execucao',
+    'auditoria_agendada__local_empresa',
+    'auditoria_agendada__local_area',
+    'auditoria_agendada__local_setor',
+    'auditoria_agendada__local_subsetor',
+    'auditoria_agendada__ferramenta',
+    'auditoria_agendada__criado_por',
+]
+PREFETCH_LISTA_INSTANCIAS = ['auditoria_agendada__modelos__checklist']
+
+
 class AuditoriasPendentesAPIView(ListAPIView):
     """
     Endpoint da API que retorna a lista de instâncias de auditoria
@@ -2274,48 +2773,15 @@ class AuditoriasPendentesAPIView(ListAPIView):
         user = self.request.user
         hoje = timezone.now().date()
 
-        # 1. Pega todas as pendentes (não executadas) do usuário
-        # Usamos distinct() para evitar duplicatas causadas pelos joins
-        todas_pendentes = AuditoriaInstancia.objects.filter(
-            executada=False,
+        # Pendentes do usuário que ainda não entraram em quarentena
+        # (tolerância da categoria comparada no próprio banco)
+        return AuditoriaInstancia.objects.fora_de_quarentena(hoje).filter(
             responsavel=user,
         ).select_related(
-            'auditoria_agendada__local_empresa',
-            'auditoria_agendada__local_area',
-            'auditoria_agendada__local_setor',
-            'auditoria_agendada__local_subsetor',
-            'auditoria_agendada__ferramenta'
-        ).distinct()
-
-        # 2. Lógica de Quarentena (Corrigida para SQLite)
-        # Em vez de calcular no banco com F() * timedelta, buscamos os dados e filtramos no Python
-
-        # Busca instâncias atrasadas
-        candidatos_quarentena = AuditoriaInstancia.objects.filter(
-            executada=False,
-            responsavel=user,
-            data_execucao__lt=hoje
-        ).values(
-            'id',
-            'data_execucao',
-            # Tenta pegar o limite da categoria do primeiro modelo associado
-            'auditoria_agendada__modelos__categoria__dias_para_quarentena'
-        )
-
-        quarentena_ids = set()
-
-        for item in candidatos_quarentena:
-            data_exec = item['data_execucao']
-            # Se não tiver configuração, assume padrão de 7 dias
-            limite = item['auditoria_agendada__modelos__categoria__dias_para_quarentena'] or 7
-
-            dias_atraso = (hoje - data_exec).days
-
-            if dias_atraso > limite:
-                quarentena_ids.add(item['id'])
-
-        # 3. Retorna a lista de pendentes EXCLUINDO os IDs que estão em quarentena
-        return todas_pendentes.exclude(id__in=quarentena_ids).order_by('data_execucao')
+            *RELACOES_LISTA_INSTANCIAS
+        ).prefetch_related(
+            *PREFETCH_LISTA_INSTANCIAS
+        ).order_by('data_execucao')
 
 
 class AuditoriaInstanciaDetailAPIView(RetrieveAPIView):
@@ -2332,15 +2798,234 @@ class AuditoriaInstanciaDetailAPIView(RetrieveAPIView):
         pelas quais ele é o responsável.
         """
         user = self.request.user
-        return AuditoriaInstancia.objects.filter(responsavel=user)
+        return AuditoriaInstancia.objects.filter(
+            responsavel=user).select_related('checklist_usado__serializado')
+
+
+# Validade do checklist pedido pelo hash do conteúdo (a URL nunca muda de conteúdo)
+MAX_AGE_CHECKLIST_IMUTAVEL = 365 * 24 * 60 * 60
+
+
+class ChecklistVersaoAPIView(APIView):
+    """
+    Estrutura completa de uma versão de checklist: GET /api/checklists/<id>/.
+
+    Serve o JSON gravado em ChecklistSerializado com o hash do conteúdo como
+    ETag. Pedido com ?v=<hash> atual (a `checklist_url` do detalhe da
+    execução), a resposta é imutável e fica um ano no cache do app; sem ele,
+    o app revalida e recebe 304 enquanto o conteúdo não mudar.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        checklist = get_object_or_404(
+            Checklist.objects.select_related('serializado'), pk=pk)
+        serializado = ChecklistSerializado.obter_para(checklist)
+        imutavel = request.query_params.get('v') == serializado.hash_conteudo
+
+        resposta = HttpResponse(serializado.conteudo,
+                                content_type='application/json')
+        return aplicar_cabecalhos_condicionais(
+            request, resposta, quote_etag(serializado.hash_conteudo),
+            max_age=MAX_AGE_CHECKLIST_IMUTAVEL if imutavel else 0,
+            imutavel=imutavel)
+
+
+# Origem dos cursores da sincronização (microssegundos desde a época, em UTC)
+EPOCA_CURSOR_SYNC = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Sufixo dos cursores de continuação (tem_mais), que não relêem a janela
+SUFIXO_CURSOR_CONTINUACAO = 'p'
+
+
+def _codificar_cursor_sync(momento, continuacao=False):
+    cursor = str((momento - EPOCA_CURSOR_SYNC) // timedelta(microseconds=1))
+    return cursor + SUFIXO_CURSOR_CONTINUACAO if continuacao else cursor
+
+
+def _decodificar_cursor_sync(cursor):
+    """(instante, continuação) do cursor, ou (None, False) se ele for inválido."""
+    continuacao = cursor.endswith(SUFIXO_CURSOR_CONTINUACAO)
+    if continuacao:
+        cursor = cursor[:-len(SUFIXO_CURSOR_CONTINUACAO)]
+    try:
+        return EPOCA_CURSOR_SYNC + timedelta(microseconds=int(cursor)), continuacao
+    except (TypeError, ValueError, OverflowError):
+        return None, False
+
+
+def _eventos_de_sincronizacao(alteradas, removidas, limite=None):
+    """
+    Une em uma única consulta, ordenada pelo instante, as execuções alteradas
+    e as remoções: tuplas (id da execução, instante, removida).
+    """
+    eventos = alteradas.order_by().annotate(
+        removida=Value(False)).values_list('id', 'data_atualizacao', 'removida')
+    if removidas is not None:
+        eventos = eventos.union(removidas.order_by().annotate(
+            removida=Value(True)).values_list('id_instancia', 'data_remocao', 'removida'),
+            all=True)
+    eventos = eventos.order_by('data_atualizacao')
+    return list(eventos[:limite] if limite else eventos)
+
+
+class SincronizacaoAPIView(APIView):
+    """
+    Sincronização incremental do app: GET /api/sync/?since=<cursor>.
+
+    Devolve as execuções do auditor criadas ou alteradas desde o cursor
+    (`alteradas`), os IDs das que saíram da sua lista por exclusão ou
+    redirecionamento (`removidas`) e o novo cursor. Sem `since`, envia todas
+    as execuções do auditor. Com `tem_mais`, o app repete a chamada com o
+    cursor recebido. Sem novidades, custa uma única consulta indexada.
+
+    O instante de cada evento é o do save, não o do commit: cada nova rodada
+    relê os SYNC_JANELA_SEGUNDOS anteriores ao cursor, para não perder o que
+    foi confirmado depois de uma alteração mais recente já enviada. O app
+    pode receber de novo execuções e remoções que já aplicou (aplicá-las é
+    idempotente, pelo ID). As páginas seguintes de uma rodada não relêem.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        cursor = request.query_params.get('since') or None
+        tamanho_pagina = settings.AUDITORIAS_CONFIG.get('SYNC_TAMANHO_PAGINA', 500)
+        inicio_leitura = timezone.now()
+
+        alteradas = AuditoriaInstancia.objects.filter(responsavel=user)
+        removidas = None
+        if cursor:
+            desde, continuacao = _decodificar_cursor_sync(cursor)
+            if desde is None:
+                return Response({"detail": "Cursor de sincronização inválido."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            inicio = desde
+            if not continuacao:
+                inicio -= timedelta(
+                    seconds=settings.AUDITORIAS_CONFIG.get('SYNC_JANELA_SEGUNDOS', 120))
+            alteradas = alteradas.filter(data_atualizacao__gt=inicio)
+            removidas = RemocaoInstancia.objects.filter(
+                usuario=user, data_remocao__gt=inicio)
+
+        eventos = _eventos_de_sincronizacao(alteradas, removidas, tamanho_pagina + 1)
+        tem_mais = len(eventos) > tamanho_pagina
+        if tem_mais:
+            # O próximo cursor não pode cortar um instante ao meio: os eventos
+            # do instante da fronteira ficam para a próxima página
+            fronteira = eventos[tamanho_pagina][1]
+            eventos = [e for e in eventos[:tamanho_pagina] if e[1] != fronteira]
+            if not eventos:
+                # Página inteira no mesmo instante: envia todos os dele
+                eventos = _eventos_de_sincronizacao(
+                    alteradas.filter(data_atualizacao=fronteira),
+                    removidas.filter(data_remocao=fronteira) if removidas is not None else None)
+
+        # Vale o último evento de cada execução (ex.: redirecionada e devolvida)
+        ultimo_evento = {}
+        for id_instancia, _, removida in eventos:
+            ultimo_evento[id_instancia] = bool(removida)
+        ids_alteradas = [i for i, removida in ultimo_evento.items() if not removida]
+        ids_removidas = [i for i, removida in ultimo_evento.items() if removida]
+
+        instancias = []
+        if ids_alteradas:
+            instancias = AuditoriaInstancia.objects.com_tolerancia_quarentena().filter(
+                pk__in=ids_alteradas, responsavel=user
+            ).select_related(
+                *RELACOES_LISTA_INSTANCIAS
+            ).prefetch_related(
+                *PREFETCH_LISTA_INSTANCIAS
+            ).order_by('data_execucao')
+
+        # Numa continuação, o cursor é o último evento enviado. No fim da
+        # rodada, é o início da leitura: o que ainda não estava confirmado
+        # nela tem instante dentro da janela relida na próxima rodada
+        ultimo = eventos[-1][1] if eventos else None
+        if not tem_mais and (ultimo is None or ultimo < inicio_leitura):
+            ultimo = inicio_leitura
+        return Response({
+            'cursor': _codificar_cursor_sync(ultimo, continuacao=tem_mais),
+            'tem_mais': tem_mais,
+            'alteradas': AuditoriaInstanciaSyncSerializer(instancias, many=True).data,
+            'removidas': ids_removidas,
+        })
+
+
+def _chave_idempotencia_valida(chave):
+    return isinstance(chave, str) and 0 < len(chave) <= 255
+
+
+def _resultado_da_chave(registro, rota):
+    """
+    (status, corpo, repetida) a devolver para uma chave de idempotência já
+    usada: o resultado gravado ou o motivo de ele não poder ser devolvido.
+    """
+    if registro.rota != rota:
+        return status.HTTP_422_UNPROCESSABLE_ENTITY, {
+            "detail": "Esta Idempotency-Key já foi usada em outra requisição."}, False
+    if registro.status_resposta is None:
+        return status.HTTP_409_CONFLICT, {
+            "detail": "A requisição com esta Idempotency-Key ainda está em processamento."}, False
+    return registro.status_resposta, registro.corpo_resposta, True
+
+
+def idempotente(post):
+    """
+    Torna o POST de uma APIView idempotente pelo cabeçalho Idempotency-Key.
+    A primeira requisição com a chave é processada e seu resultado gravado
+    (ChaveIdempotencia); as tentativas seguintes recebem o mesmo resultado,
+    com o cabeçalho Idempotent-Replayed, sem que o corpo seja lido de novo.
+    Erros 5xx não são gravados, para que a tentativa seguinte reprocesse.
+    """
+    @wraps(post)
+    def wrapper(self, request, *args, **kwargs):
+        chave = request.headers.get('Idempotency-Key')
+        if chave is None:
+            return post(self, request, *args, **kwargs)
+        if not _chave_idempotencia_valida(chave):
+            return Response({"detail": "Idempotency-Key inválida (até 255 caracteres)."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        registro, criado = ChaveIdempotencia.reservar(request.user, chave, request.path)
+        if not criado:
+            codigo, corpo, repetida = _resultado_da_chave(registro, request.path)
+            resposta = Response(corpo, status=codigo)
+            if repetida:
+                resposta['Idempotent-Replayed'] = 'true'
+            return resposta
+
+        try:
+            resposta = post(self, request, *args, **kwargs)
+        except Exception:
+            registro.delete()
+            raise
+        if resposta.status_code >= 500:
+            registro.delete()
+        else:
+            registro.concluir(resposta.status_code, resposta.data)
+        return resposta
+    return wrapper
 
 
 class SubmeterAuditoriaAPIView(APIView):
+    """
+    Submissão de uma execução pelo app. A validação e a gravação das respostas
+    são feitas em lote (RespostaListSerializer) e toda a submissão roda em uma
+    única transação, com número de consultas independente do checklist.
+    Aceita Idempotency-Key: a nova tentativa de uma submissão já gravada
+    recebe o mesmo resultado, em vez de "já finalizada".
+    """
     permission_classes = [IsAuthenticated]
 
+    @idempotente
+    @transaction.atomic
     def post(self, request, pk):
         try:
-            instancia = AuditoriaInstancia.objects.get(
+            # Trava a execução: duas submissões simultâneas não gravam em dobro
+            instancia = AuditoriaInstancia.objects.select_for_update(of=('self',)).select_related(
+                'auditoria_agendada', 'local_execucao'
+            ).get(
                 pk=pk,
                 responsavel=request.user,
                 executada=False
@@ -2351,37 +3036,273 @@ class SubmeterAuditoriaAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # --- NOVA LÓGICA PARA ATUALIZAR O LOCAL ---
-        local_execucao_id = request.data.get('local_execucao_id')
-        if local_execucao_id and instancia.local_execucao is None:
+        subsetores = SubSetor.objects.in_bulk(
+            ids_inteiros([request.data], 'local_execucao_id'))
+        codigo, corpo = _submeter_instancia(instancia, request.data, subsetores)
+        if codigo == status.HTTP_200_OK:
+            _atualizar_resumos_dos_dias([instancia.data_execucao])
+        return Response(corpo, status=codigo)
+
+
+def _como_inteiro(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _submeter_instancia(instancia, dados, subsetores, compartilhado=None):
+    """
+    Grava a submissão de uma execução já travada: local de execução (para as
+    flutuantes), respostas e resultado. `subsetores` traz os locais citados já
+    carregados e `compartilhado` as opções e perguntas carregadas para um lote
+    de submissões (RespostaListSerializer.carregar_em_lote). Devolve o status
+    HTTP e o corpo da resposta; os rollups diários ficam a cargo de quem chama.
+    """
+    # --- NOVA LÓGICA PARA ATUALIZAR O LOCAL ---
+    local_execucao_id = dados.get('local_execucao_id')
+    if local_execucao_id and instancia.local_execucao is None:
+        subsetor = subsetores.get(_como_inteiro(local_execucao_id))
+        if subsetor is None:
+            return status.HTTP_400_BAD_REQUEST, {
+                "detail": "O local de execução (subsetor) fornecido não é válido."}
+        # Não salvamos ainda, vamos salvar junto com o 'executada=True'
+        instancia.local_execucao = subsetor
+    # --- FIM DA NOVA LÓGICA ---
+
+    contexto = {'auditoria_instancia': instancia, **(compartilhado or {})}
+    respostas_serializer = RespostaSerializer(
+        data=dados.get('respostas', []), many=True, context=contexto)
+    if not respostas_serializer.is_valid():
+        return status.HTTP_400_BAD_REQUEST, respostas_serializer.errors
+
+    respostas_serializer.save()
+    instancia.executada = True
+    instancia.save()  # Agora salva o 'local_execucao' atualizado e o 'executada'
+
+    # As respostas não mudam mais: o resumo do resultado é gravado agora
+    ResultadoAuditoria.calcular_para(instancia)
+    return status.HTTP_200_OK, {"detail": "Auditoria submetida com sucesso!"}
+
+
+class SubmeterLoteAPIView(APIView):
+    """
+    Submissão de várias execuções finalizadas offline em uma só requisição:
+    POST /api/instancias/submeter-lote/ com
+    {"submissoes": [{"instancia_id", "local_execucao_id", "respostas"}, ...]}.
+
+    Cada execução é gravada em seu próprio savepoint e recebe o seu resultado
+    (`status` 200, 400 ou 404, como em /submeter/); a falha de uma não desfaz
+    as demais. Execuções, locais, opções e perguntas são carregados uma única
+    vez para o lote inteiro, e os rollups diários são recalculados no fim.
+
+    O lote aceita Idempotency-Key, e cada submissão pode trazer a sua
+    `chave_idempotencia` (a mesma do /submeter/ daquela execução): ao reenviar
+    um lote interrompido, as execuções já gravadas devolvem o resultado
+    gravado (`repetida`) sem validar de novo as respostas e as fotos.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotente
+    def post(self, request):
+        submissoes = request.data.get('submissoes') if isinstance(request.data, dict) else None
+        maximo = settings.AUDITORIAS_CONFIG.get('SUBMISSAO_LOTE_MAXIMO', 50)
+        if not isinstance(submissoes, list) or not all(isinstance(s, dict) for s in submissoes):
+            return Response({"detail": "Envie 'submissoes' como uma lista de objetos."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(submissoes) > maximo:
+            return Response({"detail": f"No máximo {maximo} submissões por lote."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        todas_as_respostas = [
+            resposta for submissao in submissoes
+            if isinstance(submissao.get('respostas'), list)
+            for resposta in submissao['respostas']
+        ]
+
+        resultados, datas = [], []
+        with transaction.atomic():
+            instancias = AuditoriaInstancia.objects.select_for_update(of=('self',)).select_related(
+                'auditoria_agendada', 'local_execucao'
+            ).prefetch_related(
+                'auditoria_agendada__modelos'
+            ).filter(
+                responsavel=request.user,
+                executada=False,
+            ).in_bulk(ids_inteiros(submissoes, 'instancia_id'))
+            subsetores = SubSetor.objects.in_bulk(
+                ids_inteiros(submissoes, 'local_execucao_id'))
+            compartilhado = RespostaListSerializer.carregar_em_lote(
+                todas_as_respostas, request.user.pk)
+
+            for submissao in submissoes:
+                codigo, corpo, repetida = self.processar_submissao(
+                    request.user, submissao, instancias, subsetores, compartilhado, datas)
+                # Erros de validação das respostas vão em 'erros'
+                if 'detail' not in corpo:
+                    corpo = {'erros': corpo}
+                resultado = {'instancia_id': submissao.get('instancia_id'),
+                             'status': codigo, **corpo}
+                if repetida:
+                    resultado['repetida'] = True
+                resultados.append(resultado)
+
+            _atualizar_resumos_dos_dias(datas)
+
+        return Response({
+            'submetidas': len(datas),
+            'falhas': len(resultados) - len(datas),
+            'resultados': resultados,
+        })
+
+    def processar_submissao(self, usuario, submissao, instancias, subsetores, compartilhado, datas):
+        """Submete uma execução do lote. Devolve (status, corpo, repetida)."""
+        instancia_id = _como_inteiro(submissao.get('instancia_id'))
+        chave = submissao.get('chave_idempotencia')
+        registro = None
+        if chave is not None and instancia_id is not None:
+            if not _chave_idempotencia_valida(chave):
+                return status.HTTP_400_BAD_REQUEST, {
+                    "detail": "chave_idempotencia inválida (até 255 caracteres)."}, False
+            rota = reverse('api_instancia_submeter', args=[instancia_id])
+            registro, criado = ChaveIdempotencia.reservar(usuario, chave, rota)
+            if not criado:
+                return _resultado_da_chave(registro, rota)
+
+        instancia = instancias.get(instancia_id)
+        if instancia is None or instancia.executada:
+            codigo, corpo = status.HTTP_404_NOT_FOUND, {
+                "detail": "Instância de auditoria não encontrada ou já finalizada."}
+        else:
             try:
-                subsetor = SubSetor.objects.get(pk=local_execucao_id)
-                instancia.local_execucao = subsetor
-                # Não salvamos ainda, vamos salvar junto com o 'executada=True'
-            except SubSetor.DoesNotExist:
-                return Response(
-                    {"detail": "O local de execução (subsetor) fornecido não é válido."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        # --- FIM DA NOVA LÓGICA ---
+                with transaction.atomic():
+                    codigo, corpo = _submeter_instancia(
+                        instancia, submissao, subsetores, compartilhado)
+            except DatabaseError:
+                logger.exception('Falha ao gravar a submissão da instância %s.',
+                                 instancia.pk)
+                instancia.executada = False
+                codigo, corpo = status.HTTP_500_INTERNAL_SERVER_ERROR, {
+                    "detail": "Erro ao gravar a submissão."}
+            if codigo == status.HTTP_200_OK:
+                datas.append(instancia.data_execucao)
+
+        if registro is not None:
+            if codigo >= 500:
+                registro.delete()
+            else:
+                registro.concluir(codigo, corpo)
+        return codigo, corpo, False
+
 
-        respostas_data = request.data.get('respostas', [])
-        contexto = {'auditoria_instancia': instancia}
-        respostas_serializer = RespostaSerializer(
-            data=respostas_data, many=True, context=contexto)
+def _resposta_do_upload(upload, codigo=status.HTTP_200_OK):
+    resposta = Response({
+        'token': str(upload.token),
+        'tamanho': upload.tamanho_total,
+        'offset': upload.tamanho_recebido,
+        'concluido': upload.concluido,
+    }, status=codigo)
+    resposta['Upload-Offset'] = str(upload.tamanho_recebido)
+    return resposta
+
+
+class AnexoUploadAPIView(APIView):
+    """
+    Upload de um anexo antes da submissão: POST /api/anexos/.
 
-        if respostas_serializer.is_valid():
-            respostas_serializer.save()
+    Em multipart, com o campo `arquivo`, grava o arquivo de uma vez. Em JSON,
+    com {"nome", "tamanho"}, abre um upload em partes, enviadas depois com
+    PATCH /api/anexos/<token>/. Tipo (pelo conteúdo) e tamanho são validados
+    com ALLOWED_FILE_TYPES e MAX_UPLOAD_SIZE. O `token` devolvido é citado
+    pela resposta em `anexos_tokens` na submissão.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, JSONParser]
 
-            instancia.executada = True
-            instancia.save()  # Agora salva o 'local_execucao' atualizado e o 'executada'
+    def post(self, request):
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is not None:
+            upload = UploadAnexo(usuario=request.user, nome_original=arquivo.name[:255])
+            try:
+                salvar_arquivo_enviado(upload, arquivo)
+            except AnexoInvalido as erro:
+                return Response({"detail": str(erro)}, status=status.HTTP_400_BAD_REQUEST)
+            return _resposta_do_upload(upload, status.HTTP_201_CREATED)
 
+        tamanho = _como_inteiro(request.data.get('tamanho'))
+        if not tamanho or tamanho < 0 or tamanho > tamanho_maximo():
             return Response(
-                {"detail": "Auditoria submetida com sucesso!"},
-                status=status.HTTP_200_OK
-            )
+                {"detail": "Envie o 'arquivo' ou informe o 'tamanho' (em bytes), "
+                           "até o tamanho máximo permitido."},
+                status=status.HTTP_400_BAD_REQUEST)
+        upload = UploadAnexo.objects.create(
+            usuario=request.user,
+            nome_original=str(request.data.get('nome') or '')[:255],
+            tamanho_total=tamanho)
+        return _resposta_do_upload(upload, status.HTTP_201_CREATED)
+
+
+class AnexoUploadParteAPIView(APIView):
+    """
+    Upload em partes retomável: /api/anexos/<token>/.
+
+    GET (ou HEAD) informa em Upload-Offset quantos bytes já foram recebidos.
+    PATCH envia os bytes seguintes no corpo (sem codificação), com o cabeçalho
+    Upload-Offset igual a esse total; o corpo é lido em blocos direto para o
+    disco. Após uma falha de rede, o app consulta o offset e continua dali.
+    DELETE cancela o upload.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, token):
+        upload = get_object_or_404(UploadAnexo, token=token, usuario=request.user)
+        return _resposta_do_upload(upload)
+
+    def patch(self, request, token):
+        offset = _como_inteiro(request.headers.get('Upload-Offset'))
+        upload = get_object_or_404(UploadAnexo, token=token, usuario=request.user)
+        # Sem transação aberta: o corpo pode levar minutos para chegar
+        try:
+            upload = gravar_parte(upload, request.stream, offset)
+        except OffsetDivergente as divergencia:
+            # O app reenvia a partir do offset devolvido
+            return _resposta_do_upload(divergencia.upload, status.HTTP_409_CONFLICT)
+        except AnexoInvalido as erro:
+            return Response({"detail": str(erro)}, status=status.HTTP_400_BAD_REQUEST)
+        return _resposta_do_upload(upload)
+
+    def delete(self, request, token):
+        upload = get_object_or_404(UploadAnexo, token=token, usuario=request.user)
+        descartar(upload)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
-        return Response(respostas_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+# Campo do SubSetor (caminho materializado) que liga cada nível
+# organizacional do agendamento
+CAMPO_NIVEL_LOCAIS = {
+    nivel: CAMPO_DO_NIVEL[nivel] for nivel in ('EMPRESA', 'AREA', 'SETOR')
+}
+
+
+def _escopo_locais_permitidos(instancia):
+    """
+    Para uma execução de gestão (flutuante), devolve (campo do SubSetor, id do
+    local do agendamento) que delimita os subsetores que o auditor pode
+    escolher. None quando o local já está definido.
+    """
+    agendamento = instancia.auditoria_agendada
+    if instancia.local_execucao_id or agendamento.agendamento_especifico:
+        return None
+    nivel = agendamento.nivel_organizacional
+    local_id = {
+        'EMPRESA': agendamento.local_empresa_id,
+        'AREA': agendamento.local_area_id,
+        'SETOR': agendamento.local_setor_id,
+    }.get(nivel)
+    if not local_id:
+        return None
+    return CAMPO_NIVEL_LOCAIS[nivel], local_id
 
 
 class LocaisPermitidosAPIView(ListAPIView):
@@ -2408,21 +3329,13 @@ class LocaisPermitidosAPIView(ListAPIView):
         except AuditoriaInstancia.DoesNotExist:
             return SubSetor.objects.none()  # Retorna vazio se não encontrar
 
-        agendamento = instancia.auditoria_agendada
-        nivel = agendamento.nivel_organizacional
-
-        # Se for auditoria de gestão, busca os locais permitidos
-        if not instancia.local_execucao and not agendamento.agendamento_especifico:
-            if nivel == 'EMPRESA' and agendamento.local_empresa:
-                return SubSetor.objects.filter(setor__area__empresa=agendamento.local_empresa, ativo=True)
-            if nivel == 'AREA' and agendamento.local_area:
-                return SubSetor.objects.filter(setor__area=agendamento.local_area, ativo=True)
-            if nivel == 'SETOR' and agendamento.local_setor:
-                return SubSetor.objects.filter(setor=agendamento.local_setor, ativo=True)
-
         # Se for auditoria específica ou nível subsetor, não retorna nada
         # (pois o local já está definido)
-        return SubSetor.objects.none()
+        escopo = _escopo_locais_permitidos(instancia)
+        if escopo is None:
+            return SubSetor.objects.none()
+        campo, local_id = escopo
+        return SubSetor.objects.filter(**{campo: local_id}, ativo=True)
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -2431,6 +3344,107 @@ class LocaisPermitidosAPIView(ListAPIView):
         return Response(data)
 
 
+@method_decorator(gzip_page, name='dispatch')
+class PacoteOfflineAPIView(APIView):
+    """
+    Pacote de trabalho offline do auditor: GET /api/pacote-offline/?dias=N.
+
+    Em uma única resposta (compactada com gzip), traz as execuções pendentes
+    do auditor até N dias à frente, as versões de checklist que elas usam (sem
+    repetição, com o hash de ChecklistSerializado), os subsetores que podem
+    ser escolhidos nas execuções flutuantes e os ativos auditados. O número de
+    consultas é fixo, qualquer que seja o número de execuções. O `cursor`
+    devolvido serve de `since` para continuar em /api/sync/.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        config = settings.AUDITORIAS_CONFIG
+        try:
+            dias = int(request.query_params.get(
+                'dias', config.get('PACOTE_OFFLINE_DIAS', 7)))
+        except ValueError:
+            return Response({"detail": "O parâmetro 'dias' deve ser um número inteiro."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        dias = max(0, min(dias, config.get('PACOTE_OFFLINE_MAX_DIAS', 31)))
+
+        # Cursor tomado antes da leitura: nada alterado depois fica de fora do sync
+        cursor = _codificar_cursor_sync(timezone.now())
+        hoje = timezone.now().date()
+
+        instancias = list(AuditoriaInstancia.objects.fora_de_quarentena(hoje).filter(
+            responsavel=user,
+            data_execucao__lte=hoje + timedelta(days=dias),
+        ).select_related(
+            *RELACOES_LISTA_INSTANCIAS
+        ).prefetch_related(
+            *PREFETCH_LISTA_INSTANCIAS,
+            Prefetch('auditoria_agendada__ativos_auditados',
+                     queryset=Ativo.objects.select_related('categoria')),
+        ).order_by('data_execucao'))
+
+        # Locais das execuções flutuantes: uma consulta para todos os escopos
+        escopos = {i.pk: _escopo_locais_permitidos(i) for i in instancias}
+        ids_por_campo = defaultdict(set)
+        for escopo in escopos.values():
+            if escopo:
+                ids_por_campo[escopo[0]].add(escopo[1])
+        locais, locais_por_escopo = [], defaultdict(list)
+        if ids_por_campo:
+            filtro = Q()
+            for campo, ids in ids_por_campo.items():
+                filtro |= Q(**{f'{campo}__in': ids})
+            for subsetor in SubSetor.objects.filter(filtro, ativo=True).values(
+                    'id', 'nome', *CAMPO_NIVEL_LOCAIS.values()):
+                locais.append({'id': subsetor['id'], 'nome': subsetor['nome']})
+                for campo, ids in ids_por_campo.items():
+                    if subsetor[campo] in ids:
+                        locais_por_escopo[(campo, subsetor[campo])].append(subsetor['id'])
+
+        # Versões de checklist sem repetição (já geradas na criação da versão)
+        checklists = {i.checklist_usado_id: i.checklist_usado
+                      for i in instancias if i.checklist_usado_id}
+        serializados = {s.checklist_id: s for s in ChecklistSerializado.objects.filter(
+            checklist_id__in=checklists)}
+        for checklist_id, checklist in checklists.items():
+            if checklist_id not in serializados:
+                serializados[checklist_id] = ChecklistSerializado.gerar_para(checklist)
+
+        ativos = {}
+        dados_instancias = AuditoriaInstanciaSyncSerializer(instancias, many=True).data
+        for instancia, dados in zip(instancias, dados_instancias):
+            ativos_da_instancia = instancia.auditoria_agendada.ativos_auditados.all()
+            for ativo in ativos_da_instancia:
+                ativos.setdefault(ativo.pk, {
+                    'id': ativo.pk,
+                    'tag': ativo.tag,
+                    'descricao': ativo.descricao,
+                    'categoria': ativo.categoria.nome if ativo.categoria else None,
+                    'subsetor_id': ativo.estrutura_organizacional_id,
+                })
+            escopo = escopos[instancia.pk]
+            serializado = serializados.get(instancia.checklist_usado_id)
+            dados['checklist_id'] = instancia.checklist_usado_id
+            dados['checklist_hash'] = serializado.hash_conteudo if serializado else None
+            dados['locais_permitidos_ids'] = locais_por_escopo[escopo] if escopo else []
+            dados['ativos_ids'] = [ativo.pk for ativo in ativos_da_instancia]
+
+        return Response({
+            'cursor': cursor,
+            'dias': dias,
+            'instancias': dados_instancias,
+            'checklists': [{
+                'id': checklist_id,
+                'versao': checklists[checklist_id].version,
+                'hash': serializado.hash_conteudo,
+                'estrutura': json.loads(serializado.conteudo),
+            } for checklist_id, serializado in serializados.items()],
+            'locais': locais,
+            'ativos': list(ativos.values()),
+        })
+
+
 class AuditoriasConcluidasAPIView(ListAPIView):
     """
     Endpoint da API que retorna o histórico de instâncias de auditoria
@@ -2449,10 +3463,9 @@ class AuditoriasConcluidasAPIView(ListAPIView):
             executada=True,  # <-- A ÚNICA MUDANÇA É AQUI
             auditoria_agendada__responsavel=user
         ).select_related(
-            'auditoria_agendada__local_empresa',
-            'auditoria_agendada__local_area',
-            'auditoria_agendada__local_setor',
-            'auditoria_agendada__local_subsetor'
+            *RELACOES_LISTA_INSTANCIAS
+        ).prefetch_related(
+            *PREFETCH_LISTA_INSTANCIAS
             # Ordena da mais recente para a mais antiga
         ).order_by('-data_execucao')
 
@@ -2483,42 +3496,24 @@ def preview_audit_dates(request):
         repetitions = int(repetitions_str) if repetitions_str and repetitions_str.isdigit(
         ) and int(repetitions_str) > 0 else 1
 
-        dates = []
-        current_date = start_date
-        loop_limit = 365 * 5
-        loops = 0
+        # Mesma regra de recorrência usada na geração das instâncias
+        interval = int(
+            interval_str) if interval_str and interval_str.isdigit() else None
+        dates = calcular_datas(
+            start_date,
+            end_date,
+            frequencia=frequency if schedule_type == 'por_frequencia' else None,
+            intervalo=interval if schedule_type == 'por_intervalo' else None,
+            pular_finais_semana=skip_weekends,
+        )
 
-        if not end_date:
-            if not (skip_weekends and start_date.weekday() >= 5):
-                # AQUI ESTÁ A MUDANÇA: Adicionamos a data apenas UMA vez
-                dates.append(start_date)
-        else:
-            while current_date <= end_date and loops < loop_limit:
-                loops += 1
-
-                if not (skip_weekends and current_date.weekday() >= 5):
-                    # AQUI ESTÁ A MUDANÇA: Adicionamos a data apenas UMA vez
-                    dates.append(current_date)
-
-                # A lógica de cálculo da próxima data permanece a mesma
-                if schedule_type == 'por_intervalo':
-                    interval = int(
-                        interval_str) if interval_str and interval_str.isdigit() else 0
-                    current_date += timedelta(days=interval + 1)
-                elif schedule_type == 'por_frequencia':
-                    if frequency == 'DIARIO':
-                        current_date += timedelta(days=1)
-                    # ... (resto da lógica de frequência)
-                    elif frequency == 'SEMANAL':
-                        current_date += timedelta(weeks=1)
-                    elif frequency == 'QUINZENAL':
-                        current_date += timedelta(weeks=2)
-                    elif frequency == 'MENSAL':
-                        current_date += relativedelta(months=1)
-                    elif frequency == 'ANUAL':
-                        current_date += relativedelta(years=1)
-                else:
-                    current_date += timedelta(days=1)
+        # Datas além do horizonte rolante só são gravadas depois (virtuais)
+        modelo_id = request.GET.get('modelo')
+        modelo = ModeloAuditoria.objects.select_related('categoria').filter(
+            pk=modelo_id).first() if modelo_id and modelo_id.isdigit() else None
+        limite = limite_do_horizonte(
+            semanas_de_horizonte(modelo.categoria if modelo else None),
+            timezone.now().date())
 
         # Formatação final para a resposta JSON
         dias_semana = ["seg.", "ter.", "qua.", "qui.", "sex.", "sáb.", "dom."]
@@ -2532,7 +3527,8 @@ def preview_audit_dates(request):
             'dia_semana': dias_semana[date.weekday()],
             'dia': date.strftime('%d'),
             'mes': meses[date.month - 1],
-            'ano': date.year
+            'ano': date.year,
+            'virtual': limite is not None and date > limite
         } for i, date in enumerate(dates)]
 
         return JsonResponse({'dates': formatted_dates})
@@ -2544,7 +3540,24 @@ def preview_audit_dates(request):
 @login_required
 def lista_execucoes(request):
     """Exibe o histórico de todas as instâncias de auditoria PENDENTES e ATRASADAS."""
-    instancias_list = AuditoriaInstancia.objects.exclude(executada=True).select_related(
+    instancias_filtradas = AuditoriaInstancia.objects.exclude(executada=True)
+
+    search = request.GET.get('search', '')
+    if search:
+        instancias_filtradas = instancias_filtradas.filter(
+            Q(auditoria_agendada__responsavel__first_name__icontains=search) |
+            Q(local_execucao__nome__icontains=search) |
+            Q(auditoria_agendada__modelos__descricao__icontains=search)
+        ).distinct()
+
+    # Contagem por status feita no banco (status persistido), sobre o
+    # resultado da busca e antes do filtro de status
+    contagem_status = dict(
+        instancias_filtradas.order_by()
+        .values_list('status_execucao').annotate(total=Count('id', distinct=True))
+    )
+
+    instancias_list = instancias_filtradas.select_related(
         'auditoria_agendada__responsavel',
         'auditoria_agendada__ferramenta',
         'auditoria_agendada__criado_por',
@@ -2554,13 +3567,14 @@ def lista_execucoes(request):
         'auditoria_agendada__modelos'
     ).order_by('data_execucao')
 
-    search = request.GET.get('search', '')
-    if search:
+    status_selecionado = request.GET.get('status', '')
+    if status_selecionado:
         instancias_list = instancias_list.filter(
-            Q(auditoria_agendada__responsavel__first_name__icontains=search) |
-            Q(local_execucao__nome__icontains=search) |
-            Q(auditoria_agendada__modelos__descricao__icontains=search)
-        ).distinct()
+            status_execucao=status_selecionado)
+    status_opcoes = [
+        (codigo, rotulo, contagem_status.get(codigo, 0))
+        for codigo, rotulo in STATUS_EXECUCAO if codigo != 'CONCLUIDA'
+    ]
 
     paginator = Paginator(instancias_list, 15)
     page_number = request.GET.get('page')
@@ -2573,6 +3587,8 @@ def lista_execucoes(request):
     context = {
         'page_obj': page_obj,
         'search': search,
+        'status_selecionado': status_selecionado,
+        'status_opcoes': status_opcoes,
         'title': 'Auditorias para Execução',
         'all_users_json': json.dumps(all_users_list),
         'singular': 'Execução',
@@ -2593,9 +3609,11 @@ def historico_concluidas(request):
     instancias_list = AuditoriaInstancia.objects.filter(executada=True).select_related(
         'auditoria_agendada__responsavel',
         'auditoria_agendada__ferramenta',
+        'checklist_usado',
+        'local_execucao',
+        'resultado',  # data de conclusão gravada na submissão
     ).prefetch_related(
-        'auditoria_agendada__modelos',
-        'respostas'
+        'auditoria_agendada__modelos'
     ).order_by('-data_execucao')
 
     search = request.GET.get('search', '')
@@ -2639,10 +3657,13 @@ def redirecionar_agendamento(request, pk):
 
                 # 2. Atualiza todas as execuções filhas NÃO CONCLUÍDAS
                 # Usamos o ID do agendamento para encontrar as instâncias corretas
-                AuditoriaInstancia.objects.filter(
+                execucoes_abertas = AuditoriaInstancia.objects.filter(
                     auditoria_agendada_id=pk,
                     executada=False
-                ).update(responsavel_id=novo_responsavel_id)
+                )
+                dias = _dias_das_instancias(execucoes_abertas)
+                execucoes_abertas.redirecionar(novo_responsavel_id)
+                _atualizar_resumos_dos_dias(dias)
 
                 messages.success(
                     request, f'Agendamento #{pk} e suas execuções foram redirecionados.')
@@ -2663,6 +3684,7 @@ def redirecionar_execucao(request, pk):
                 # Atualiza o responsável apenas desta execução
                 execucao.responsavel_id = novo_responsavel_id
                 execucao.save(update_fields=['responsavel'])
+                _atualizar_resumos_dos_dias([execucao.data_execucao])
                 messages.success(
                     request, f'Execução #{execucao.id} foi redirecionada com sucesso.')
             except Exception as e:
@@ -2677,7 +3699,8 @@ def deletar_execucao(request, pk):
     instancia = get_object_or_404(AuditoriaInstancia, pk=pk)
     if request.method == 'POST':
         try:
-            instancia.delete()
+            AuditoriaInstancia.objects.filter(pk=instancia.pk).excluir()
+            _atualizar_resumos_dos_dias([instancia.data_execucao])
             messages.success(
                 request, f'Execução #{instancia.id} deletada com sucesso!')
         except Exception as e:
@@ -2695,7 +3718,7 @@ def detalhes_auditoria(request, pk):
         instancia = AuditoriaInstancia.objects.select_related(
             'auditoria_agendada__responsavel',
             'auditoria_agendada__ferramenta',
-            'local_execucao__setor__area__empresa',
+            'local_execucao',
             'responsavel',
             'checklist_usado'  # Corrigido de 'checklistusado'
         ).prefetch_related(
@@ -2732,7 +3755,8 @@ def detalhes_historico_auditoria(request, pk):
     instancia = get_object_or_404(
         AuditoriaInstancia.objects.select_related(
             'checklist_usado',
-            'local_execucao__setor__area__empresa',
+            'resultado',
+            'local_execucao',
             'auditoria_agendada__ferramenta',
             'responsavel'
         ).prefetch_related(
@@ -2749,70 +3773,28 @@ def detalhes_historico_auditoria(request, pk):
         for resposta in instancia.respostas.all()
     }
 
-    # Cálculo de Tempo
-    tempo_execucao_str = "N/A"
-    respostas_queryset = instancia.respostas.all()
-    if respostas_queryset.count() > 1:
-        datas_respostas = respostas_queryset.aggregate(
-            primeira=Min('data_resposta'),
-            ultima=Max('data_resposta')
-        )
-        if datas_respostas['primeira'] and datas_respostas['ultima']:
-            delta = datas_respostas['ultima'] - datas_respostas['primeira']
-            total_seconds = int(delta.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            seconds = total_seconds % 60
-            tempo_execucao_str = f"{hours:02}:{minutes:02}:{seconds:02}"
-
-    taxa_conformidade = None
-    pontuacao_final = None
-
-    # 1. Cálculos para Perguntas de Conformidade
-    respostas_conformidade = instancia.respostas.filter(
-        opcao_resposta__isnull=False)
-    if respostas_conformidade.exists():
-        qtd_na = respostas_conformidade.filter(
-            opcao_resposta__status='NA').count()
-        qtd_nc = respostas_conformidade.filter(
-            opcao_resposta__status='NAO_CONFORME').count()
-        total_respondido_conf = respostas_conformidade.count()
-        itens_aplicaveis = total_respondido_conf - qtd_na
-
-        taxa_conformidade = ((itens_aplicaveis - qtd_nc) /
-                             itens_aplicaveis * 100) if itens_aplicaveis > 0 else 0.0
-
-    # 2. Cálculos para Perguntas de Pontuação
-    respostas_porcentagem = instancia.respostas.filter(
-        opcao_porcentagem__isnull=False)
-    if respostas_porcentagem.exists():
-        total_pontos = sum(
-            r.opcao_porcentagem.peso for r in respostas_porcentagem if r.opcao_porcentagem)
-        total_respostas_validas = respostas_porcentagem.count()
-
-        pontuacao_final = (
-            total_pontos / total_respostas_validas) if total_respostas_validas > 0 else 0.0
-
-    # 3. Resumo da Auditoria (mantém o foco em conformidade)
+    # Resumo calculado na submissão (ou calculado agora, uma única vez)
+    resultado = ResultadoAuditoria.obter_para(instancia)
+
     summary_stats = {
-        'total_itens': instancia.respostas.count(),
-        'nao_conformidade_maior': respostas_conformidade.filter(grau_nc='NC MAIOR').count(),
-        'nao_conformidade_menor': respostas_conformidade.filter(grau_nc='NC MENOR').count(),
-        'desvios_solucionados': respostas_conformidade.filter(desvio_solucionado=True).count(),
-        'oportunidades_melhoria': respostas_conformidade.filter(oportunidade_melhoria=True).count(),
-        'nao_aplicaveis': respostas_conformidade.filter(opcao_resposta__status='NA').count(),
+        'total_itens': resultado.total_itens,
+        'nao_conformidade_maior': resultado.nao_conformidade_maior,
+        'nao_conformidade_menor': resultado.nao_conformidade_menor,
+        'desvios_solucionados': resultado.desvios_solucionados,
+        'oportunidades_melhoria': resultado.oportunidades_melhoria,
+        'nao_aplicaveis': resultado.nao_aplicaveis,
     }
 
     context = {
         'title': f'Detalhes da Auditoria #{instancia.id}',
         'instancia': instancia,
         'respostas_map': respostas_map,
-        'tempo_execucao': tempo_execucao_str,
+        'tempo_execucao': resultado.tempo_execucao_display,
         'summary_stats': summary_stats,
 
         # --- NOVAS VARIÁVEIS DE CONTEXTO ---
-        'taxa_conformidade': taxa_conformidade,
-        'pontuacao_final': pontuacao_final,
+        'taxa_conformidade': resultado.taxa_conformidade,
+        'pontuacao_final': resultado.pontuacao_final,
         # --- FIM DAS NOVAS VARIÁVEIS ---
     }
     return render(request, 'auditorias/detalhes_historico.html', context)
@@ -2826,27 +3808,15 @@ def lista_planos_de_acao(request):
     queryset = PlanoDeAcao.objects.select_related(
         'origem_resposta__auditoria_instancia__responsavel',
         'responsavel_acao',
-        'local_execucao__setor__area__empresa',
+        'local_execucao',
         'ferramenta',
         'categoria'
     )
 
-    # 2. Filtro de Segurança
-    if not usuario.is_superuser:
-        filtro_seguranca = Q(
-            responsavel_acao=usuario
-        ) | Q(
-            origem_resposta__auditoria_instancia__responsavel=usuario
-        ) | Q(
-            local_execucao__usuario_responsavel=usuario
-        ) | Q(
-            local_execucao__setor__usuario_responsavel=usuario
-        ) | Q(
-            local_execucao__setor__area__usuario_responsavel=usuario
-        ) | Q(
-            local_execucao__setor__area__empresa__usuario_responsavel=usuario
-        )
-        queryset = queryset.filter(filtro_seguranca).distinct()
+    # 2. Filtro de Segurança (semi-join no índice de visibilidade, sem duplicatas)
+    filtro_seguranca = _filtro_visibilidade_planos(usuario)
+    if filtro_seguranca is not None:
+        queryset = queryset.filter(filtro_seguranca)
 
     # 3. Lógica de Modos (Ativas vs Finalizadas)
     current_mode = request.GET.get('mode', 'active')  # Padrão é 'active'
@@ -2905,6 +3875,7 @@ def lista_planos_de_acao(request):
     # 5. Filtros de Busca (Input de Texto)
     search_id = request.GET.get('search_id', '')
     search_auditoria_id = request.GET.get('search_auditoria_id', '')
+    search_texto = request.GET.get('q', '').strip()
 
     if search_id:
         queryset = queryset.filter(id__icontains=search_id)
@@ -2912,8 +3883,14 @@ def lista_planos_de_acao(request):
         queryset = queryset.filter(
             origem_resposta__auditoria_instancia__id__icontains=search_auditoria_id)
 
+    # Busca textual (título, tratativa e fórum): os mais relevantes primeiro
+    ordenacao = ['-data_abertura']
+    if search_texto:
+        queryset = queryset.buscar(search_texto)
+        ordenacao = ['-relevancia', '-data_abertura']
+
     # 6. Paginação e Contexto
-    paginator = Paginator(queryset.order_by('-data_abertura'), 20)
+    paginator = Paginator(queryset.order_by(*ordenacao), 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -2922,8 +3899,7 @@ def lista_planos_de_acao(request):
         'id', 'first_name', 'last_name', 'username')
 
     categorias = CategoriaAuditoria.objects.filter(ativo=True)
-    subsetores = SubSetor.objects.filter(
-        ativo=True).select_related('setor__area__empresa')
+    subsetores = SubSetor.objects.filter(ativo=True).select_related('empresa')
 
     context = {
         'page_obj': page_obj,
@@ -2937,7 +3913,8 @@ def lista_planos_de_acao(request):
         'create_url': 'auditorias:dashboard',
         'button_text': 'Novo Plano',
         'empty_message': 'Nenhum plano encontrado neste status.',
-        'searches': {'id': search_id, 'auditoria_id': search_auditoria_id},
+        'searches': {'id': search_id, 'auditoria_id': search_auditoria_id,
+                     'texto': search_texto},
         'usuarios_ativos': usuarios_ativos,
         'categorias': categorias,
         'subsetores': subsetores,
@@ -2952,30 +3929,94 @@ def arquivar_plano(request, pk):
     """
     Recebe uma requisição AJAX para arquivar um Plano de Ação.
     """
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
     try:
         data = json.loads(request.body)
-        motivo = data.get('motivo', '')
-
-        # Atualiza o status e o motivo
-        plano.status_plano = 'ARQUIVADO'
-        plano.motivo_arquivamento = motivo
-        plano.save()
-
-        return JsonResponse({'status': 'success', 'message': 'Plano arquivado com sucesso!'})
-
     except Exception as e:
         return JsonResponse(
             {'status': 'error', 'message': f'Erro ao arquivar: {str(e)}'},
             status=400
         )
+    return _transicionar_planos(request, [pk], 'arquivar', {'motivo': data.get('motivo', '')},
+                                mensagem='Plano arquivado com sucesso!')
+
+
+# Decisão do auditor em avaliar_conclusao -> ação do fluxo (TRANSICOES_PLANO)
+ACOES_AVALIACAO_CONCLUSAO = {'finalizar': 'finalizar', 'eficacia': 'enviar_para_eficacia'}
+
+# Planos aceitos por requisição em transicionar_planos_em_lote
+MAX_PLANOS_POR_LOTE = 500
+
+
+def _transicionar_planos(request, ids, acao, dados=None, evidencias=(), mensagem=None):
+    """
+    Aplica a ação do fluxo aos planos visíveis pelo usuário (ver
+    PlanoDeAcaoQuerySet.transicionar) e grava as evidências enviadas, tudo na
+    mesma transação. Responde 404 se algum dos IDs não for visível e 400 se
+    a transição não for permitida.
+    """
+    ids = set(ids)
+    try:
+        with transaction.atomic():
+            planos = _planos_visiveis(request.user).filter(pk__in=ids).transicionar(
+                acao, request.user, **(dados or {}))
+            nao_encontrados = ids - {plano.pk for plano in planos}
+            if nao_encontrados:
+                transaction.set_rollback(True)
+                return JsonResponse(
+                    {'status': 'error', 'message': 'Plano não encontrado',
+                     'planos': sorted(nao_encontrados)},
+                    status=404)
+            for plano in planos:
+                for arquivo in evidencias:
+                    EvidenciaPlano.objects.create(plano=plano, arquivo=arquivo)
+    except TransicaoInvalida as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'planos': e.planos}, status=400)
+
+    resposta = {'status': 'success', 'planos': sorted(ids)}
+    if mensagem:
+        resposta['message'] = mensagem
+    return JsonResponse(resposta)
+
+
+def _evidencia_json(arquivo):
+    """Arquivo de evidência para o modal: o original (download) e as variantes para exibição."""
+    return {
+        'url': arquivo.url,
+        'miniatura': url_da_variante(arquivo, 'miniatura'),
+        'media': url_da_variante(arquivo, 'media'),
+        'nome': arquivo.name.split('/')[-1],
+    }
 
 
 @login_required
 def get_detalhes_plano(request, pk):
-    """Retorna dados completos do plano e da resposta de origem para o modal via AJAX"""
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
+    """
+    Retorna dados completos do plano e da resposta de origem para o modal via AJAX.
+
+    O ETag é a data_atualizacao do plano, que também muda com o histórico, os
+    investimentos e as evidências: ao reabrir um plano inalterado, o modal
+    recebe 304 sem que os relacionamentos sejam lidos. Os dados completos
+    saem de um número fixo de consultas (plano e resposta, mais uma por
+    relacionamento).
+    """
+    plano = get_object_or_404(
+        _planos_visiveis(request.user).select_related('origem_resposta'), pk=pk)
+    etag = quote_etag(f'{plano.pk}-{plano.data_atualizacao.timestamp()}')
+
+    nao_modificado = aplicar_cabecalhos_condicionais(
+        request, HttpResponse(), etag, ultima_modificacao=plano.data_atualizacao)
+    if nao_modificado.status_code == 304:
+        return nao_modificado
+
+    prefetch_related_objects(
+        [plano],
+        'evidencias',
+        'origem_resposta__anexos',
+        Prefetch('investimentos',
+                 queryset=Investimento.objects.order_by('-data_registro')),
+        Prefetch('historico',
+                 queryset=HistoricoPlanoAcao.objects.select_related('usuario')),
+    )
     resposta = plano.origem_resposta
 
     lista_investimentos = []
@@ -2995,17 +4036,11 @@ def get_detalhes_plano(request, pk):
 
         # A. Contexto: Pega as fotos da Resposta da Auditoria
         for anexo in resposta.anexos.all():
-            evidencias_origem.append({
-                'url': anexo.arquivo.url,
-                'nome': anexo.arquivo.name.split('/')[-1]
-            })
+            evidencias_origem.append(_evidencia_json(anexo.arquivo))
 
         # B. Conclusão: Pega as fotos anexadas no Plano (EvidenciaPlano)
         for ev in todas_evidencias_plano:
-            evidencias_conclusao.append({
-                'url': ev.arquivo.url,
-                'nome': ev.arquivo.name.split('/')[-1]
-            })
+            evidencias_conclusao.append(_evidencia_json(ev.arquivo))
 
     else:
         # --- CENÁRIO 2: PLANO MANUAL (AVULSO) ---
@@ -3013,10 +4048,7 @@ def get_detalhes_plano(request, pk):
         # A. Contexto: Como não tem auditoria, as fotos que subimos na criação (EvidenciaPlano)
         # devem aparecer aqui, como solicitado.
         for ev in todas_evidencias_plano:
-            evidencias_origem.append({
-                'url': ev.arquivo.url,
-                'nome': ev.arquivo.name.split('/')[-1]
-            })
+            evidencias_origem.append(_evidencia_json(ev.arquivo))
 
         # B. Conclusão: Deixamos vazio por enquanto para não duplicar as imagens.
         # (Futuramente, se houver uploads na etapa de conclusão de um plano manual,
@@ -3046,7 +4078,7 @@ def get_detalhes_plano(request, pk):
     # =================================================================
     # 3. INVESTIMENTOS
     # =================================================================
-    for inv in plano.investimentos.all().order_by('-data_registro'):
+    for inv in plano.investimentos.all():
         lista_investimentos.append({
             'descricao': inv.descricao,
             'quantidade': inv.quantidade,
@@ -3070,7 +4102,7 @@ def get_detalhes_plano(request, pk):
             'tipo': hist.tipo
         })
 
-    forum_id = plano.forum.id if plano.forum else None
+    forum_id = plano.forum_id
 
     # Monta o JSON final
     data = {
@@ -3097,44 +4129,22 @@ def get_detalhes_plano(request, pk):
         'historico': historico_data,
         'forum_id': forum_id,
     }
-    return JsonResponse(data)
+    return aplicar_cabecalhos_condicionais(
+        request, JsonResponse(data), etag, ultima_modificacao=plano.data_atualizacao)
 
 
 @login_required
 @require_POST
 def aceitar_plano(request, pk):
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
+    """
+    O responsável propõe causa raiz e ações. Vai para a validação do auditor
+    (ou direto para implementação no fluxo simplificado).
+    """
     try:
         data = json.loads(request.body)
-
-        plano.descricao_causa_raiz = data.get('causa_raiz')
-        plano.descricao_acao = data.get('acoes_propostas')
-
-        data_fim = data.get('data_finalizacao')
-        if data_fim:
-            plano.data_finalizacao_prevista = data_fim
-
-        # --- NOVA LÓGICA DE FLUXO ---
-        is_simplificado = data.get('fluxo_simplificado') == True
-        plano.fluxo_simplificado = is_simplificado
-
-        if is_simplificado:
-            # Pula a validação do auditor e já permite executar
-            plano.status_plano = 'EM_IMPLEMENTACAO'
-            msg_hist = "Aceitou o plano em Fluxo Simplificado (sem validação)."
-        else:
-            # Fluxo normal
-            plano.status_plano = 'AGUARDANDO_VALIDACAO'
-            msg_hist = "Aceitou o plano e enviou para validação."
-        # ---------------------------
-
-        plano.save()
-
-        registrar_historico(plano, request.user, msg_hist, "STATUS")
-
-        return JsonResponse({'status': 'success'})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return _transicionar_planos(request, [pk], 'aceitar', data)
 
 
 @login_required
@@ -3144,30 +4154,13 @@ def aprovar_planejamento(request, pk):
     O Auditor aprova o plano proposto pelo responsável.
     Status muda de AGUARDANDO_VALIDACAO -> EM_IMPLEMENTACAO
     """
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
-    # Opcional: Verificar permissão (se o usuário é o auditor ou superuser)
-    # auditor = plano.origem_resposta.auditoria_instancia.responsavel
-    # if request.user != auditor and not request.user.is_superuser:
-    #    return JsonResponse({'status': 'error', 'message': 'Apenas o auditor pode aprovar.'}, status=403)
-
-    try:
-        # Atualiza o status
-        plano.status_plano = 'EM_IMPLEMENTACAO'
-        plano.save()
-
-        registrar_historico(
-            plano, request.user, "Aprovou o planejamento. Plano em implementação.", "STATUS")
-
-        return JsonResponse({'status': 'success'})
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return _transicionar_planos(request, [pk], 'aprovar_planejamento')
 
 
 @login_required
 @require_POST
 def adicionar_investimento(request, pk):
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
+    plano = get_object_or_404(_planos_visiveis(request.user), pk=pk)
     try:
         dados = json.loads(request.body)
 
@@ -3200,39 +4193,14 @@ def adicionar_investimento(request, pk):
 @login_required
 @require_POST
 def concluir_planejamento(request, pk):
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
-    try:
-        acoes_realizadas = request.POST.get('acoes_realizadas')
-        if acoes_realizadas:
-            plano.descricao_acao_realizada = acoes_realizadas
-
-        arquivos = request.FILES.getlist('evidencias')
-        if arquivos:
-            for f in arquivos:
-                EvidenciaPlano.objects.create(plano=plano, arquivo=f)
-
-        # --- NOVA LÓGICA DE FLUXO ---
-        if plano.fluxo_simplificado:
-            # Finaliza direto
-            plano.status_plano = 'CONCLUIDO'
-            plano.data_conclusao = timezone.now()
-            msg_hist = "Concluiu a implementação. Plano finalizado automaticamente (Fluxo Simplificado)."
-        else:
-            # Vai para aprovação do auditor
-            plano.status_plano = 'AGUARDANDO_APROVACAO'
-            # (Data conclusão real só é setada quando o auditor aprovar de fato, ou aqui como provisória)
-            plano.data_conclusao = timezone.now()
-            msg_hist = "Concluiu a implementação e enviou para aprovação."
-        # ---------------------------
-
-        plano.save()
-
-        registrar_historico(plano, request.user, msg_hist, "ANEXO")
-
-        return JsonResponse({'status': 'success'})
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    """
+    O responsável conclui a implementação (com as evidências enviadas). Vai
+    para a aprovação do auditor ou, no fluxo simplificado, é finalizado.
+    """
+    return _transicionar_planos(
+        request, [pk], 'concluir',
+        {'acoes_realizadas': request.POST.get('acoes_realizadas')},
+        evidencias=request.FILES.getlist('evidencias'))
 
 
 @login_required
@@ -3241,37 +4209,16 @@ def avaliar_conclusao(request, pk):
     """
     O Auditor decide se finaliza o plano ou envia para validação de eficácia.
     """
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
     try:
         data = json.loads(request.body)
-        decisao = data.get('decisao')  # 'finalizar' ou 'eficacia'
-
-        if decisao == 'finalizar':
-            plano.status_plano = 'CONCLUIDO'
-            # Garante que a data de conclusão final é hoje
-            plano.data_conclusao = timezone.now()
-
-            registrar_historico(plano, request.user,
-                                "Finalizou o plano de ação.", "STATUS")
-
-        elif decisao == 'eficacia':
-            plano.status_plano = 'VALIDACAO_EFICACIA'
-            # Opcional: Limpar data de conclusão pois o processo continuará
-            # plano.data_conclusao = None
-
-            registrar_historico(plano, request.user,
-                                "Enviou para validação de eficácia.", "STATUS")
-
-        else:
-            return JsonResponse({'status': 'error', 'message': 'Decisão inválida'}, status=400)
-
-        plano.save()
-        return JsonResponse({'status': 'success'})
-
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
+    acao = ACOES_AVALIACAO_CONCLUSAO.get(data.get('decisao'))  # 'finalizar' ou 'eficacia'
+    if acao is None:
+        return JsonResponse({'status': 'error', 'message': 'Decisão inválida'}, status=400)
+    return _transicionar_planos(request, [pk], acao)
+
 
 @login_required
 @require_POST
@@ -3280,31 +4227,10 @@ def validar_eficacia(request, pk):
     Etapa Final: Validação da Eficácia.
     Status muda de VALIDACAO_EFICACIA -> CONCLUIDO
     """
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
-    try:
-        # 1. Salva a observação
-        obs = request.POST.get('observacao_eficacia')
-        if obs:
-            plano.observacao_eficacia = obs
-
-        # 2. Salva as evidências de eficácia (adiciona à lista existente)
-        arquivos = request.FILES.getlist('evidencias')
-        if arquivos:
-            for f in arquivos:
-                EvidenciaPlano.objects.create(plano=plano, arquivo=f)
-
-        # 3. Finaliza o Plano
-        plano.status_plano = 'CONCLUIDO'
-        plano.data_conclusao = timezone.now()  # Data real do fim do ciclo
-        plano.save()
-
-        registrar_historico(plano, request.user,
-                            "Validou a eficácia e concluiu o plano.", "STATUS")
-
-        return JsonResponse({'status': 'success'})
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return _transicionar_planos(
+        request, [pk], 'validar_eficacia',
+        {'observacao_eficacia': request.POST.get('observacao_eficacia')},
+        evidencias=request.FILES.getlist('evidencias'))
 
 
 @login_required
@@ -3314,44 +4240,11 @@ def recusar_plano(request, pk):
     Recusa a etapa atual e retorna ao status anterior.
     Se estiver em ABERTO, vai para CANCELADO (some da lista).
     """
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
     try:
         data = json.loads(request.body)
-        motivo = data.get('motivo')
-
-        if motivo:
-            # Salva o motivo (pode-se concatenar com histórico se desejar)
-            plano.motivo_recusa = motivo
-
-        # --- LÓGICA DE RETORNO ---
-        status_atual = plano.status_plano
-
-        if status_atual == 'ABERTO':
-            # Responsável rejeitou o plano logo de cara
-            plano.status_plano = 'CANCELADO'
-
-        elif status_atual == 'AGUARDANDO_VALIDACAO':
-            # Auditor rejeitou o planejamento -> Volta para o Responsável planejar
-            plano.status_plano = 'ABERTO'
-
-        elif status_atual == 'AGUARDANDO_APROVACAO':
-            # Auditor rejeitou a execução -> Volta para Implementação (fazer de novo/melhorar)
-            plano.status_plano = 'EM_IMPLEMENTACAO'
-
-        elif status_atual == 'VALIDACAO_EFICACIA':
-            # Se rejeitar a eficácia, volta para aprovação (ou implementação, depende da regra)
-            # Geralmente volta para o Auditor decidir o que fazer, ou para implementação
-            plano.status_plano = 'AGUARDANDO_APROVACAO'
-
-        plano.save()
-
-        registrar_historico(
-            plano, request.user, f"Recusou/Devolveu a etapa. Motivo: {motivo}", "STATUS")
-
-        return JsonResponse({'status': 'success'})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return _transicionar_planos(request, [pk], 'recusar', {'motivo': data.get('motivo')})
 
 
 @login_required
@@ -3361,7 +4254,7 @@ def clonar_plano(request, pk):
     Duplica um plano de ação existente, resetando o status para ABERTO
     e atribuindo um novo responsável.
     """
-    plano_original = get_object_or_404(PlanoDeAcao, pk=pk)
+    plano_original = get_object_or_404(_planos_visiveis(request.user), pk=pk)
 
     try:
         data = json.loads(request.body)
@@ -3418,27 +4311,11 @@ def alterar_prazo(request, pk):
     """
     Altera a data de finalização prevista do plano de ação.
     """
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
     try:
         data = json.loads(request.body)
-        nova_data = data.get('nova_data')
-
-        if nova_data:
-            plano.data_finalizacao_prevista = nova_data
-            # Se quiser atualizar também o prazo oficial (prazo_conclusao), descomente abaixo:
-            # plano.prazo_conclusao = nova_data
-            plano.save()
-            data_fmt = datetime.strptime(
-                nova_data, '%Y-%m-%d').strftime('%d/%m/%Y')
-            registrar_historico(
-                plano, request.user, f"Alterou a data prevista para {data_fmt}.", "PRAZO")
-            return JsonResponse({'status': 'success'})
-        else:
-            return JsonResponse({'status': 'error', 'message': 'Data inválida'}, status=400)
-
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return _transicionar_planos(request, [pk], 'alterar_prazo', {'nova_data': data.get('nova_data')})
 
 
 @login_required
@@ -3448,47 +4325,49 @@ def redirecionar_plano(request, pk):
     Transfere a responsabilidade do plano para outro usuário.
     MANTÉM o status atual do plano.
     """
-    plano = get_object_or_404(PlanoDeAcao, pk=pk)
-
     try:
         data = json.loads(request.body)
-        novo_responsavel_id = data.get('novo_responsavel')
-        acoes_sugeridas = data.get('acoes_sugeridas')
-
-        if not novo_responsavel_id:
-            return JsonResponse({'status': 'error', 'message': 'Novo responsável é obrigatório'}, status=400)
-
-        # 1. Atualiza o responsável
-        plano.responsavel_acao_id = novo_responsavel_id
-
-        # 2. Salva as ações sugeridas
-        if acoes_sugeridas:
-            plano.orientacoes_extra = acoes_sugeridas
-
-            plano.origem_orientacao = 'REDIRECIONAMENTO'
-
-        # 3. STATUS: Mantemos o que já estava.
-        # A linha abaixo foi removida para atender sua solicitação:
-        # plano.status_plano = 'ABERTO'
-
-        plano.save()
-
-        novo_nome = plano.responsavel_acao.get_full_name()
-        registrar_historico(
-            plano, request.user, f"Redirecionou a ação para {novo_nome}.", "REDISTRIBUICAO")
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return _transicionar_planos(request, [pk], 'redirecionar', {
+        'novo_responsavel': data.get('novo_responsavel'),
+        'acoes_sugeridas': data.get('acoes_sugeridas'),
+    })
 
-        return JsonResponse({'status': 'success'})
 
+@login_required
+@require_POST
+def transicionar_planos_em_lote(request):
+    """
+    Aplica a mesma ação a vários planos de uma vez (ex.: arquivar ou
+    redirecionar os planos de uma auditoria). Corpo JSON:
+    {"acao": "arquivar", "planos": [1, 2, 3], "motivo": "..."}, com os mesmos
+    campos da ação individual. Tudo ou nada: se algum plano não for visível
+    ou não estiver em um status de origem da ação, nenhum é alterado e a
+    resposta lista os IDs recusados.
+    """
+    try:
+        data = json.loads(request.body)
+        ids = [int(plano_id) for plano_id in data.get('planos') or []]
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if not ids:
+        return JsonResponse({'status': 'error', 'message': 'Nenhum plano informado'}, status=400)
+    if len(ids) > MAX_PLANOS_POR_LOTE:
+        return JsonResponse(
+            {'status': 'error', 'message': f'Máximo de {MAX_PLANOS_POR_LOTE} planos por requisição'},
+            status=400)
+
+    # Só os campos das ações: o resto do corpo é ignorado
+    dados = {campo: data[campo] for campo in CAMPOS_TRANSICAO_PLANO if campo in data}
+    return _transicionar_planos(request, ids, data.get('acao'), dados)
 
 
 # 1. API para LISTAR mensagens (Retorna JSON)
 @login_required
 def api_listar_mensagens(request, forum_id):
     try:
-        forum = Forum.objects.get(id=forum_id)
-        # Verifica permissão se necessário
+        forum = _foruns_visiveis(request.user).get(id=forum_id)
 
         mensagens = []
         for msg in forum.mensagens.all().order_by('data_envio'):
@@ -3511,7 +4390,7 @@ def api_listar_mensagens(request, forum_id):
 @require_POST
 def api_enviar_mensagem(request, forum_id):
     try:
-        forum = get_object_or_404(Forum, id=forum_id)
+        forum = get_object_or_404(_foruns_visiveis(request.user), id=forum_id)
         data = json.loads(request.body)
         conteudo = data.get('conteudo')
 
@@ -3589,136 +4468,346 @@ def criar_plano_manual(request):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
 
-@login_required
-def dashboard_planos_de_acao(request):
-    # 1. QuerySets Base
-    # Filtra apenas o que o usuário pode ver (reaproveitando lógica de segurança se necessário)
-    qs_total = PlanoDeAcao.objects.all()
+# Status em que o plano ainda exige alguma ação
+STATUS_PLANOS_PENDENTES = ['ABERTO', 'AGUARDANDO_VALIDACAO',
+                           'EM_IMPLEMENTACAO', 'AGUARDANDO_APROVACAO', 'VALIDACAO_EFICACIA']
+
+# Máximo de meses da série mensal do dashboard (cada mês é um COUNT na agregação)
+MAX_MESES_SERIE_PLANOS = 36
 
-    # Pendentes: Tudo que não está finalizado
-    status_pendentes = ['ABERTO', 'AGUARDANDO_VALIDACAO',
-                        'EM_IMPLEMENTACAO', 'AGUARDANDO_APROVACAO', 'VALIDACAO_EFICACIA']
-    qs_pendentes = qs_total.filter(status_plano__in=status_pendentes)
+# Datas aceitas nos filtros de período (com folga para as contas de meses e dias)
+LIMITES_DATAS_DASHBOARD_PLANOS = (date(1900, 1, 1), date(9998, 12, 31))
 
-    # 2. KPIs (Cards da Esquerda)
-    total_pendentes = qs_pendentes.count()
 
-    # Colaboradores distintos com ações pendentes
-    colaboradores_pendentes = qs_pendentes.values(
-        'responsavel_acao').distinct().count()
+def _filtro_visibilidade_planos(usuario, campo_plano='pk'):
+    """
+    Filtro dos planos que o usuário pode ver (responsável pela ação, auditor
+    da origem ou responsável pela estrutura do local): um EXISTS no índice
+    VisibilidadePlano, com `campo_plano` apontando o plano na consulta externa.
+    None para superusuários.
+    """
+    if usuario.is_superuser:
+        return None
+    return Exists(VisibilidadePlano.objects.filter(
+        usuario=usuario, plano=OuterRef(campo_plano)))
 
-    total_geral = qs_total.count()
+
+def _planos_visiveis(usuario):
+    """Planos que o usuário pode ver (usado para autorizar as ações via AJAX)."""
+    planos = PlanoDeAcao.objects.all()
+    visibilidade = _filtro_visibilidade_planos(usuario)
+    return planos if visibilidade is None else planos.filter(visibilidade)
+
+
+def _foruns_visiveis(usuario):
+    """Fóruns que o usuário pode ler: os dos planos visíveis e os que não são de um plano."""
+    foruns = Forum.objects.all()
+    visibilidade = _filtro_visibilidade_planos(usuario, 'plano_de_acao')
+    if visibilidade is None:
+        return foruns
+    return foruns.filter(Q(plano_de_acao__isnull=True) | Q(visibilidade))
+
+
+def _filtros_dashboard_planos(request):
+    """
+    Lê os filtros do dashboard de planos: período (data de abertura),
+    empresa/área/setor do local e categoria. Valores inválidos são ignorados,
+    assim como datas fora de LIMITES_DATAS_DASHBOARD_PLANOS.
+    """
+    filtros = {}
+    for chave in ('data_inicial', 'data_final'):
+        try:
+            filtros[chave] = date.fromisoformat(request.GET.get(chave, ''))
+        except ValueError:
+            filtros[chave] = None
+        if filtros[chave] and not (
+                LIMITES_DATAS_DASHBOARD_PLANOS[0] <= filtros[chave] <= LIMITES_DATAS_DASHBOARD_PLANOS[1]):
+            filtros[chave] = None
+    for chave in ('empresa', 'area', 'setor', 'categoria'):
+        valor = request.GET.get(chave, '')
+        filtros[chave] = int(valor) if valor.isdigit() else None
+    return filtros
+
+
+def _inicio_do_dia(dia):
+    """Datetime consciente do início do dia (para filtrar data_abertura)."""
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+
+
+def _indicadores_planos(usuario, filtros):
+    """
+    Indicadores do dashboard de planos em duas consultas:
+
+    1. Uma agregação condicional com os KPIs, a contagem por status e a série
+       mensal (um COUNT filtrado por mês).
+    2. Um GROUP BY por ferramenta, local e responsável, do qual saem em Python
+       os top-10 de ferramentas e locais e o ranking de pendências.
+
+    Sem período informado, os KPIs cobrem todo o histórico e a série mensal
+    mostra apenas os últimos 12 meses. Com um período maior que
+    MAX_MESES_SERIE_PLANOS, a série mostra só os últimos meses dele.
+    """
+    qs = PlanoDeAcao.objects.order_by()
+    visibilidade = _filtro_visibilidade_planos(usuario)
+    if visibilidade is not None:
+        qs = qs.filter(visibilidade)
+
+    if filtros['data_inicial']:
+        qs = qs.filter(data_abertura__gte=_inicio_do_dia(filtros['data_inicial']))
+    if filtros['data_final']:
+        qs = qs.filter(data_abertura__lt=_inicio_do_dia(
+            filtros['data_final'] + timedelta(days=1)))
+    if filtros['setor']:
+        qs = qs.filter(filtro_sob('SETOR', filtros['setor'], 'local_execucao'))
+    elif filtros['area']:
+        qs = qs.filter(filtro_sob('AREA', filtros['area'], 'local_execucao'))
+    elif filtros['empresa']:
+        qs = qs.filter(filtro_sob('EMPRESA', filtros['empresa'], 'local_execucao'))
+    if filtros['categoria']:
+        qs = qs.filter(categoria_id=filtros['categoria'])
+
+    # Meses da série: o período filtrado ou os últimos 12 meses
+    ultimo_mes = (filtros['data_final'] or timezone.localdate()).replace(day=1)
+    if filtros['data_inicial']:
+        primeiro_mes = max(filtros['data_inicial'].replace(day=1),
+                           ultimo_mes - relativedelta(months=MAX_MESES_SERIE_PLANOS - 1))
+    else:
+        primeiro_mes = ultimo_mes - relativedelta(months=11)
+    meses = []
+    mes = primeiro_mes
+    while mes <= ultimo_mes:
+        meses.append(mes)
+        mes += relativedelta(months=1)
+
+    # 1. KPIs, status e série mensal em uma única passada
+    pendente = Q(status_plano__in=STATUS_PLANOS_PENDENTES)
+    agregacoes = {
+        'total': Count('id'),
+        'pendentes': Count('id', filter=pendente),
+        'colaboradores': Count('responsavel_acao', filter=pendente, distinct=True),
+    }
+    for codigo in STATUS_PLANOS_PENDENTES:
+        agregacoes[f'status_{codigo}'] = Count('id', filter=Q(status_plano=codigo))
+    for indice, mes in enumerate(meses):
+        agregacoes[f'mes_{indice}'] = Count('id', filter=Q(
+            data_abertura__gte=_inicio_do_dia(mes),
+            data_abertura__lt=_inicio_do_dia(mes + relativedelta(months=1))))
+    totais = qs.aggregate(**agregacoes)
+
+    # 2. Contagens por ferramenta x local x responsável
+    grupos = qs.values(
+        'ferramenta__nome', 'local_execucao__nome',
+        'responsavel_acao__first_name', 'responsavel_acao__last_name',
+        'responsavel_acao__username',
+    ).annotate(qtd=Count('id'), pendentes=Count('id', filter=pendente))
+
+    por_ferramenta = defaultdict(int)
+    por_local = defaultdict(int)
+    pendentes_por_usuario = defaultdict(int)
+    for grupo in grupos:
+        por_ferramenta[grupo['ferramenta__nome'] or 'Não Definido'] += grupo['qtd']
+        por_local[grupo['local_execucao__nome'] or 'Não Definido'] += grupo['qtd']
+        if grupo['pendentes'] and grupo['responsavel_acao__username']:
+            nome = f"{grupo['responsavel_acao__first_name']} {grupo['responsavel_acao__last_name']}".strip()
+            pendentes_por_usuario[nome or grupo['responsavel_acao__username']] += grupo['pendentes']
+
+    def maiores(contagens, limite):
+        return sorted(contagens.items(), key=lambda item: -item[1])[:limite]
+
+    top_ferramentas = maiores(por_ferramenta, 10)
+    top_locais = maiores(por_local, 10)
+    nomes_status = dict(PlanoDeAcao.STATUS_PLANO)
+    status_com_planos = [codigo for codigo in STATUS_PLANOS_PENDENTES
+                         if totais[f'status_{codigo}']]
+
+    total_geral = totais['total']
     porcentagem_pendentes = (
-        total_pendentes / total_geral * 100) if total_geral > 0 else 0
-
-    # 3. Gráfico: Ações Pendentes por Status (Pizza)
-    status_data = qs_pendentes.values('status_plano').annotate(qtd=Count('id'))
-    # Você pode mapear para nomes amigáveis depois
-    status_labels = [s['status_plano'] for s in status_data]
-    status_series = [s['qtd'] for s in status_data]
-
-    # 4. Gráfico: Total de Ações Geradas por Mês (Barras)
-    # Pega os últimos 12 meses
-    historico_mes = qs_total.annotate(
-        mes=TruncMonth('data_abertura')
-    ).values('mes').annotate(qtd=Count('id')).order_by('mes')
-
-    meses_labels = [h['mes'].strftime('%b/%Y') for h in historico_mes]
-    meses_series = [h['qtd'] for h in historico_mes]
-
-    # 5. Gráfico: Ações por Ferramenta (Barras Horizontais)
-    ferramentas_data = qs_total.values('ferramenta__nome').annotate(
-        qtd=Count('id')).order_by('-qtd')[:10]
-    ferramenta_labels = [f['ferramenta__nome'] for f in ferramentas_data]
-    ferramenta_series = [f['qtd'] for f in ferramentas_data]
-
-    # 6. Gráfico: Ações por Local (Pareto/Barras) - Usando Subsetor
-    locais_data = qs_total.values('local_execucao__nome').annotate(
-        qtd=Count('id')).order_by('-qtd')[:10]
-    local_labels = [l['local_execucao__nome'] for l in locais_data]
-    local_series = [l['qtd'] for l in locais_data]
-
-    # 7. Ranking de Usuários (Top 5 Pendentes)
-    ranking_data = qs_pendentes.values(
-        'responsavel_acao__first_name', 'responsavel_acao__last_name', 'responsavel_acao__username'
-    ).annotate(qtd=Count('id')).order_by('-qtd')[:5]
-
-    ranking_list = []
-    for r in ranking_data:
-        nome = f"{r['responsavel_acao__first_name']} {r['responsavel_acao__last_name']}".strip()
-        if not nome:
-            nome = r['responsavel_acao__username']
-        ranking_list.append({'nome': nome, 'qtd': r['qtd']})
+        totais['pendentes'] / total_geral * 100) if total_geral > 0 else 0
+
+    return {
+        'kpi_total_pendentes': totais['pendentes'],
+        'kpi_colaboradores': totais['colaboradores'],
+        'kpi_porcentagem': f"{porcentagem_pendentes:.1f}%",
+
+        'status_labels': [nomes_status[codigo] for codigo in status_com_planos],
+        'status_series': [totais[f'status_{codigo}'] for codigo in status_com_planos],
+
+        'mes_labels': [mes.strftime('%b/%Y') for mes in meses],
+        'mes_series': [totais[f'mes_{indice}'] for indice in range(len(meses))],
+
+        'ferramenta_labels': [nome for nome, _ in top_ferramentas],
+        'ferramenta_series': [qtd for _, qtd in top_ferramentas],
+
+        'local_labels': [nome for nome, _ in top_locais],
+        'local_series': [qtd for _, qtd in top_locais],
+
+        'ranking_list': [{'nome': nome, 'qtd': qtd}
+                         for nome, qtd in maiores(pendentes_por_usuario, 5)],
+    }
+
+
+def _indicadores_planos_em_cache(request, filtros):
+    """Indicadores do dashboard em cache, por usuário quando há escopo de visibilidade."""
+    chave = 'dashboard:' + ':'.join(str(filtros[c] or '') for c in sorted(filtros))
+    return obter_ou_calcular(
+        'planos_de_acao', chave,
+        lambda: _indicadores_planos(request.user, filtros),
+        usuario=None if request.user.is_superuser else request.user)
+
+
+@login_required
+def dashboard_planos_de_acao(request):
+    filtros = _filtros_dashboard_planos(request)
+    indicadores = _indicadores_planos_em_cache(request, filtros)
 
     context = {
         'title': 'Dashboard de Planos de Ação',
-        'kpi_total_pendentes': total_pendentes,
-        'kpi_colaboradores': colaboradores_pendentes,
-        'kpi_porcentagem': f"{porcentagem_pendentes:.1f}%",
+        'kpi_total_pendentes': indicadores['kpi_total_pendentes'],
+        'kpi_colaboradores': indicadores['kpi_colaboradores'],
+        'kpi_porcentagem': indicadores['kpi_porcentagem'],
 
         # Dados para JS (converteremos no template com json_script ou direto)
-        'chart_status_labels': json.dumps(status_labels),
-        'chart_status_series': json.dumps(status_series),
+        'chart_status_labels': json.dumps(indicadores['status_labels']),
+        'chart_status_series': json.dumps(indicadores['status_series']),
 
-        'chart_mes_labels': json.dumps(meses_labels),
-        'chart_mes_series': json.dumps(meses_series),
+        'chart_mes_labels': json.dumps(indicadores['mes_labels']),
+        'chart_mes_series': json.dumps(indicadores['mes_series']),
 
-        'chart_ferramenta_labels': json.dumps(ferramenta_labels),
-        'chart_ferramenta_series': json.dumps(ferramenta_series),
+        'chart_ferramenta_labels': json.dumps(indicadores['ferramenta_labels']),
+        'chart_ferramenta_series': json.dumps(indicadores['ferramenta_series']),
 
-        'chart_local_labels': json.dumps(local_labels),
-        'chart_local_series': json.dumps(local_series),
+        'chart_local_labels': json.dumps(indicadores['local_labels']),
+        'chart_local_series': json.dumps(indicadores['local_series']),
 
-        'ranking_list': ranking_list,
+        'ranking_list': indicadores['ranking_list'],
+
+        # Filtros
+        'filtros': filtros,
+        'empresas': Empresa.objects.filter(ativo=True),
+        'areas': Area.objects.filter(ativo=True),
+        'setores': Setor.objects.filter(ativo=True),
+        'categorias': CategoriaAuditoria.objects.filter(ativo=True),
     }
 
     return render(request, 'auditorias/planos_de_acao/dashboard.html', context)
 
 
+@login_required
+def api_dashboard_planos(request):
+    """
+    Indicadores do dashboard de planos em JSON, com os mesmos filtros da
+    página, para que os gráficos sejam atualizados sem recarregá-la.
+    """
+    filtros = _filtros_dashboard_planos(request)
+    return json_condicional(request, _indicadores_planos_em_cache(request, filtros))
+
+
+# Rótulo|cor exibidos no calendário para cada status de execução
+LEGENDA_STATUS_CALENDARIO = {
+    'CONCLUIDA': 'Concluído|success',     # Verde
+    'ATRASO': 'Não realizado|danger',     # Vermelho
+    'PENDENTE': 'Pendente|warning',       # Laranja
+    'AGENDADA': 'Planejado|secondary',    # Cinza
+}
+
+
+def _filtros_do_calendario(request):
+    """
+    Lê os filtros opcionais do calendário (responsavel, subsetor, ferramenta e
+    categoria) e devolve o filtro das instâncias, o dos agendamentos (para as
+    ocorrências previstas) e o subsetor selecionado.
+    """
+    filtro_instancias = Q()
+    filtro_auditorias = Q()
+    subsetor_id = None
+
+    responsavel_id = request.GET.get('responsavel')
+    if responsavel_id:
+        filtro_instancias &= Q(responsavel_id=int(responsavel_id))
+        filtro_auditorias &= Q(responsavel_id=int(responsavel_id))
+
+    if request.GET.get('subsetor'):
+        subsetor_id = int(request.GET['subsetor'])
+        filtro_instancias &= Q(local_execucao_id=subsetor_id)
+
+    ferramenta_id = request.GET.get('ferramenta')
+    if ferramenta_id:
+        filtro_instancias &= Q(auditoria_agendada__ferramenta_id=int(ferramenta_id))
+        filtro_auditorias &= Q(ferramenta_id=int(ferramenta_id))
+
+    categoria_id = request.GET.get('categoria')
+    if categoria_id:
+        # Subquery (IN) em vez de JOIN com modelos: não duplica as contagens
+        agendamentos_da_categoria = Auditoria.objects.filter(
+            modelos__categoria_id=int(categoria_id)).values('pk')
+        filtro_instancias &= Q(auditoria_agendada__in=agendamentos_da_categoria)
+        filtro_auditorias &= Q(pk__in=agendamentos_da_categoria)
+
+    return filtro_instancias, filtro_auditorias, subsetor_id
+
+
 @login_required
 def get_dados_calendario(request):
-    """Retorna dados para o calendário de auditorias via AJAX - Com Status de Atraso"""
+    """
+    Retorna dados para o calendário de auditorias via AJAX - Com Status de Atraso.
+
+    Modo mensal (padrão): contagens por dia do mês, chaveadas pelo número do dia.
+    Modo anual (?modo=ano): contagens por data ISO para o mapa de calor do ano.
+    As contagens vêm de um único GROUP BY; a resposta leva um ETag calculado
+    sobre os dados, para que a navegação entre meses seja atendida pelo cache
+    do navegador. Não há Last-Modified: nenhuma data gravada acompanha a
+    exclusão de execuções ou a mudança de status.
+    """
     try:
         ano = int(request.GET.get('year', timezone.now().year))
-        mes = int(request.GET.get('month', timezone.now().month))
+        modo_anual = request.GET.get('modo') == 'ano'
+
+        if modo_anual:
+            primeiro_dia = date(ano, 1, 1)
+            ultimo_dia = date(ano, 12, 31)
+        else:
+            mes = int(request.GET.get('month', timezone.now().month))
+            primeiro_dia = date(ano, mes, 1)
+            ultimo_dia = date(ano, mes, monthrange(ano, mes)[1])
 
+        filtro_instancias, filtro_auditorias, subsetor_id = _filtros_do_calendario(request)
         instancias = AuditoriaInstancia.objects.filter(
-            data_execucao__year=ano,
-            data_execucao__month=mes
-        )
+            filtro_instancias,
+            data_execucao__range=(primeiro_dia, ultimo_dia)
+        ).order_by()
 
-        dados_dias = {}
+        # Contagem por dia e status feita no banco, sobre o status persistido
+        contagens = instancias.values('data_execucao', 'status_execucao').annotate(
+            total=Count('id'))
 
-        for inst in instancias:
-            dia = inst.data_execucao.day
-            status_real = inst.status_execucao
-
-            # --- LÓGICA ATUALIZADA (4 STATUS) ---
-            if status_real == 'Concluída':
-                label = 'Concluído'
-                cor = 'success'   # Verde
-            elif status_real == 'Atraso':
-                label = 'Não realizado'
-                cor = 'danger'    # Vermelho
-            elif status_real == 'Pendente':
-                label = 'Pendente'
-                cor = 'warning'   # Laranja
-            else:
-                # Agendada, Em andamento, etc. viram Planejado
-                label = 'Planejado'
-                cor = 'secondary'  # Cinza
+        dados_dias = {}
 
+        def somar(data_ocorrencia, chave_status, quantidade):
+            dia = data_ocorrencia.isoformat() if modo_anual else data_ocorrencia.day
             if dia not in dados_dias:
                 dados_dias[dia] = {}
-
-            chave_status = f"{label}|{cor}"
             dados_dias[dia][chave_status] = dados_dias[dia].get(
-                chave_status, 0) + 1
-
-        return JsonResponse({
-            'dados': dados_dias,
-            'sucesso': True
-        })
+                chave_status, 0) + quantidade
+
+        for item in contagens:
+            # Agendada vira Planejado
+            somar(item['data_execucao'],
+                  LEGENDA_STATUS_CALENDARIO.get(
+                      item['status_execucao'], 'Planejado|secondary'),
+                  item['total'])
+
+        # Ocorrências além do horizonte rolante (calculadas, não gravadas)
+        ocorrencias_previstas = _ocorrencias_virtuais(
+            primeiro_dia, ultimo_dia,
+            auditorias=Auditoria.objects.filter(filtro_auditorias),
+            subsetor_id=subsetor_id)
+        for data_ocorrencia, _ in ocorrencias_previstas:
+            somar(data_ocorrencia, 'Previsto|secondary', 1)
+
+        return json_condicional(
+            request,
+            {'dados': dados_dias, 'sucesso': True},
+            max_age=settings.AUDITORIAS_CONFIG.get('CALENDARIO_CACHE_SEGUNDOS', 0))
     except Exception as e:
         return JsonResponse({'sucesso': False, 'erro': str(e)})
 
@@ -3727,39 +4816,24 @@ def get_dados_calendario(request):
 def lista_quarentena(request):
     """Lista apenas auditorias (instâncias) que estouraram o prazo de quarentena"""
     hoje = date.today()
-    auditorias_em_quarentena = []
 
-    auditorias_pendentes = AuditoriaInstancia.objects.filter(
-        executada=False,
-        data_execucao__lt=hoje
-    ).select_related(
-        'auditoria_agendada',
-        'responsavel',                   # <--- ADICIONADO: Para pegar o Auditor sem nova query
-        # <--- ADICIONADO: Para pegar a Ferramenta sem nova query
-        'auditoria_agendada__ferramenta',
-        'local_execucao'                 # <--- RECOMENDADO: Para o local
-    ).prefetch_related(
-        'auditoria_agendada__modelos__categoria'
+    # A tolerância da categoria e a comparação de datas são feitas no banco
+    auditorias_em_quarentena = list(
+        AuditoriaInstancia.objects.em_quarentena(hoje).select_related(
+            'auditoria_agendada',
+            'responsavel',                   # Auditor sem nova query
+            'auditoria_agendada__ferramenta',
+            'local_execucao'
+        ).prefetch_related(
+            'auditoria_agendada__modelos__categoria'
+        )
     )
 
-    for instancia in auditorias_pendentes:
-        dias_atraso = (hoje - instancia.data_execucao).days
-        limite_quarentena = 7
-
-        try:
-            agendamento = instancia.auditoria_agendada
-            primeiro_modelo = agendamento.modelos.first()
-            if primeiro_modelo and primeiro_modelo.categoria:
-                limite_quarentena = primeiro_modelo.categoria.dias_para_quarentena
-        except Exception:
-            pass
-
-        if dias_atraso > limite_quarentena:
-            dias_na_quarentena = dias_atraso - limite_quarentena
-            # Atributos temporários
-            instancia.limite_configurado = limite_quarentena
-            instancia.dias_na_quarentena = dias_na_quarentena
-            auditorias_em_quarentena.append(instancia)
+    for instancia in auditorias_em_quarentena:
+        # Atributos temporários usados no template
+        instancia.limite_configurado = instancia.dias_tolerancia
+        instancia.dias_na_quarentena = (
+            (hoje - instancia.data_execucao).days - instancia.dias_tolerancia)
 
     context = {
         # <--- CUIDADO: O nome da chave deve bater com o HTML
@@ -3781,31 +4855,10 @@ class AuditoriasQuarentenaAPIView(ListAPIView):
         user = self.request.user
         hoje = timezone.now().date()
 
-        # Busca dados básicos das atrasadas
-        candidatos = AuditoriaInstancia.objects.filter(
-            executada=False,
-            responsavel=user,
-            data_execucao__lt=hoje
-        ).values(
-            'id',
-            'data_execucao',
-            'auditoria_agendada__modelos__categoria__dias_para_quarentena'
-        )
-
-        ids_em_quarentena = set()
-
-        for item in candidatos:
-            data_exec = item['data_execucao']
-            limite = item['auditoria_agendada__modelos__categoria__dias_para_quarentena'] or 7
-            dias_atraso = (hoje - data_exec).days
-
-            if dias_atraso > limite:
-                ids_em_quarentena.add(item['id'])
-
-        # Retorna os objetos completos baseados nos IDs filtrados
-        return AuditoriaInstancia.objects.filter(
-            id__in=ids_em_quarentena
+        return AuditoriaInstancia.objects.em_quarentena(hoje).filter(
+            responsavel=user
         ).select_related(
-            'auditoria_agendada__ferramenta',
-            'local_execucao'
+            *RELACOES_LISTA_INSTANCIAS
+        ).prefetch_related(
+            *PREFETCH_LISTA_INSTANCIAS
         ).order_by('data_execucao')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ClientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clientes'
+
+    def ready(self):
+        # Gera a miniatura e a versão média dos logos enviados
+        from core.imagens import otimizar_ao_salvar
+        from .models import Cliente
+        otimizar_ao_salvar(Cliente, 'logo_cliente')
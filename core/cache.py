@@ -0,0 +1,164 @@
+# core/cache.py
+
+"""
+Cache versionado por região, compartilhado pelos dashboards.
+
+Cada região (ex.: 'auditorias') tem uma chave de versão que entra no nome de
+todas as suas entradas. Invalidar a região é apenas incrementar a versão: as
+entradas antigas deixam de ser lidas e expiram sozinhas, sem varrer chaves.
+As versões são incrementadas pelos sinais post_save/post_delete registrados
+com `invalidar_ao_alterar`.
+
+Proteção contra "stampede": o valor é gravado com um prazo lógico menor que o
+TTL real. Vencido o prazo, só a requisição que obtiver a trava recalcula; as
+demais continuam servindo o valor anterior. Sem valor algum, quem não obteve
+a trava espera brevemente pelo resultado de quem está calculando.
+
+Se o cache padrão (Redis) falhar, as operações caem para o cache 'local'
+(LocMem) por alguns segundos, e o sistema segue funcionando sem compartilhar
+o cache entre processos.
+"""
+
+import logging
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+# Tempo de vida (segundos) das entradas de cada região
+REGIOES = {
+    'auditorias': 300,
+    'planos_de_acao': 300,
+    'ativos': 600,
+    'itens': 600,
+    'usuarios': 600,
+    'organizacao': 600,
+}
+TEMPO_PADRAO = 300
+
+# Tempo extra em que um valor vencido ainda pode ser servido durante o recálculo
+MARGEM_OBSOLETO = 60
+
+# Validade da trava de recálculo e espera máxima de quem não a obteve
+TEMPO_TRAVA = 30
+ESPERA_TRAVA = 2.0
+INTERVALO_ESPERA = 0.05
+
+# Após uma falha do cache padrão, usa o cache local durante este tempo
+PAUSA_APOS_FALHA = 30
+
+_cache_padrao_indisponivel_ate = 0.0
+
+
+def _executar(operacao, *args, **kwargs):
+    """Executa a operação no cache padrão ou, se ele falhar, no cache local."""
+    global _cache_padrao_indisponivel_ate
+
+    if time.monotonic() >= _cache_padrao_indisponivel_ate:
+        try:
+            return getattr(caches['default'], operacao)(*args, **kwargs)
+        except ValueError:
+            # incr de chave inexistente: não é falha do servidor
+            raise
+        except Exception:
+            logger.warning('Cache padrão indisponível; usando o cache local.',
+                           exc_info=True)
+            _cache_padrao_indisponivel_ate = time.monotonic() + PAUSA_APOS_FALHA
+    return getattr(caches['local'], operacao)(*args, **kwargs)
+
+
+def _chave_versao(regiao):
+    return f'cache:{regiao}:versao'
+
+
+def versao_da_regiao(regiao):
+    """
+    Versão atual da região. Começa no instante atual (ns) para que uma chave de
+    versão despejada nunca volte a apontar para entradas antigas.
+    """
+    chave = _chave_versao(regiao)
+    versao = _executar('get', chave)
+    if versao is None:
+        _executar('add', chave, time.time_ns(), None)
+        versao = _executar('get', chave) or time.time_ns()
+    return versao
+
+
+def invalidar_regiao(*regioes):
+    """Descarta todas as entradas das regiões incrementando suas versões."""
+    for regiao in regioes:
+        chave = _chave_versao(regiao)
+        try:
+            _executar('incr', chave)
+        except ValueError:
+            _executar('set', chave, time.time_ns(), None)
+
+
+def obter(chave):
+    """Valor avulso (fora das regiões) guardado com `gravar`, ou None."""
+    return _executar('get', chave)
+
+
+def gravar(chave, valor, timeout):
+    """Guarda um valor avulso, com o mesmo fallback para o cache local."""
+    _executar('set', chave, valor, timeout)
+
+
+def obter_ou_calcular(regiao, chave, calcular, usuario=None, timeout=None):
+    """
+    Devolve o valor em cache de `chave` na região ou o calcula com `calcular()`.
+
+    Informe `usuario` quando o resultado depender das permissões de quem o
+    vê: a entrada passa a ser exclusiva daquele usuário.
+    """
+    timeout = timeout or REGIOES.get(regiao, TEMPO_PADRAO)
+    escopo = f'u{usuario.pk}' if usuario is not None else 'todos'
+    nome = f'cache:{regiao}:v{versao_da_regiao(regiao)}:{escopo}:{chave}'
+    nome_trava = f'{nome}:trava'
+
+    entrada = _executar('get', nome)
+    if entrada is not None:
+        valor, vence_em = entrada
+        if time.time() < vence_em:
+            return valor
+        # Vencido: só quem obtiver a trava recalcula; os demais servem o anterior
+        if not _executar('add', nome_trava, 1, TEMPO_TRAVA):
+            return valor
+        tem_trava = True
+    else:
+        tem_trava = _executar('add', nome_trava, 1, TEMPO_TRAVA)
+        if not tem_trava:
+            # Outro processo está calculando: aguarda o resultado dele
+            limite = time.monotonic() + ESPERA_TRAVA
+            while time.monotonic() < limite:
+                time.sleep(INTERVALO_ESPERA)
+                entrada = _executar('get', nome)
+                if entrada is not None:
+                    return entrada[0]
+
+    try:
+        valor = calcular()
+        _executar('set', nome, (valor, time.time() + timeout),
+                  timeout + MARGEM_OBSOLETO)
+    finally:
+        if tem_trava:
+            _executar('delete', nome_trava)
+    return valor
+
+
+def invalidar_ao_alterar(regiao, *modelos):
+    """
+    Registra sinais que invalidam a região sempre que um dos modelos é salvo
+    ou excluído. A invalidação acontece após o commit, para que nenhuma
+    leitura concorrente grave dados anteriores à alteração na nova versão.
+    """
+    def receptor(sender, **kwargs):
+        transaction.on_commit(lambda: invalidar_regiao(regiao))
+
+    for modelo in modelos:
+        for sinal in (post_save, post_delete):
+            sinal.connect(receptor, sender=modelo, weak=False,
+                          dispatch_uid=f'cache:{regiao}:{modelo._meta.label}')
@@ -0,0 +1,50 @@
+# core/http.py
+
+"""
+Respostas HTTP condicionais (ETag / Last-Modified) compartilhadas pelos apps.
+
+O ETag é calculado a partir do próprio conteúdo: quando o cliente reenvia o
+mesmo ETag em If-None-Match, a resposta é um 304 sem corpo.
+"""
+
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def gerar_etag(dados):
+    """ETag forte a partir da serialização JSON (com chaves ordenadas) dos dados."""
+    conteudo = json.dumps(dados, sort_keys=True, cls=DjangoJSONEncoder)
+    return quote_etag(hashlib.md5(conteudo.encode('utf-8')).hexdigest())
+
+
+def aplicar_cabecalhos_condicionais(request, resposta, etag, ultima_modificacao=None,
+                                    max_age=0, imutavel=False):
+    """
+    Acrescenta ETag, Last-Modified e Cache-Control à resposta e devolve um
+    304 quando o cliente já tem a versão atual.
+
+    Use `imutavel` apenas para URLs cujo conteúdo nunca muda (ex.: endereçadas
+    pelo hash do próprio conteúdo): o cliente nem revalida dentro do max_age.
+    """
+    last_modified = int(ultima_modificacao.timestamp()) if ultima_modificacao else None
+    resposta['ETag'] = etag
+    if last_modified:
+        resposta['Last-Modified'] = http_date(last_modified)
+    # Privado: o conteúdo depende do usuário logado
+    patch_cache_control(resposta, private=True, max_age=max_age)
+    if imutavel:
+        patch_cache_control(resposta, immutable=True)
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=resposta)
+
+
+def json_condicional(request, dados, ultima_modificacao=None, max_age=0):
+    """JsonResponse com ETag calculado a partir de `dados` (ou 304 Not Modified)."""
+    return aplicar_cabecalhos_condicionais(
+        request, JsonResponse(dados), gerar_etag(dados),
+        ultima_modificacao=ultima_modificacao, max_age=max_age)
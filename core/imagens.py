@@ -0,0 +1,197 @@
+# core/imagens.py
+
+"""
+Variantes redimensionadas das imagens enviadas (fotos das auditorias,
+evidências dos planos, imagens de ativos e itens, logos de clientes).
+
+Para cada imagem são gravadas, ao lado do original, versões com o lado maior
+limitado (IMAGENS_VARIANTES, ex.: 'miniatura' e 'media'), já orientadas pelo
+EXIF, sem os metadados e em WebP (ou JPEG, se o Pillow não tiver suporte a
+WebP). O caminho da variante é derivado do caminho completo do original, com a
+extensão, para que abc.jpg e abc.png não disputem a mesma variante:
+
+    anexos_respostas/abc.jpg -> variantes/miniatura/anexos_respostas/abc.jpg.webp
+
+As telas pedem a variante com `url_da_variante` (ou o filtro de template
+`variante`); enquanto ela não existir, e para arquivos que não são imagens,
+a URL devolvida é a do original, que continua disponível para download.
+A existência de cada variante fica registrada no cache (gravada ao gerar e
+ao excluir), e o storage só é consultado quando o registro não está lá.
+
+As variantes são geradas após o commit dos modelos registrados com
+`otimizar_ao_salvar`; o comando gerar_variantes_imagens gera as que faltam
+para os arquivos já existentes.
+"""
+
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_save
+from PIL import features, Image, ImageOps
+
+from core.cache import gravar, obter
+
+logger = logging.getLogger(__name__)
+
+# Extensões tratadas como imagem (as demais, como PDF, ficam só com o original)
+EXTENSOES_IMAGEM = ('jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp')
+
+# (modelo, campo) registrados com otimizar_ao_salvar
+CAMPOS_REGISTRADOS = []
+
+# Validade (segundos) do registro de variante existente e de variante ausente
+TEMPO_VARIANTE_PRONTA = 7 * 24 * 3600
+TEMPO_VARIANTE_AUSENTE = 300
+
+
+def variantes():
+    """Lado maior, em pixels, de cada variante."""
+    return getattr(settings, 'IMAGENS_VARIANTES', {'miniatura': 320, 'media': 1280})
+
+
+def formato_das_variantes():
+    """Formato do Pillow e extensão das variantes."""
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def eh_imagem(arquivo):
+    if not arquivo:
+        return False
+    return posixpath.splitext(arquivo.name)[1].lower().lstrip('.') in EXTENSOES_IMAGEM
+
+
+def nome_da_variante(nome, variante):
+    """Caminho da variante no storage, derivado do caminho do original."""
+    _, extensao = formato_das_variantes()
+    return f'variantes/{variante}/{nome}.{extensao}'
+
+
+def _chave_da_variante(nome):
+    return 'imagens:variante:' + hashlib.md5(nome.encode()).hexdigest()
+
+
+def _registrar_variante(nome, pronta):
+    """Registra no cache se a variante `nome` existe no storage."""
+    gravar(_chave_da_variante(nome), pronta,
+           TEMPO_VARIANTE_PRONTA if pronta else TEMPO_VARIANTE_AUSENTE)
+
+
+def variante_pronta(storage, nome):
+    """Se a variante existe, pelo registro no cache ou, na falta dele, pelo storage."""
+    pronta = obter(_chave_da_variante(nome))
+    if pronta is None:
+        pronta = storage.exists(nome)
+        _registrar_variante(nome, pronta)
+    return pronta
+
+
+def url_da_variante(arquivo, variante):
+    """
+    URL da variante de `arquivo` (FieldFile) ou do original, quando ele não é
+    uma imagem ou a variante ainda não foi gerada.
+    """
+    if not arquivo:
+        return ''
+    if variante in variantes() and eh_imagem(arquivo):
+        nome = nome_da_variante(arquivo.name, variante)
+        if variante_pronta(arquivo.storage, nome):
+            return arquivo.storage.url(nome)
+    return arquivo.url
+
+
+def _preparar(imagem, formato):
+    """Converte a imagem para um modo que o formato de saída grava."""
+    transparente = imagem.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagem.info
+    if formato == 'WEBP' and transparente:
+        return imagem if imagem.mode == 'RGBA' else imagem.convert('RGBA')
+    return imagem if imagem.mode == 'RGB' else imagem.convert('RGB')
+
+
+def gerar_variantes(arquivo, forcar=False):
+    """
+    Grava as variantes de `arquivo` (FieldFile). Arquivos que não são imagens
+    são ignorados e as variantes existentes só são refeitas com `forcar`.
+    Retorna quantas variantes foram gravadas; falhas de leitura da imagem são
+    registradas no log e não interrompem quem salvou o arquivo.
+    """
+    if not eh_imagem(arquivo):
+        return 0
+    storage = arquivo.storage
+    pendentes = {variante: (lado, nome_da_variante(arquivo.name, variante))
+                 for variante, lado in variantes().items()}
+    if not forcar:
+        existentes = {nome for _, nome in pendentes.values() if storage.exists(nome)}
+        for nome in existentes:
+            _registrar_variante(nome, True)
+        pendentes = {variante: (lado, nome) for variante, (lado, nome) in pendentes.items()
+                     if nome not in existentes}
+    if not pendentes:
+        return 0
+
+    formato, _ = formato_das_variantes()
+    qualidade = getattr(settings, 'IMAGENS_QUALIDADE', 80)
+    maior_lado = max(lado for lado, _ in pendentes.values())
+    try:
+        with storage.open(arquivo.name, 'rb') as origem:
+            imagem = Image.open(origem)
+            # JPEG: decodifica já reduzido (por fator de 2) até o tamanho pedido
+            imagem.draft('RGB', (maior_lado, maior_lado))
+            imagem = _preparar(ImageOps.exif_transpose(imagem), formato)
+
+        # Do maior para o menor: cada variante parte da anterior, já reduzida
+        gravadas = 0
+        for lado, nome in sorted(pendentes.values(), reverse=True):
+            imagem.thumbnail((lado, lado), Image.LANCZOS)
+            conteudo = io.BytesIO()
+            imagem.save(conteudo, formato, quality=qualidade, optimize=True)
+            if storage.exists(nome):
+                storage.delete(nome)
+            storage.save(nome, ContentFile(conteudo.getvalue()))
+            _registrar_variante(nome, True)
+            gravadas += 1
+        return gravadas
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        logger.warning('Não foi possível gerar as variantes de %s.', arquivo.name,
+                       exc_info=True)
+        return 0
+
+
+def gerar_apos_commit(arquivos):
+    """Agenda a geração das variantes para depois do commit da transação atual."""
+    arquivos = [arquivo for arquivo in arquivos if eh_imagem(arquivo)]
+    if arquivos:
+        transaction.on_commit(lambda: [gerar_variantes(arquivo) for arquivo in arquivos])
+
+
+def excluir_variantes(arquivo):
+    """Remove as variantes de um arquivo (ex.: ao descartar o original)."""
+    if not eh_imagem(arquivo):
+        return
+    for variante in variantes():
+        nome = nome_da_variante(arquivo.name, variante)
+        if arquivo.storage.exists(nome):
+            arquivo.storage.delete(nome)
+        _registrar_variante(nome, False)
+
+
+def otimizar_ao_salvar(modelo, *campos):
+    """
+    Registra um sinal post_save que gera, após o commit, as variantes que
+    faltam para os arquivos dos campos do modelo. Os pares (modelo, campo)
+    ficam em CAMPOS_REGISTRADOS para o comando gerar_variantes_imagens.
+    """
+    def receptor(sender, instance, raw=False, update_fields=None, **kwargs):
+        if raw:
+            return
+        alterados = [campo for campo in campos
+                     if update_fields is None or campo in update_fields]
+        gerar_apos_commit(getattr(instance, campo) for campo in alterados)
+
+    CAMPOS_REGISTRADOS.extend((modelo, campo) for campo in campos)
+    post_save.connect(receptor, sender=modelo, weak=False,
+                      dispatch_uid=f'imagens:{modelo._meta.label}')
@@ -213,14 +213,55 @@ AUDITORIAS_CONFIG = {
     'ALLOWED_FILE_TYPES': ['pdf', 'doc', 'docx', 'xls', 'xlsx', 'jpg', 'jpeg', 'png'],
     'AUTO_BACKUP_ENABLED': True,
     'BACKUP_RETENTION_DAYS': 30,
+    # Semanas de execuções futuras gravadas por agendamento (horizonte rolante).
+    # None grava todas as execuções até a data de fim. Pode ser sobrescrito por
+    # categoria; o comando estender_horizonte_agendamentos avança a janela.
+    'HORIZONTE_SEMANAS': None,
+    # Segundos em que o navegador reaproveita os dados do calendário sem
+    # revalidar (depois disso, revalida com ETag e recebe 304 se nada mudou)
+    'CALENDARIO_CACHE_SEGUNDOS': 60,
+    # Máximo de eventos (alterações + remoções) por resposta de /api/sync/
+    'SYNC_TAMANHO_PAGINA': 500,
+    # Segundos antes do cursor relidos a cada nova rodada de /api/sync/: o
+    # instante gravado é o do save, e uma transação mais longa pode confirmar
+    # depois de uma alteração mais recente já enviada (deve cobrir a maior
+    # duração esperada de uma transação de escrita)
+    'SYNC_JANELA_SEGUNDOS': 120,
+    # Dias à frente incluídos no pacote offline (/api/pacote-offline/) e o
+    # máximo que o app pode pedir
+    'PACOTE_OFFLINE_DIAS': 7,
+    'PACOTE_OFFLINE_MAX_DIAS': 31,
+    # Máximo de execuções por requisição em /api/instancias/submeter-lote/
+    'SUBMISSAO_LOTE_MAXIMO': 50,
+    # Horas em que o resultado de uma requisição com Idempotency-Key é
+    # guardado, e minutos após os quais uma reserva sem resultado (processo
+    # interrompido) é descartada
+    'IDEMPOTENCIA_HORAS': 48,
+    'IDEMPOTENCIA_PROCESSAMENTO_MINUTOS': 10,
+    # Horas até um upload de anexo (/api/anexos/) não usado em uma submissão
+    # ser excluído pelo comando limpar_uploads_anexos
+    'ANEXOS_UPLOAD_HORAS': 48,
 }
 
-# Configurações de cache (para produção)
+# Variantes das imagens enviadas (core/imagens.py): lado maior, em pixels, de
+# cada uma e a qualidade da compressão (WebP ou JPEG)
+IMAGENS_VARIANTES = {
+    'miniatura': 320,
+    'media': 1280,
+}
+IMAGENS_QUALIDADE = 80
+
+# Configurações de cache (para produção). O alias 'local' é o fallback usado
+# por core.cache quando o cache padrão (Redis) não responde.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cache-local',
+    },
 }
 
 # Configurações para produção
@@ -232,13 +273,17 @@ if not DEBUG:
     SECURE_HSTS_PRELOAD = True
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
-    # Configurações de cache para produção
-    CACHES = {
-        'default': {
+    # Configurações de cache para produção: Redis quando a biblioteca está
+    # instalada; sem ela, mantém o LocMem
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        CACHES['default'] = {
             'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-            'LOCATION': 'redis://127.0.0.1:6379/1',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
         }
-    }
 
 # Configurações de mensagens
 MESSAGE_TAGS = {
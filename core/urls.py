@@ -16,6 +16,12 @@ from auditorias.views import (
     SubmeterAuditoriaAPIView,
     LocaisPermitidosAPIView,
     AuditoriasQuarentenaAPIView,
+    SincronizacaoAPIView,
+    ChecklistVersaoAPIView,
+    PacoteOfflineAPIView,
+    SubmeterLoteAPIView,
+    AnexoUploadAPIView,
+    AnexoUploadParteAPIView,
 )
 
 
@@ -73,6 +79,16 @@ api_urlpatterns = [
          name='api_instancia_locais'),
     path('instancias/<int:pk>/submeter/',
          SubmeterAuditoriaAPIView.as_view(), name='api_instancia_submeter'),
+    path('instancias/submeter-lote/', SubmeterLoteAPIView.as_view(),
+         name='api_instancias_submeter_lote'),
+    path('anexos/', AnexoUploadAPIView.as_view(), name='api_anexos'),
+    path('anexos/<uuid:token>/', AnexoUploadParteAPIView.as_view(),
+         name='api_anexo_upload'),
+    path('sync/', SincronizacaoAPIView.as_view(), name='api_sync'),
+    path('checklists/<int:pk>/', ChecklistVersaoAPIView.as_view(),
+         name='api_checklist'),
+    path('pacote-offline/', PacoteOfflineAPIView.as_view(),
+         name='api_pacote_offline'),
 
 
 ]
@@ -4,22 +4,26 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from auditorias.models import Auditoria, AuditoriaInstancia
+from core.cache import obter_ou_calcular
 
 
 @login_required
 def home(request):
-    # Contagem de auditorias agendadas
-    total_auditorias = Auditoria.objects.count()
-    auditorias_agendadas = Auditoria.objects.filter(
-        data_inicio__gt=timezone.now()).count()
-    auditorias_executadas = AuditoriaInstancia.objects.filter(
-        executada=True).count()
+    def calcular_contexto():
+        # Contagem de auditorias agendadas
+        total_auditorias = Auditoria.objects.count()
+        auditorias_agendadas = Auditoria.objects.filter(
+            data_inicio__gt=timezone.now()).count()
+        auditorias_executadas = AuditoriaInstancia.objects.filter(
+            executada=True).count()
 
-    context = {
-        'total_auditorias': total_auditorias,
-        'auditorias_agendadas': auditorias_agendadas,
-        'auditorias_executadas': auditorias_executadas,
-    }
+        return {
+            'total_auditorias': total_auditorias,
+            'auditorias_agendadas': auditorias_agendadas,
+            'auditorias_executadas': auditorias_executadas,
+        }
+
+    context = obter_ou_calcular('auditorias', 'home', calcular_contexto)
     return render(request, 'home.html', context)
 
 
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ItensConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'itens'
+
+    def ready(self):
+        # Invalida o cache do dashboard do app quando os cadastros mudam
+        from core.cache import invalidar_ao_alterar
+        from .models import Almoxarifado, CategoriaItem, Item, SubcategoriaItem
+        invalidar_ao_alterar('itens', Almoxarifado, CategoriaItem, Item, SubcategoriaItem)
+
+        # Gera a miniatura e a versão média das imagens enviadas
+        from core.imagens import otimizar_ao_salvar
+        otimizar_ao_salvar(Item, 'imagem_item')
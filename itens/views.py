@@ -9,6 +9,7 @@ from django.http import JsonResponse
 
 from .models import Item, CategoriaItem, SubcategoriaItem, Almoxarifado
 from cadastros_base.models import UnidadeMedida
+from core.cache import obter_ou_calcular
 
 # ============================================================================
 # DASHBOARD
@@ -17,16 +18,16 @@ from cadastros_base.models import UnidadeMedida
 @login_required
 def dashboard_itens(request):
     """Dashboard principal do módulo de itens."""
-    context = {
+    context = obter_ou_calcular('itens', 'dashboard', lambda: {
         'total_itens': Item.objects.count(),
         'itens_ativos': Item.objects.filter(ativo=True).count(),
         'total_categorias': CategoriaItem.objects.count(),
         'total_subcategorias': SubcategoriaItem.objects.count(),
         'total_almoxarifados': Almoxarifado.objects.count(),
-        'itens_recentes': Item.objects.select_related(
+        'itens_recentes': list(Item.objects.select_related(
             'categoria_principal', 'almoxarifado'
-        ).order_by('-data_cadastro')[:5],
-    }
+        ).order_by('-data_cadastro')[:5]),
+    })
     return render(request, 'itens/dashboard.html', context)
 
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrganizacaoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'organizacao'
+
+    def ready(self):
+        # Registra os sinais do app
+        from . import signals  # noqa: F401
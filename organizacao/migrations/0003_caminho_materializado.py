@@ -0,0 +1,61 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def preencher_caminhos(apps, schema_editor):
+    """Grava o caminho materializado dos setores e subsetores existentes."""
+    Setor = apps.get_model('organizacao', 'Setor')
+    SubSetor = apps.get_model('organizacao', 'SubSetor')
+
+    setores = {}
+    for setor in Setor.objects.select_related('area__empresa'):
+        setor.empresa_id = setor.area.empresa_id
+        setor.caminho = f"{setor.area.nome} - {setor.area.empresa.nome}"
+        setores[setor.pk] = setor
+    Setor.objects.bulk_update(setores.values(), ['empresa', 'caminho'], batch_size=500)
+
+    subsetores = list(SubSetor.objects.all())
+    for subsetor in subsetores:
+        setor = setores[subsetor.setor_id]
+        subsetor.area_id = setor.area_id
+        subsetor.empresa_id = setor.empresa_id
+        subsetor.caminho = f"{setor.nome} - {setor.area.nome}"
+    SubSetor.objects.bulk_update(subsetores, ['area', 'empresa', 'caminho'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizacao', '0002_area_usuario_responsavel_empresa_usuario_responsavel_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='setor',
+            name='caminho',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Caminho'),
+        ),
+        migrations.AddField(
+            model_name='setor',
+            name='empresa',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='setores', to='organizacao.empresa', verbose_name='Empresa'),
+        ),
+        migrations.AddField(
+            model_name='subsetor',
+            name='area',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subsetores', to='organizacao.area', verbose_name='Área'),
+        ),
+        migrations.AddField(
+            model_name='subsetor',
+            name='caminho',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Caminho'),
+        ),
+        migrations.AddField(
+            model_name='subsetor',
+            name='empresa',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subsetores', to='organizacao.empresa', verbose_name='Empresa'),
+        ),
+        migrations.RunPython(preencher_caminhos, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,48 @@
 # organizacao/models.py
 
+"""
+Estrutura organizacional: Empresa > Área > Setor > SubSetor.
+
+Setor e SubSetor guardam o caminho materializado até a raiz: os ids de todos
+os níveis acima deles (`empresa` no Setor; `area` e `empresa` no SubSetor) e
+o texto `caminho` usado no __str__. Assim, "tudo abaixo desta área" é uma
+busca indexada (SubSetor.objects.sob('AREA', id)), sem percorrer a cadeia de
+chaves estrangeiras. Os campos são preenchidos no save() e propagados aos
+descendentes quando um nível é renomeado ou movido (organizacao/signals.py).
+"""
+
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 
+# Campo do SubSetor que aponta cada nível da estrutura (caminho materializado)
+CAMPO_DO_NIVEL = {
+    'EMPRESA': 'empresa_id',
+    'AREA': 'area_id',
+    'SETOR': 'setor_id',
+    'SUBSETOR': 'id',
+}
+
+
+def filtro_sob(nivel, local_id, campo_subsetor=''):
+    """
+    Q de tudo o que está abaixo de um nível da estrutura (o próprio subsetor,
+    no nível SUBSETOR). Sem `campo_subsetor`, filtra SubSetor; com ele, filtra
+    um modelo que aponta para o subsetor, ex.:
+    PlanoDeAcao.objects.filter(filtro_sob('AREA', 3, 'local_execucao')).
+    """
+    campo = CAMPO_DO_NIVEL[nivel]
+    if campo_subsetor:
+        campo = f'{campo_subsetor}__{campo}'
+    return Q(**{campo: local_id})
+
+
+class SubSetorQuerySet(models.QuerySet):
+
+    def sob(self, nivel, local_id):
+        """Subsetores abaixo de uma empresa, área ou setor (ou o próprio subsetor)."""
+        return self.filter(filtro_sob(nivel, local_id))
+
 
 class Empresa(models.Model):
     nome = models.CharField(max_length=100, unique=True,
@@ -80,6 +120,13 @@ class Setor(models.Model):
         related_name='setores_responsavel'
     )
 
+    # Caminho materializado (preenchido no save)
+    empresa = models.ForeignKey(
+        Empresa, on_delete=models.CASCADE, null=True, editable=False,
+        related_name='setores', verbose_name="Empresa")
+    caminho = models.CharField(
+        max_length=255, blank=True, editable=False, verbose_name="Caminho")
+
     class Meta:
         verbose_name = "Setor"
         verbose_name_plural = "Setores"
@@ -87,7 +134,23 @@ class Setor(models.Model):
         ordering = ['area__empresa__nome', 'area__nome', 'nome']
 
     def __str__(self):
-        return f"{self.nome} ({self.area.nome} - {self.area.empresa.nome})"
+        return f"{self.nome} ({self.caminho or self.calcular_caminho()})"
+
+    def calcular_caminho(self):
+        return f"{self.area.nome} - {self.area.empresa.nome}"
+
+    def ancestrais(self):
+        """Ids dos níveis acima do setor, por nível."""
+        return {'EMPRESA': self.empresa_id, 'AREA': self.area_id}
+
+    def save(self, *args, **kwargs):
+        """Preenche o caminho materializado a partir da área."""
+        self.empresa_id = self.area.empresa_id
+        self.caminho = self.calcular_caminho()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'empresa', 'caminho'}
+        super().save(*args, **kwargs)
 
 
 class SubSetor(models.Model):
@@ -108,6 +171,18 @@ class SubSetor(models.Model):
         related_name='subsetores_responsavel'
     )
 
+    # Caminho materializado (preenchido no save)
+    area = models.ForeignKey(
+        Area, on_delete=models.CASCADE, null=True, editable=False,
+        related_name='subsetores', verbose_name="Área")
+    empresa = models.ForeignKey(
+        Empresa, on_delete=models.CASCADE, null=True, editable=False,
+        related_name='subsetores', verbose_name="Empresa")
+    caminho = models.CharField(
+        max_length=255, blank=True, editable=False, verbose_name="Caminho")
+
+    objects = SubSetorQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Subsetor"
         verbose_name_plural = "Subsetores"
@@ -116,4 +191,21 @@ class SubSetor(models.Model):
                     'setor__area__nome', 'setor__nome', 'nome']
 
     def __str__(self):
-        return f"{self.nome} ({self.setor.nome} - {self.setor.area.nome})"
+        return f"{self.nome} ({self.caminho or self.calcular_caminho()})"
+
+    def calcular_caminho(self):
+        return f"{self.setor.nome} - {self.setor.area.nome}"
+
+    def ancestrais(self):
+        """Ids dos níveis acima do subsetor, por nível."""
+        return {'EMPRESA': self.empresa_id, 'AREA': self.area_id, 'SETOR': self.setor_id}
+
+    def save(self, *args, **kwargs):
+        """Preenche o caminho materializado a partir do setor."""
+        self.area_id = self.setor.area_id
+        self.empresa_id = self.setor.empresa_id or self.setor.area.empresa_id
+        self.caminho = self.calcular_caminho()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'area', 'empresa', 'caminho'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,54 @@
+# organizacao/signals.py
+
+"""
+Propaga o caminho materializado (ids dos níveis acima e texto do caminho)
+aos descendentes quando uma empresa, área ou setor é renomeado ou movido.
+Cada propagação é um UPDATE que só toca as linhas desatualizadas.
+"""
+
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Area, Empresa, Setor, SubSetor
+
+
+def _nome_do_setor():
+    return Subquery(Setor.objects.filter(pk=OuterRef('setor_id')).values('nome')[:1])
+
+
+def _nome_da_area():
+    return Subquery(Area.objects.filter(pk=OuterRef('area_id')).values('nome')[:1])
+
+
+@receiver(post_save, sender=Setor)
+def propagar_caminho_do_setor(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    caminho = f"{instance.nome} - {instance.area.nome}"
+    SubSetor.objects.filter(setor=instance).exclude(
+        area_id=instance.area_id, empresa_id=instance.empresa_id, caminho=caminho
+    ).update(area_id=instance.area_id, empresa_id=instance.empresa_id, caminho=caminho)
+
+
+@receiver(post_save, sender=Area)
+def propagar_caminho_da_area(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    caminho = f"{instance.nome} - {instance.empresa.nome}"
+    Setor.objects.filter(area=instance).exclude(
+        empresa_id=instance.empresa_id, caminho=caminho
+    ).update(empresa_id=instance.empresa_id, caminho=caminho)
+    caminho_do_subsetor = Concat(_nome_do_setor(), Value(f" - {instance.nome}"))
+    SubSetor.objects.filter(area=instance).exclude(
+        empresa_id=instance.empresa_id, caminho=caminho_do_subsetor
+    ).update(empresa_id=instance.empresa_id, caminho=caminho_do_subsetor)
+
+
+@receiver(post_save, sender=Empresa)
+def propagar_caminho_da_empresa(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    caminho = Concat(_nome_da_area(), Value(f" - {instance.nome}"))
+    Setor.objects.filter(empresa=instance).exclude(caminho=caminho).update(caminho=caminho)
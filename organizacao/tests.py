@@ -1,3 +1,65 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Area, Empresa, Setor, SubSetor, filtro_sob
+
+
+class CaminhoMaterializadoTests(TestCase):
+    """Propagação do caminho aos descendentes (organizacao/signals.py)."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Empresa')
+        self.area = Area.objects.create(empresa=self.empresa, nome='Produção - B')
+        self.setor = Setor.objects.create(area=self.area, nome='Montagem')
+        self.subsetor = SubSetor.objects.create(setor=self.setor, nome='Linha 1')
+
+    def recarregar(self):
+        self.setor.refresh_from_db()
+        self.subsetor.refresh_from_db()
+
+    def test_renomear_area(self):
+        # O caminho antigo ("Montagem - Produção - B") termina com " - B"
+        self.area.nome = 'B'
+        self.area.save()
+        self.recarregar()
+
+        self.assertEqual(self.setor.caminho, 'B - Empresa')
+        self.assertEqual(self.subsetor.caminho, 'Montagem - B')
+
+    def test_mover_area_de_empresa(self):
+        outra = Empresa.objects.create(nome='Outra')
+        self.area.empresa = outra
+        self.area.save()
+        self.recarregar()
+
+        self.assertEqual(self.setor.empresa_id, outra.pk)
+        self.assertEqual(self.setor.caminho, 'Produção - B - Outra')
+        self.assertEqual(self.subsetor.empresa_id, outra.pk)
+        self.assertEqual(self.subsetor.caminho, 'Montagem - Produção - B')
+        self.assertEqual(list(SubSetor.objects.sob('EMPRESA', outra.pk)), [self.subsetor])
+        self.assertFalse(SubSetor.objects.sob('EMPRESA', self.empresa.pk).exists())
+
+    def test_renomear_empresa(self):
+        self.empresa.nome = 'Filial - Matriz'
+        self.empresa.save()
+        self.recarregar()
+        self.assertEqual(self.setor.caminho, 'Produção - B - Filial - Matriz')
+
+        # O caminho antigo termina com " - Matriz"
+        self.empresa.nome = 'Matriz'
+        self.empresa.save()
+        self.recarregar()
+        self.assertEqual(self.setor.caminho, 'Produção - B - Matriz')
+        self.assertEqual(list(SubSetor.objects.sob('EMPRESA', self.empresa.pk)), [self.subsetor])
+
+    def test_mover_setor_de_area(self):
+        outra = Area.objects.create(
+            empresa=Empresa.objects.create(nome='Outra'), nome='Qualidade')
+        self.setor.area = outra
+        self.setor.save()
+        self.subsetor.refresh_from_db()
+
+        self.assertEqual(self.subsetor.caminho, 'Montagem - Qualidade')
+        self.assertEqual(list(SubSetor.objects.sob('AREA', outra.pk)), [self.subsetor])
+        self.assertEqual(list(SubSetor.objects.sob('EMPRESA', outra.empresa_id)),
+                         [self.subsetor])
+        self.assertFalse(SubSetor.objects.filter(filtro_sob('AREA', self.area.pk)).exists())
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usuarios'
+
+    def ready(self):
+        # Invalida o cache do dashboard do app quando os cadastros mudam
+        from django.contrib.auth.models import Group
+        from core.cache import invalidar_ao_alterar
+        from .models import Usuario
+        invalidar_ao_alterar('usuarios', Usuario, Group)
@@ -19,6 +19,7 @@ import json
 from django.contrib.auth.decorators import login_required, permission_required
 
 from .models import Usuario, DetalheGrupo
+from core.cache import obter_ou_calcular
 
 from collections import defaultdict
 
@@ -52,14 +53,14 @@ def admin_required(user):
 @permission_required('usuarios.view_usuario', raise_exception=True)
 def dashboard_usuarios(request):
     """Dashboard principal do módulo de usuários."""
-    context = {
+    context = obter_ou_calcular('usuarios', 'dashboard', lambda: {
         'total_usuarios': Usuario.objects.count(),
         'usuarios_ativos': Usuario.objects.filter(is_active=True).count(),
         'usuarios_staff': Usuario.objects.filter(is_staff=True).count(),
         'total_grupos': Group.objects.count(),
-        'usuarios_recentes': Usuario.objects.order_by('-date_joined')[:5],
+        'usuarios_recentes': list(Usuario.objects.order_by('-date_joined')[:5]),
         'title': 'Dashboard de Usuários'
-    }
+    })
     return render(request, 'usuarios/dashboard.html', context)
 
 